@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
 import matplotlib
 # Forzar uso de backend sin interfaz gráfica para evitar errores al guardar
 matplotlib.use('Agg')
@@ -8,21 +7,42 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 
+from elasticidades import elasticidades, ols_lote, verificar_con_statsmodels
+from meitef_store import cargar_meitef
+from transformaciones import CacheTransformaciones, correlacion_movil, rebase, variacion
+
 # ---------------------------------------------------------------------------
 # 1. CONFIGURACIÓN Y RUTAS
 # ---------------------------------------------------------------------------
 BASE_DIR = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\UNAM-INEGI"
 
 # Inputs
-PATH_MEITEF = os.path.join(BASE_DIR, "data", "meitef_tidy", "meitef_comercio_informal_tidy_ALL.csv")
+MEITEF_TIDY_DIR = os.path.join(BASE_DIR, "data", "meitef_tidy")
 PATH_IMPUESTOS = os.path.join(BASE_DIR, "output", "impuestos_data_clean_trimestral.csv")
 PATH_IMSS = os.path.join(BASE_DIR, "output", "ingreso_obrero_patronal_trimestral.csv")
+# Series desestacionalizadas (etl-meitef/ajuste_estacional.py; el VAB va en valor_sa del tidy)
+PATH_IMPUESTOS_SA = os.path.join(BASE_DIR, "output", "impuestos_data_clean_trimestral_desestacionalizada.csv")
+PATH_IMSS_SA = os.path.join(BASE_DIR, "output", "ingreso_obrero_patronal_trimestral_desestacionalizada.csv")
 
 # Output
 OUTPUT_DIR = os.path.join(BASE_DIR, "output", "analisis_impacto_fiscal_completo")
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
+# Elasticidades por lotes (estado × indicador × rezago × ventana)
+INDICADORES_ELASTICIDAD = {          # indicador MEITEF -> métrica usada como x
+    "vab_comercio_informal": "Millones de pesos a precios corrientes",
+    "remuneraciones_comercio_informal": "Millones de pesos a precios corrientes",
+    "puestos_trabajo_comercio_informal": "Unidades",
+}
+REZAGOS = range(0, 5)                # trimestres de rezago de x
+VENTANA_MOVIL = 20                   # trimestres por ventana móvil (None = sólo muestra completa)
+MUESTRA_VERIFICACION = 25            # regresiones reajustadas con statsmodels para verificar
+
+# Transformaciones (una vez por panel; gráficas y reporte comparten el resultado)
+TRANSFORMACIONES = CacheTransformaciones()
+VENTANA_CORRELACION = 8              # trimestres por ventana en la correlación móvil de ciclos
+
 # Estilo
 sns.set_theme(style="whitegrid")
 plt.rcParams["figure.figsize"] = (12, 6)
@@ -55,6 +75,21 @@ def imprimir_temporalidad(df, nombre="Serie"):
     print("")
 
 
+def transformar_panel(id_panel, funcion, df, *args):
+    """
+    TRANSFORMACIONES.obtener sobre un panel fechas × series. Las transformaciones
+    trabajan por posición (k trimestres antes, ventanas de n filas): el índice tiene
+    que ser una fila por trimestre y en orden cronológico.
+    """
+    if not df.index.is_unique or not df.index.is_monotonic_increasing:
+        repetidas = df.index[df.index.duplicated()].unique()
+        raise ValueError(
+            f"Panel '{id_panel}' sin una fila por trimestre en orden: "
+            f"{len(repetidas)} fechas repetidas (p. ej. {[str(f.date()) for f in repetidas[:3]]})"
+        )
+    return TRANSFORMACIONES.obtener(id_panel, funcion, df, *args)
+
+
 # ---------------------------------------------------------------------------
 # 2. CARGA Y UNIFICACIÓN DE DATOS
 # ---------------------------------------------------------------------------
@@ -62,21 +97,22 @@ def cargar_datos():
     print("--> [1/6] Cargando y procesando datos...")
 
     # A) MEITEF (Comercio Informal)
+    # Filtros: Nacional + VAB + Precios Corrientes (se aplican al leer: sólo esas filas y columnas)
     try:
-        df_vab = pd.read_csv(PATH_MEITEF)
+        df_vab = cargar_meitef(
+            MEITEF_TIDY_DIR,
+            columns=["anio", "periodo", "valor"],
+            estado="Estados Unidos Mexicanos",
+            indicador="vab_comercio_informal",
+            metric="Millones de pesos a precios corrientes",
+        )
     except FileNotFoundError:
-        print(f"ERROR: No se encontró {PATH_MEITEF}")
+        print(f"ERROR: No se encontró el tidy MEITEF en {MEITEF_TIDY_DIR}")
         exit()
 
-    if "ï»¿estado" in df_vab.columns:
-        df_vab.rename(columns={"ï»¿estado": "estado"}, inplace=True)
-
-    # Filtros: Nacional + VAB + Precios Corrientes
-    df_vab = df_vab[
-        (df_vab["estado"] == "Estados Unidos Mexicanos") &
-        (df_vab["indicador"] == "vab_comercio_informal") &
-        (df_vab["metric"] == "Millones de pesos a precios corrientes")
-    ].copy()
+    # Sólo periodos trimestrales (T1..T4, con marca P/R): "6 Meses", "9 Meses" y "Anual"
+    # caerían en diciembre y repetirían la fecha del T4 (una fila por trimestre)
+    df_vab = df_vab[df_vab["periodo"].astype(str).str.fullmatch(r"T[1-4][PR]?")]
 
     # Lógica de Fechas Trimestrales
     def periodo_a_mes(p):
@@ -126,6 +162,38 @@ def cargar_datos():
     return df_master
 
 
+def cargar_datos_desestacionalizados():
+    """
+    Mismo panel con las series desestacionalizadas (valor_sa del tidy para el VAB y los
+    CSV *_desestacionalizada de SAT/IMSS). None si todavía no se corrió el ajuste.
+    """
+    print("--> Cargando series desestacionalizadas...")
+    df_vab = cargar_meitef(
+        MEITEF_TIDY_DIR,
+        estado="Estados Unidos Mexicanos",
+        indicador="vab_comercio_informal",
+        metric="Millones de pesos a precios corrientes",
+    )
+    faltan = [p for p in [PATH_IMPUESTOS_SA, PATH_IMSS_SA] if not os.path.exists(p)]
+    if "valor_sa" not in df_vab.columns or faltan:
+        print("ADVERTENCIA: no hay series desestacionalizadas; corre etl-meitef/ajuste_estacional.py.")
+        return None
+
+    df_meitef = (
+        df_vab.dropna(subset=["valor_sa"])
+        .rename(columns={"fecha": "Fecha", "valor_sa": "VAB_Informal"})
+        .set_index("Fecha")[["VAB_Informal"]]
+        .sort_index()
+    )
+    df_sat = pd.read_csv(PATH_IMPUESTOS_SA, parse_dates=["Fecha"], index_col="Fecha").sort_index()
+    df_imss = pd.read_csv(PATH_IMSS_SA, parse_dates=["Fecha"], index_col="Fecha").sort_index()
+
+    df_sa = df_meitef.join([df_sat, df_imss], how="inner").dropna()
+    df_sa.rename(columns={"Ingreso obrero - patronal nacional": "IMSS"}, inplace=True)
+    print(f"    {len(df_sa)} trimestres desestacionalizados.")
+    return df_sa
+
+
 # ---------------------------------------------------------------------------
 # 3. FUNCIONES DE VISUALIZACIÓN EXPLORATORIA
 # ---------------------------------------------------------------------------
@@ -142,11 +210,28 @@ def graficar_correlacion(df):
     plt.close()
 
 
+def graficar_correlacion_desestacionalizada(df_sa):
+    path = os.path.join(OUTPUT_DIR, "1b_Matriz_Correlacion_Desestacionalizada.png")
+    print(f"--> [2b/6] Generando Matriz de Correlación (desestacionalizada): {path}")
+
+    # niveles y variación trimestral: sin estacionalidad, la trimestral ya es comparable
+    df_qoq = transformar_panel("panel_desestacionalizado", variacion, df_sa, 1).dropna()
+    fig, axes = plt.subplots(1, 2, figsize=(15, 6))
+    for ax, datos, titulo in [(axes[0], df_sa, "Niveles"), (axes[1], df_qoq, "Variación trimestral")]:
+        sns.heatmap(datos.corr(), annot=True, cmap="coolwarm", fmt=".2f", linewidths=0.5,
+                    vmin=-1, vmax=1, ax=ax)
+        ax.set_title(titulo)
+    plt.suptitle("1b. Matriz de Correlación con Series Desestacionalizadas", fontsize=14)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
 def graficar_series_tiempo(df):
     path = os.path.join(OUTPUT_DIR, "2_Series_Tiempo_Base100.png")
     print(f"--> [3/6] Generando Series de Tiempo: {path}")
 
-    df_base100 = df.apply(lambda x: (x / x.iloc[0]) * 100)
+    df_base100 = transformar_panel("panel_nacional", rebase, df, 0)
     plt.figure(figsize=(12, 6))
     sns.lineplot(data=df_base100, linewidth=2.5)
     plt.title("2. Evolución Comparativa (Índice Base 100 = Inicio del Periodo)", fontsize=14)
@@ -183,7 +268,7 @@ def graficar_ciclos(df):
     path = os.path.join(OUTPUT_DIR, "4_Ciclos_Variacion_Anual.png")
     print(f"--> [5/6] Generando Ciclos Económicos: {path}")
 
-    df_pct = df.pct_change(4).dropna() * 100  # Variación Anual
+    df_pct = transformar_panel("panel_nacional", variacion, df, 4).dropna()  # Variación Anual
     plt.figure(figsize=(12, 6))
     sns.lineplot(data=df_pct, linewidth=2)
     plt.axhline(0, color="black", linestyle="--", linewidth=1)
@@ -206,23 +291,28 @@ def analisis_econometrico(df):
     modelos_resumen = {}
     full_summaries = ""
 
+    # Los tres modelos en un solo lote: log(Y) = alpha + beta * log(VAB)
+    X = df_log["VAB_Informal"].to_numpy()
+    X_const = np.broadcast_to(np.column_stack([np.ones_like(X), X]), (len(vars_dep), len(X), 2))
+    res = ols_lote(X_const, df_log[vars_dep].to_numpy().T)
+
     fig, axes = plt.subplots(1, 3, figsize=(18, 6))
     colors = {"ISR": "green", "IVA": "blue", "IMSS": "orange"}
 
     for i, var in enumerate(vars_dep):
         Y = df_log[var]
         X = df_log["VAB_Informal"]
-        X_const = sm.add_constant(X)
 
-        model = sm.OLS(Y, X_const).fit()
-
-        beta = model.params["VAB_Informal"]
-        alpha = model.params["const"]
-        r2 = model.rsquared
+        alpha, beta = res["coef"][i]
+        se_alpha, se_beta = res["se"][i]
+        r2 = res["r2"][i]
         modelos_resumen[var] = beta
 
         full_summaries += f"\n{'='*60}\nMODELO: Log({var}) vs Log(Informalidad)\n{'='*60}\n"
-        full_summaries += str(model.summary()) + "\n\n"
+        full_summaries += f"Observaciones: {res['n'][i]}    R²: {r2:.4f}\n"
+        full_summaries += f"{'':<16}{'coef':>12}{'error est.':>14}{'t':>10}\n"
+        full_summaries += f"{'const':<16}{alpha:>12.4f}{se_alpha:>14.4f}{alpha / se_alpha:>10.3f}\n"
+        full_summaries += f"{'VAB_Informal':<16}{beta:>12.4f}{se_beta:>14.4f}{beta / se_beta:>10.3f}\n\n"
 
         ax = axes[i]
         ax.scatter(X, Y, color=colors[var], alpha=0.6, label="Datos Observados")
@@ -270,10 +360,56 @@ def analisis_econometrico(df):
     return full_summaries, betas
 
 
+# ---------------------------------------------------------------------------
+# 4b. ELASTICIDADES POR LOTES (ESTADOS × INDICADORES × REZAGOS × VENTANAS)
+# ---------------------------------------------------------------------------
+def cargar_panel_estatal():
+    """MEITEF trimestral (T1..T4) por estado: columnas (indicador, estado), índice = fecha."""
+    df = cargar_meitef(
+        MEITEF_TIDY_DIR,
+        columns=["estado", "indicador", "metric", "periodo", "fecha", "valor"],
+        indicador=list(INDICADORES_ELASTICIDAD),
+        metric=sorted(set(INDICADORES_ELASTICIDAD.values())),
+    )
+    pares = df["indicador"].astype(str).map(INDICADORES_ELASTICIDAD) == df["metric"].astype(str)
+    df = df[pares & df["periodo"].isin(["T1", "T2", "T3", "T4"])]
+    return df.pivot_table(index="fecha", columns=["indicador", "estado"], values="valor", observed=True)
+
+
+def elasticidades_estatales(df):
+    """
+    Elasticidades log-log de ISR, IVA e IMSS (nacionales) respecto a cada indicador
+    MEITEF de cada estado, con REZAGOS y, si hay VENTANA_MOVIL, también en ventanas
+    móviles. Todo se estima por lotes; statsmodels sólo reajusta una muestra.
+    """
+    print("--> Estimando elasticidades por lotes (estado × indicador × rezago × ventana)...")
+    y = df[["ISR", "IVA", "IMSS"]].groupby(level=0).first()   # una fila por fecha
+    x = cargar_panel_estatal()
+
+    tablas = [elasticidades(y, x, rezagos=REZAGOS)]
+    if VENTANA_MOVIL:
+        tablas.append(elasticidades(y, x, rezagos=REZAGOS, ventana=VENTANA_MOVIL))
+    tabla = pd.concat(tablas, ignore_index=True)
+
+    path = os.path.join(OUTPUT_DIR, "7_Elasticidades_Estatales.csv")
+    tabla.to_csv(path, index=False, encoding="utf-8-sig")
+    print(f"    {len(tabla):,} regresiones -> {path}")
+
+    for t in tablas:
+        verif = verificar_con_statsmodels(t, y, x, muestra=MUESTRA_VERIFICACION)
+        ventana = t["ventana"].iloc[0] if len(t) else 0
+        print(f"    Verificación statsmodels (ventana={ventana}): {len(verif)} regresiones, "
+              f"dif. máx. = {verif['dif_max'].max():.2e}")
+        if not (verif["dif_max"] < 1e-6).all() or not (verif["n"] == verif["n_tabla"]).all():
+            print("    ADVERTENCIA: el motor por lotes no coincide con statsmodels en la muestra.")
+
+    return tabla
+
+
 # ---------------------------------------------------------------------------
 # 5. GENERACIÓN DE REPORTE DE TEXTO Y POLÍTICA PÚBLICA
 # ---------------------------------------------------------------------------
-def generar_reporte_texto(df, summaries, betas):
+def generar_reporte_texto(df, summaries, betas, df_sa=None):
     print("--> Generando reporte técnico final...")
 
     filepath = os.path.join(OUTPUT_DIR, "REPORTE_TECNICO_Y_POLITICA.txt")
@@ -282,8 +418,12 @@ def generar_reporte_texto(df, summaries, betas):
     imss_prom = df["IMSS"].mean()
     ratio = vab_prom / imss_prom
 
-    df_pct = df.pct_change(4).dropna()
+    df_pct = transformar_panel("panel_nacional", variacion, df, 4).dropna()
     corr_ciclos = df_pct.corr()["VAB_Informal"]
+    corr_movil = pd.DataFrame(
+        correlacion_movil(df_pct.to_numpy().T, df_pct["VAB_Informal"].to_numpy(), VENTANA_CORRELACION).T,
+        index=df_pct.index, columns=df_pct.columns,
+    ).dropna()
 
     with open(filepath, "w", encoding="utf-8") as f:
         f.write("================================================================================\n")
@@ -302,6 +442,17 @@ def generar_reporte_texto(df, summaries, betas):
         f.write(f" - vs ISR:  {corr_ciclos['ISR']:.4f}\n")
         f.write(f" - vs IVA:  {corr_ciclos['IVA']:.4f}\n")
         f.write(f" - vs IMSS: {corr_ciclos['IMSS']:.4f}\n")
+        if not corr_movil.empty:
+            f.write(f"Correlación móvil ({VENTANA_CORRELACION} trimestres): mínimo / máximo / última ventana\n")
+            for var in ["ISR", "IVA", "IMSS"]:
+                c = corr_movil[var]
+                f.write(f" - vs {var + ':':<5} {c.min():.4f} / {c.max():.4f} / {c.iloc[-1]:.4f}\n")
+        if df_sa is not None:
+            corr_sa = df_sa.corr()["VAB_Informal"]
+            corr_qoq = transformar_panel("panel_desestacionalizado", variacion, df_sa, 1).dropna().corr()["VAB_Informal"]
+            f.write("Series desestacionalizadas (VAB Informal vs recaudación): niveles / variación trimestral\n")
+            for var in ["ISR", "IVA", "IMSS"]:
+                f.write(f" - vs {var + ':':<5} {corr_sa[var]:.4f} / {corr_qoq[var]:.4f}\n")
         f.write("INTERPRETACIÓN: La correlación cercana a cero (o negativa) en impuestos como el ISR\n")
         f.write("indica una desconexión estructural. El fisco no ve los flujos del comercio informal.\n\n")
 
@@ -366,15 +517,19 @@ def generar_reporte_texto(df, summaries, betas):
 # ---------------------------------------------------------------------------
 def main():
     df = cargar_datos()
+    df_sa = cargar_datos_desestacionalizados()
 
     graficar_correlacion(df)
+    if df_sa is not None:
+        graficar_correlacion_desestacionalizada(df_sa)
     graficar_series_tiempo(df)
     graficar_dispersiones_simples(df)
     graficar_ciclos(df)
 
     resumen_texto, betas = analisis_econometrico(df)
+    elasticidades_estatales(df)
 
-    generar_reporte_texto(df, resumen_texto, betas)
+    generar_reporte_texto(df, resumen_texto, betas, df_sa)
 
     print("\n========================================")
     print("      ¡ANÁLISIS COMPLETADO CON ÉXITO!      ")
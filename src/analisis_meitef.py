@@ -1,33 +1,58 @@
 # -*- coding: utf-8 -*-
 """
 Generador de gráficas para el análisis de la economía informal con MEITEF
-Dataset: meitef_comercio_informal_tidy_ALL.csv
+Dataset: meitef_comercio_informal_tidy_ALL.parquet (meitef_store; cae al CSV si no existe)
 
 Este script:
-- Carga el dataset MEITEF (comercio informal).
-- Limpia mínimamente los nombres de columnas (estado) y construye una fecha trimestral.
-- RESTRINGE el análisis hasta el 4T de 2024 (fecha <= 31/12/2024).
+- Carga el dataset MEITEF (comercio informal) con tipos: categóricas y fecha real,
+  y lo arma una sola vez como cubo indicador × metric × estado × periodo
+  (meitef_store.CuboMeitef); cada gráfica corta el cubo en lugar de filtrar el tidy.
+- RESTRINGE el análisis hasta el 4T de 2024 (fecha <= 31/12/2024; filtro al leer).
 - Genera visualizaciones formales:
     * Series de tiempo nacionales por indicador y métrica.
-    * Series de tiempo por estado.
+    * Series de tiempo por estado: rejilla de "small multiples" (los 32 estados de
+      un indicador/metric en una figura) y documento paginado PDF/SVG; los PNG por
+      estado siguen disponibles con MODO_ESTATALES = "png" o "ambos".
     * Comparaciones nacional vs principales estados (trimestral).
     * Rankings y participaciones estatales (año de referencia: T4).
     * Heatmap estado–año.
-    * Series de variación porcentual anual.
+    * Series de variación porcentual anual, calculadas de los niveles trimestrales de
+      todos los estados a la vez (transformaciones.py).
 
 Todas las gráficas se guardan en subcarpetas dentro de:
     .../UNAM-INEGI/output/plots/*
+
+Render:
+- Cada generar_*() sólo prepara los datos de sus gráficas (especificaciones con
+  arreglos ya cortados del cubo); renderizar() las dibuja en un pool de procesos
+  con backend Agg (RENDER_WORKERS) e imprime el tiempo de cada gráfica.
+- Caché de render (output/plots/_render_cache.json): se salta una gráfica si la
+  huella de sus datos + estilo + DPI + RENDER_VERSION es la misma que en la corrida
+  anterior y el archivo sigue existiendo. Si cambias el código de dibujo, sube
+  RENDER_VERSION (o USE_RENDER_CACHE = False).
 """
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import io
+import json
+import os
 from pathlib import Path
 import re
+import time
 import unicodedata
 
+import matplotlib
+matplotlib.use("Agg")  # sólo se guardan archivos; los procesos del pool también usan Agg
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from matplotlib.ticker import FuncFormatter
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.ticker import FuncFormatter, ScalarFormatter
+
+from meitef_store import NACIONAL, CuboMeitef, cargar_meitef
+from transformaciones import CacheTransformaciones, variacion
 
 
 # ---------------------------------------------------------------------------
@@ -37,23 +62,49 @@ from matplotlib.ticker import FuncFormatter
 BASE_DIR = Path(
     r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\UNAM-INEGI"
 )
-DATA_PATH = BASE_DIR / "data" / "meitef_tidy" / "meitef_comercio_informal_tidy_ALL.csv"
+TIDY_DIR = BASE_DIR / "data" / "meitef_tidy"
+COLUMNAS_ANALISIS = ["estado", "anio", "periodo", "fecha", "metric", "indicador", "valor"]
+FECHA_CORTE = pd.Timestamp(2024, 12, 31)
 OUTPUT_PLOTS_DIR = BASE_DIR / "output" / "plots"
 
+# Render
+RENDER_WORKERS = max(1, min(8, os.cpu_count() or 1))   # 1 = secuencial en este proceso
+USE_RENDER_CACHE = True
+RENDER_CACHE_NAME = "_render_cache.json"               # dentro de OUTPUT_PLOTS_DIR
+RENDER_VERSION = 1                                     # súbelo si cambia el código de dibujo
+DPI = 300
+
+# Series por estado:
+#   "multiples" = una rejilla por indicador/metric con todos los estados (+ documento paginado)
+#   "png"       = un PNG por estado (salida anterior)
+#   "ambos"
+MODO_ESTATALES = "multiples"
+PAGINADO_ESTATALES = "pdf"     # None, "pdf" (una página por estado) o "svg" (sprite: un <symbol> por estado)
+COLUMNAS_MULTIPLES = 4
+
+# Transformaciones de series (variaciones, índices, ventanas) por (indicador, metric)
+TRANSFORMACIONES = CacheTransformaciones()
+
+# Estilo sobrio y formal para todas las gráficas (entra en la huella de la caché)
+ESTILO_SNS = "whitegrid"
+ESTILO = {
+    "figure.figsize": (10, 6),
+    "axes.titlesize": 14,
+    "axes.labelsize": 12,
+    "xtick.labelsize": 10,
+    "ytick.labelsize": 10,
+    "legend.fontsize": 10,
+    "figure.dpi": 120,
+    # Evitar notación científica “1e5”
+    "axes.formatter.useoffset": False,
+    "axes.formatter.limits": (-9, 9),
+}
+
 
 def configurar_estilo():
-    """Configura un estilo sobrio y formal para todas las gráficas."""
-    sns.set_theme(style="whitegrid")
-    plt.rcParams["figure.figsize"] = (10, 6)
-    plt.rcParams["axes.titlesize"] = 14
-    plt.rcParams["axes.labelsize"] = 12
-    plt.rcParams["xtick.labelsize"] = 10
-    plt.rcParams["ytick.labelsize"] = 10
-    plt.rcParams["legend.fontsize"] = 10
-    plt.rcParams["figure.dpi"] = 120
-    # Evitar notación científica “1e5”
-    plt.rcParams["axes.formatter.useoffset"] = False
-    plt.rcParams["axes.formatter.limits"] = (-9, 9)
+    """Configura el estilo (también es el initializer de cada proceso del pool)."""
+    sns.set_theme(style=ESTILO_SNS)
+    plt.rcParams.update(ESTILO)
 
 
 def asegurar_directorio(path: Path):
@@ -112,107 +163,58 @@ def aplicar_formato_eje_y_metric(ax, metric: str):
     # para otros casos dejamos el default (sin notación científica por rcParams)
 
 
+FORMATOS = {
+    "monetario": fmt_monetario_millones,
+    "cantidad": fmt_cantidad,
+    "porcentaje": fmt_porcentaje,
+}
+
+
+def aplicar_formato(ax, eje: str, formato: str | None, metric: str | None = None):
+    """Formato de `eje` ('x'/'y'): uno de FORMATOS, 'metric' (según el texto) o None."""
+    if formato == "metric":
+        aplicar_formato_eje_y_metric(ax, metric)
+    elif formato is not None:
+        getattr(ax, f"{eje}axis").set_major_formatter(FuncFormatter(FORMATOS[formato]))
+
+
 # ---------------------------------------------------------------------------
 # Carga y limpieza mínima
 # ---------------------------------------------------------------------------
 
-def construir_fecha_desde_anio_periodo(df: pd.DataFrame) -> pd.Series:
+def cargar_y_preparar_datos(tidy_dir: Path) -> CuboMeitef:
     """
-    Construye una fecha aproximada a partir de (anio, periodo).
-    Se interpreta que los datos son trimestrales o acumulados:
-        T1 -> marzo
-        T2 -> junio
-        T3 -> septiembre
-        T4 -> diciembre
-        6 Meses -> junio
-        9 Meses -> septiembre
-        12 Meses / Año / Anual -> diciembre
+    Carga el tidy MEITEF (sólo las columnas que se grafican y sólo hasta FECHA_CORTE)
+    y lo arma como CuboMeitef, que es lo que consumen todas las gráficas.
     """
-    def periodo_a_mes(p):
-        p = str(p).strip()
-        if p == "T1":
-            return 3
-        if p == "T2":
-            return 6
-        if p == "T3":
-            return 9
-        if p == "T4":
-            return 12
-        if "6 Meses" in p:
-            return 6
-        if "9 Meses" in p:
-            return 9
-        if "12 Meses" in p or "Año" in p or "Anual" in p or "Anio" in p:
-            return 12
-        return 12  # fallback: diciembre
-
-    meses = df["periodo"].map(periodo_a_mes)
-    fechas = pd.to_datetime(
-        dict(year=df["anio"].astype(int), month=meses.astype(int), day=1)
-    )
-    return fechas
-
-
-def cargar_y_preparar_datos(path: Path) -> pd.DataFrame:
-    """Carga el CSV MEITEF y realiza limpieza mínima necesaria para graficar."""
-    print("Cargando dataset MEITEF desde:", path)
-    df = pd.read_csv(path)
-
-    # Renombrar columna de estado si viene con BOM
-    if "ï»¿estado" in df.columns:
-        df = df.rename(columns={"ï»¿estado": "estado"})
-
-    columnas_esperadas = {"estado", "anio", "periodo", "metric", "indicador", "fuente", "valor"}
-    faltantes = columnas_esperadas.difference(df.columns)
-    if faltantes:
-        raise ValueError(f"Hacen falta columnas esperadas en el dataset: {faltantes}")
-
-    # Construir fecha si no existe o si viene en formato Excel numérico
-    if "fecha" in df.columns:
-        if np.issubdtype(df["fecha"].dtype, np.number):
-            df["fecha"] = pd.to_datetime(df["fecha"], origin="1899-12-30", unit="D")
-        else:
-            df["fecha"] = pd.to_datetime(df["fecha"])
-    else:
-        df["fecha"] = construir_fecha_desde_anio_periodo(df)
-
-    # FILTRO TEMPORAL: solo hasta el 4T de 2024
-    corte = pd.Timestamp(2024, 12, 31)
-    df = df[df["fecha"] <= corte].copy()
-
-    # Orden general
-    df = df.sort_values(["estado", "indicador", "metric", "fecha"]).reset_index(drop=True)
-
-    # Bandera nacional vs estatales
-    df["es_nacional"] = df["estado"].eq("Estados Unidos Mexicanos")
+    print("Cargando dataset MEITEF desde:", tidy_dir)
+    # FILTRO TEMPORAL: solo hasta el 4T de 2024 (se aplica al leer)
+    df = cargar_meitef(tidy_dir, columns=COLUMNAS_ANALISIS, fecha_max=FECHA_CORTE)
+    cubo = CuboMeitef.desde_tidy(df)
 
     print("Filas totales (hasta 4T-2024):", len(df))
-    print("Rango temporal:", df["fecha"].min().date(), "→", df["fecha"].max().date())
-    print("Estados (incluye nacional):", df["estado"].nunique())
+    print("Rango temporal:", cubo.fechas.min().date(), "→", cubo.fechas.max().date())
+    print("Estados (incluye nacional):", len(cubo.estados))
+    print("Cubo:", " × ".join(str(n) for n in cubo.valores.shape), "(indicador × metric × estado × periodo)")
 
-    return df
+    return cubo
 
 
 # ---------------------------------------------------------------------------
-# Utilidades de filtrado
+# Utilidades de consulta
 # ---------------------------------------------------------------------------
 
-def filtrar_subset(df: pd.DataFrame, indicador: str, metric: str) -> pd.DataFrame:
-    """Filtra el DataFrame por indicador y métrica exactos."""
-    sub = df[(df["indicador"] == indicador) & (df["metric"] == metric)].copy()
-    return sub
-
-
-def elegir_periodo_referencia(sub: pd.DataFrame) -> str:
+def elegir_periodo_referencia(conteo: pd.Series) -> str:
     """
-    Elige un periodo de referencia para análisis anual.
+    Elige un periodo de referencia para análisis anual a partir del conteo de
+    observaciones por periodo (CuboMeitef.conteo_periodos).
     Dado que los datos son trimestrales, privilegiamos T4:
       1) 'T4'
       2) '12 Meses'
       3) 'Año' / 'Anual' / 'Anio'
       4) periodo más frecuente
     """
-    periodos = sub["periodo"].dropna().unique().tolist()
+    periodos = conteo.index.tolist()
     if not periodos:
         raise ValueError("No hay información en 'periodo' para este subconjunto.")
 
@@ -224,17 +226,255 @@ def elegir_periodo_referencia(sub: pd.DataFrame) -> str:
         if p in periodos:
             return p
 
-    modo = sub["periodo"].mode()
-    return modo.iloc[0] if not modo.empty else periodos[0]
+    return conteo.idxmax()
 
 
 # ---------------------------------------------------------------------------
-# 1. Series de tiempo nacionales (niveles e índices)
+# Dibujo (corre dentro de los procesos del pool)
 # ---------------------------------------------------------------------------
 
-def generar_series_nacionales(df: pd.DataFrame, output_dir: Path):
-    asegurar_directorio(output_dir)
+def grafica(archivo: Path, tipo: str, figsize=None, rejilla=None, **datos) -> dict:
+    """
+    Especificación de una gráfica: archivo de salida, tipo de dibujo (llave de DIBUJOS,
+    o "paginas" para un documento paginado), tamaño, rejilla (filas, columnas) de ejes
+    y los datos ya preparados (arreglos, listas de texto, escalares).
+    """
+    return {"archivo": Path(archivo), "tipo": tipo, "figsize": figsize, "rejilla": rejilla, "datos": datos}
+
+
+def dibujar_serie(ax, x, y, titulo, ylabel, formato_y=None, metric=None,
+                  linewidth=1.8, referencia=None):
+    """Una serie de tiempo con marcadores (y línea de referencia opcional)."""
+    ax.plot(x, y, marker="o", linewidth=linewidth)
+    if referencia is not None:
+        ax.axhline(referencia, color="grey", linestyle="--", linewidth=1)
+    ax.set_title(titulo)
+    ax.set_xlabel("Fecha (trimestres)")
+    ax.set_ylabel(ylabel)
+    aplicar_formato(ax, "y", formato_y, metric)
+    ax.tick_params(axis="x", rotation=45)
+
+
+def dibujar_series(ax, series, titulo, ylabel, formato_y=None):
+    """Varias series con leyenda; `series` = [(x, y, etiqueta, linewidth), ...]."""
+    for x, y, etiqueta, linewidth in series:
+        ax.plot(x, y, marker="o", linewidth=linewidth, label=etiqueta)
+    ax.set_title(titulo)
+    ax.set_xlabel("Fecha (trimestres)")
+    ax.set_ylabel(ylabel)
+    aplicar_formato(ax, "y", formato_y)
+    ax.legend()
+    ax.tick_params(axis="x", rotation=45)
+
+
+def dibujar_barras(ax, etiquetas, valores, titulo, xlabel, formato_x=None, anotaciones=None):
+    """Barras horizontales (la primera arriba), con texto opcional al final de cada barra."""
+    ax.barh(etiquetas, valores)
+    ax.invert_yaxis()
+    ax.set_title(titulo)
+    ax.set_xlabel(xlabel)
+    aplicar_formato(ax, "x", formato_x)
+    if anotaciones is not None:
+        for i, (v, texto) in enumerate(zip(valores, anotaciones)):
+            ax.text(v, i, texto, va="center", ha="left", fontsize=9)
+
+
+def dibujar_heatmap(ax, valores, filas, columnas, titulo, etiqueta_barra, xlabel, ylabel):
+    """Mapa de calor de una matriz filas × columnas."""
+    tabla = pd.DataFrame(valores, index=filas, columns=columnas)
+    sns.heatmap(tabla, cmap="viridis", ax=ax, cbar_kws={"label": etiqueta_barra})
+    ax.set_title(titulo)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
+
+def dibujar_multiples(axes, paneles, titulo, ylabel, formato_y=None, metric=None):
+    """
+    Small multiples: un panel por (etiqueta, x, y) en la rejilla `axes` (eje x compartido);
+    los paneles que sobran se ocultan.
+    """
+    fig = axes.flat[0].figure
+    for ax, (etiqueta, x, y) in zip(axes.flat, paneles):
+        ax.plot(x, y, linewidth=1.2)
+        ax.set_title(etiqueta, fontsize=9)
+        aplicar_formato(ax, "y", formato_y, metric)
+        ax.tick_params(labelsize=7)
+        ax.tick_params(axis="x", rotation=45)
+    for ax in axes.flat[len(paneles):]:
+        ax.set_visible(False)
+    fig.suptitle(titulo)
+    fig.supylabel(ylabel)
+    # márgenes fijos: tight_layout sobre 32 ejes con fechas cuesta más que el dibujo mismo
+    fig.subplots_adjust(left=0.07, right=0.98, bottom=0.05, top=0.95, hspace=0.45, wspace=0.3)
+
+
+DIBUJOS = {
+    "serie": dibujar_serie,
+    "series": dibujar_series,
+    "barras": dibujar_barras,
+    "heatmap": dibujar_heatmap,
+    "multiples": dibujar_multiples,
+}
+
+
+def _svg_a_symbol(svg: str, id_: str) -> str:
+    """Convierte el SVG de una figura en un <symbol> (mismo viewBox) para el sprite."""
+    cuerpo = svg[svg.index("<svg"):]
+    apertura = cuerpo[:cuerpo.index(">") + 1]
+    viewbox = re.search(r'viewBox="([^"]+)"', apertura).group(1)
+    cuerpo = cuerpo[len(apertura):cuerpo.rindex("</svg>")]
+    return f'<symbol id="{id_}" viewBox="{viewbox}">{cuerpo}</symbol>\n'
+
+
+def guardar_paginas(archivo: Path, figsize, paginas, linewidth=1.4):
+    """
+    Documento paginado (PDF multipágina o sprite SVG) con una gráfica de serie por
+    página. Se construye una sola figura y una sola línea: cada página sólo cambia los
+    datos (set_data), el título, el eje Y y los límites.
+    """
+    fig, ax = plt.subplots(figsize=figsize)
+    primera = paginas[0]
+    linea, = ax.plot(primera["x"], primera["y"], marker="o", linewidth=linewidth)
+    ax.set_xlabel("Fecha (trimestres)")
+    ax.tick_params(axis="x", rotation=45)
+    # márgenes fijos en todas las páginas (sin tight_layout por página)
+    fig.subplots_adjust(left=0.15, right=0.97, bottom=0.17, top=0.92)
+
+    def preparar(pagina):
+        linea.set_data(pagina["x"], pagina["y"])
+        ax.set_title(pagina["titulo"])
+        ax.set_ylabel(pagina["ylabel"])
+        ax.yaxis.set_major_formatter(ScalarFormatter())  # no arrastrar el formato de la página anterior
+        aplicar_formato(ax, "y", pagina.get("formato_y"), pagina.get("metric"))
+        ax.relim()
+        ax.autoscale_view()
+
+    if archivo.suffix == ".pdf":
+        with PdfPages(archivo) as pdf:
+            for pagina in paginas:
+                preparar(pagina)
+                pdf.savefig(fig)
+    else:
+        simbolos = []
+        for pagina in paginas:
+            preparar(pagina)
+            buf = io.StringIO()
+            fig.savefig(buf, format="svg")
+            simbolos.append(_svg_a_symbol(buf.getvalue(), pagina["id"]))
+        archivo.write_text(
+            '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            'style="display:none">\n' + "".join(simbolos) + "</svg>\n",
+            encoding="utf-8",
+        )
+    plt.close(fig)
+
+
+def renderizar_grafica(g: dict) -> tuple[Path, float]:
+    """Dibuja y guarda una gráfica (o un documento paginado); devuelve (archivo, segundos)."""
+    t0 = time.perf_counter()
+    if g["tipo"] == "paginas":
+        guardar_paginas(g["archivo"], g["figsize"], **g["datos"])
+        return g["archivo"], time.perf_counter() - t0
+
+    filas, columnas = g.get("rejilla") or (1, 1)
+    fig, ax = plt.subplots(filas, columnas, figsize=g["figsize"], sharex=g.get("rejilla") is not None,
+                           squeeze=g.get("rejilla") is None)
+    DIBUJOS[g["tipo"]](ax, **g["datos"])
+    if g.get("rejilla") is None:
+        fig.tight_layout()
+        fig.savefig(g["archivo"], dpi=DPI, bbox_inches="tight")
+    else:  # la rejilla ya fijó sus márgenes
+        fig.savefig(g["archivo"], dpi=DPI)
+    plt.close(fig)
+    return g["archivo"], time.perf_counter() - t0
+
+
+# ---------------------------------------------------------------------------
+# Planificador: caché de render + pool de procesos
+# ---------------------------------------------------------------------------
+
+def _actualizar_huella(h, valor):
+    if isinstance(valor, np.ndarray):
+        h.update(f"{valor.dtype}{valor.shape}".encode("utf-8"))
+        h.update(np.ascontiguousarray(valor).tobytes())
+    elif isinstance(valor, dict):
+        for llave in sorted(valor):
+            h.update(llave.encode("utf-8"))
+            _actualizar_huella(h, valor[llave])
+    elif isinstance(valor, (list, tuple)):
+        h.update(b"[")
+        for v in valor:
+            _actualizar_huella(h, v)
+        h.update(b"]")
+    else:
+        h.update(repr(valor).encode("utf-8"))
+
+
+def huella_grafica(g: dict) -> str:
+    """Hash de todo lo que determina la imagen: datos, tipo, tamaño, estilo, DPI y versiones."""
+    h = hashlib.sha256()
+    _actualizar_huella(h, [
+        RENDER_VERSION, matplotlib.__version__, sns.__version__, ESTILO_SNS, ESTILO, DPI,
+        g["tipo"], g["figsize"], g["rejilla"], g["datos"],
+    ])
+    return h.hexdigest()
+
+
+def renderizar(graficas: list[dict], output_dir: Path, workers: int = RENDER_WORKERS,
+               usar_cache: bool = USE_RENDER_CACHE):
+    """
+    Dibuja las gráficas cuya huella cambió (o cuyo archivo no existe) en un pool de
+    `workers` procesos e imprime el tiempo de cada una. La caché se guarda aunque
+    falle alguna gráfica, con las que sí se terminaron.
+    """
+    cache_path = output_dir / RENDER_CACHE_NAME
+    cache = {}
+    if usar_cache and cache_path.exists():
+        cache = json.loads(cache_path.read_text(encoding="utf-8"))
+
+    def llave(archivo: Path) -> str:
+        return Path(os.path.relpath(archivo, output_dir)).as_posix()
+
+    huellas = {llave(g["archivo"]): huella_grafica(g) for g in graficas}
+    pendientes = [
+        g for g in graficas
+        if cache.get(llave(g["archivo"])) != huellas[llave(g["archivo"])] or not g["archivo"].exists()
+    ]
+    print(
+        f"Gráficas: {len(graficas)} ({len(graficas) - len(pendientes)} sin cambios, "
+        f"{len(pendientes)} por dibujar; {workers} proceso(s))"
+    )
+    for carpeta in sorted({g["archivo"].parent for g in pendientes}):
+        asegurar_directorio(carpeta)
+
+    t0 = time.perf_counter()
+
+    def terminar(archivo: Path, segundos: float):
+        cache[llave(archivo)] = huellas[llave(archivo)]
+        print(f"  {segundos:6.2f} s  {llave(archivo)}")
 
+    try:
+        if workers <= 1 or len(pendientes) <= 1:
+            for g in pendientes:
+                terminar(*renderizar_grafica(g))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=configurar_estilo) as pool:
+                futuros = [pool.submit(renderizar_grafica, g) for g in pendientes]
+                for futuro in as_completed(futuros):
+                    terminar(*futuro.result())
+    finally:
+        if usar_cache:
+            asegurar_directorio(output_dir)
+            cache_path.write_text(json.dumps(cache, indent=1, sort_keys=True), encoding="utf-8")
+
+    print(f"Render: {len(pendientes)} gráficas en {time.perf_counter() - t0:.1f} s")
+
+
+# ---------------------------------------------------------------------------
+# 1. Series de tiempo nacionales (niveles e índices)
+# ---------------------------------------------------------------------------
+
+def generar_series_nacionales(cubo: CuboMeitef, output_dir: Path) -> list[dict]:
     combos_nivel = [
         ("vab_comercio_informal", "Millones de pesos a precios corrientes"),
         ("vab_comercio_informal", "Millones de pesos a precios de 2018"),
@@ -243,144 +483,158 @@ def generar_series_nacionales(df: pd.DataFrame, output_dir: Path):
     ]
 
     combos_indice = [
-        ("vab_comercio_informal", "Ãndice de volumen fÃ­sico base 2018=100"),
-        ("remuneraciones_comercio_informal", "Ãndice de volumen fÃ­sico base 2018=100"),
-        ("puestos_trabajo_comercio_informal", "Ãndice de volumen fÃ­sico base 2018=100"),
+        ("vab_comercio_informal", "Índice de volumen físico base 2018=100"),
+        ("remuneraciones_comercio_informal", "Índice de volumen físico base 2018=100"),
+        ("puestos_trabajo_comercio_informal", "Índice de volumen físico base 2018=100"),
     ]
 
+    graficas = []
+
     # Series de niveles
     for indicador, metric in combos_nivel:
-        sub = filtrar_subset(df, indicador, metric)
-        sub = sub[sub["es_nacional"]]
-        if sub.empty:
+        serie = cubo.serie(indicador, metric, NACIONAL)
+        if serie.empty:
             continue
 
-        sub = sub.sort_values("fecha")
-
-        fig, ax = plt.subplots()
-        ax.plot(sub["fecha"], sub["valor"], marker="o", linewidth=1.8)
-
-        ax.set_title(
-            f"Serie nacional – {indicador.replace('_', ' ')} ({metric})"
-        )
-        ax.set_xlabel("Fecha (trimestres)")
-        ax.set_ylabel(metric)
-        aplicar_formato_eje_y_metric(ax, metric)
-        ax.tick_params(axis="x", rotation=45)
-        fig.tight_layout()
-
-        fname = f"serie_nacional_{slugify(indicador)}_{slugify(metric)}.png"
-        fig.savefig(output_dir / fname, dpi=300, bbox_inches="tight")
-        plt.close(fig)
+        graficas.append(grafica(
+            output_dir / f"serie_nacional_{slugify(indicador)}_{slugify(metric)}.png",
+            "serie",
+            x=serie.index.to_numpy(),
+            y=serie.to_numpy(dtype=float),
+            titulo=f"Serie nacional – {indicador.replace('_', ' ')} ({metric})",
+            ylabel=metric,
+            formato_y="metric",
+            metric=metric,
+        ))
 
     # Series de índices de volumen
     for indicador, metric in combos_indice:
-        sub = filtrar_subset(df, indicador, metric)
-        sub = sub[sub["es_nacional"]]
-        if sub.empty:
+        serie = cubo.serie(indicador, metric, NACIONAL)
+        if serie.empty:
             continue
 
-        sub = sub.sort_values("fecha")
-
-        fig, ax = plt.subplots()
-        ax.plot(sub["fecha"], sub["valor"], marker="o", linewidth=1.8)
-
-        ax.axhline(100, color="grey", linestyle="--", linewidth=1)
-        ax.set_title(
-            f"Índice de volumen – Serie nacional – {indicador.replace('_', ' ')}"
-        )
-        ax.set_xlabel("Fecha (trimestres)")
-        ax.set_ylabel("Índice (2018 = 100)")
-        aplicar_formato_eje_y_metric(ax, metric)
-        ax.tick_params(axis="x", rotation=45)
-        fig.tight_layout()
+        graficas.append(grafica(
+            output_dir / f"indice_volumen_nacional_{slugify(indicador)}.png",
+            "serie",
+            x=serie.index.to_numpy(),
+            y=serie.to_numpy(dtype=float),
+            titulo=f"Índice de volumen – Serie nacional – {indicador.replace('_', ' ')}",
+            ylabel="Índice (2018 = 100)",
+            formato_y="metric",
+            metric=metric,
+            referencia=100,
+        ))
 
-        fname = f"indice_volumen_nacional_{slugify(indicador)}.png"
-        fig.savefig(output_dir / fname, dpi=300, bbox_inches="tight")
-        plt.close(fig)
+    return graficas
 
 
 # ---------------------------------------------------------------------------
 # 2. Series de tiempo por estado
 # ---------------------------------------------------------------------------
 
-def generar_series_estatales(df: pd.DataFrame, output_dir: Path):
-    asegurar_directorio(output_dir)
-
+def generar_series_estatales(cubo: CuboMeitef, output_dir: Path, modo: str = MODO_ESTATALES,
+                             paginado: str | None = PAGINADO_ESTATALES) -> list[dict]:
+    """
+    Series por estado. Según `modo`: una rejilla de small multiples por indicador/metric
+    ("multiples"), un PNG por estado ("png") o ambas. Con `paginado` ("pdf"/"svg") se
+    agrega un solo documento con una página por estado de todos los combos.
+    """
     combos = [
         ("vab_comercio_informal", "Millones de pesos a precios de 2018"),  # VAB real
         ("remuneraciones_comercio_informal", "Millones de pesos a precios de 2018"),
         ("puestos_trabajo_comercio_informal", "Unidades"),
     ]
 
-    estados = sorted(df.loc[~df["es_nacional"], "estado"].unique())
+    estados = [e for e in cubo.estados if e != NACIONAL]
+    graficas = []
+    paginas = []
 
     for indicador, metric in combos:
-        sub = filtrar_subset(df, indicador, metric)
-        sub = sub[~sub["es_nacional"]]
-        if sub.empty:
-            continue
+        panel = cubo.panel(indicador, metric)
+        paneles = []
 
         for estado in estados:
-            sub_e = sub[sub["estado"] == estado]
-            if sub_e.empty:
+            if estado not in panel.index:
                 continue
-
-            sub_e = sub_e.sort_values("fecha")
-
-            fig, ax = plt.subplots()
-            ax.plot(sub_e["fecha"], sub_e["valor"], marker="o", linewidth=1.4)
-
-            ax.set_title(f"{estado} – {indicador.replace('_', ' ')} ({metric})")
-            ax.set_xlabel("Fecha (trimestres)")
-            ax.set_ylabel(metric)
-            aplicar_formato_eje_y_metric(ax, metric)
-            ax.tick_params(axis="x", rotation=45)
-            fig.tight_layout()
-
-            fname = (
-                f"serie_{slugify(indicador)}_{slugify(metric)}_{slugify(estado)}.png"
-            )
-            fig.savefig(output_dir / fname, dpi=300, bbox_inches="tight")
-            plt.close(fig)
+            serie = panel.loc[estado].dropna()
+            x = serie.index.to_numpy()
+            y = serie.to_numpy(dtype=float)
+            titulo = f"{estado} – {indicador.replace('_', ' ')} ({metric})"
+            slug = f"{slugify(indicador)}_{slugify(metric)}_{slugify(estado)}"
+            paneles.append((estado, x, y))
+            paginas.append({"id": slug, "x": x, "y": y, "titulo": titulo, "ylabel": metric,
+                            "formato_y": "metric", "metric": metric})
+
+            if modo in ("png", "ambos"):
+                graficas.append(grafica(
+                    output_dir / f"serie_{slug}.png",
+                    "serie",
+                    x=x,
+                    y=y,
+                    titulo=titulo,
+                    ylabel=metric,
+                    formato_y="metric",
+                    metric=metric,
+                    linewidth=1.4,
+                ))
+
+        if paneles and modo in ("multiples", "ambos"):
+            filas = -(-len(paneles) // COLUMNAS_MULTIPLES)
+            graficas.append(grafica(
+                output_dir / f"multiples_{slugify(indicador)}_{slugify(metric)}.png",
+                "multiples",
+                figsize=(4 * COLUMNAS_MULTIPLES, 2.2 * filas),
+                rejilla=(filas, COLUMNAS_MULTIPLES),
+                paneles=paneles,
+                titulo=f"{indicador.replace('_', ' ')} por estado ({metric})",
+                ylabel=metric,
+                formato_y="metric",
+                metric=metric,
+            ))
+
+    if paginas and paginado is not None:
+        graficas.append(grafica(
+            output_dir / f"series_estatales.{paginado}",
+            "paginas",
+            paginas=paginas,
+        ))
+
+    return graficas
 
 
 # ---------------------------------------------------------------------------
 # 3. Rankings estatales (niveles y participación en el total)
 # ---------------------------------------------------------------------------
 
-def generar_rankings_estatales(df: pd.DataFrame, output_dir: Path):
-    asegurar_directorio(output_dir)
-
+def generar_rankings_estatales(cubo: CuboMeitef, output_dir: Path) -> list[dict]:
     indicador = "vab_comercio_informal"
     metric = "Millones de pesos a precios de 2018"
-    sub = filtrar_subset(df, indicador, metric)
-    if sub.empty:
-        return
+    conteo = cubo.conteo_periodos(indicador, metric)
+    if conteo.empty:
+        return []
 
-    periodo_ref = elegir_periodo_referencia(sub)
-    sub = sub[sub["periodo"] == periodo_ref]
+    periodo_ref = elegir_periodo_referencia(conteo)
+    panel = cubo.panel(indicador, metric, periodo=periodo_ref)
 
-    ultimo_anio = sub["anio"].max()
+    ultimo_anio = panel.columns.year.max()
 
-    sub_ultimo = sub[sub["anio"] == ultimo_anio]
+    valores_ultimo = panel.loc[:, panel.columns.year == ultimo_anio].sum(axis=1, min_count=1).dropna()
 
-    sub_estados = sub_ultimo[~sub_ultimo["es_nacional"]]
-    sub_nacional = sub_ultimo[sub_ultimo["es_nacional"]]
+    sub_estados = valores_ultimo.drop(NACIONAL, errors="ignore")
 
-    if sub_estados.empty or sub_nacional.empty:
+    if sub_estados.empty or NACIONAL not in valores_ultimo.index:
         print("Advertencia: no hay datos suficientes para rankings en", ultimo_anio)
-        return
+        return []
 
-    total_nacional = sub_nacional["valor"].sum()
+    total_nacional = valores_ultimo[NACIONAL]
 
     if total_nacional <= 0:
         print("Advertencia: total nacional <= 0 en", ultimo_anio, "- se omite ranking.")
-        return
+        return []
 
     resumen = (
-        sub_estados.groupby("estado", as_index=False)["valor"]
-        .sum()
+        sub_estados.rename("valor")
+        .reset_index()
         .sort_values("valor", ascending=False)
     )
     resumen["participacion_pct"] = 100 * resumen["valor"] / total_nacional
@@ -388,257 +642,208 @@ def generar_rankings_estatales(df: pd.DataFrame, output_dir: Path):
     # Top 10 por nivel
     top10 = resumen.head(10)
 
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.barh(top10["estado"], top10["valor"])
-    ax.invert_yaxis()
-
-    ax.set_title(
-        f"Top 10 estados por VAB del comercio informal\n"
-        f"{ultimo_anio} – {metric} – periodo {periodo_ref}"
+    ranking = grafica(
+        output_dir / f"ranking_vab_estados_top10_{ultimo_anio}.png",
+        "barras",
+        figsize=(10, 6),
+        etiquetas=top10["estado"].tolist(),
+        valores=top10["valor"].to_numpy(dtype=float),
+        titulo=(
+            f"Top 10 estados por VAB del comercio informal\n"
+            f"{ultimo_anio} – {metric} – periodo {periodo_ref}"
+        ),
+        xlabel="VAB (millones de pesos de 2018)",
+        formato_x="monetario",
+        anotaciones=[f"{pct:.1f} %" for pct in top10["participacion_pct"]],
     )
-    ax.set_xlabel("VAB (millones de pesos de 2018)")
-    ax.xaxis.set_major_formatter(FuncFormatter(fmt_monetario_millones))
-    for i, (v, pct) in enumerate(zip(top10["valor"], top10["participacion_pct"])):
-        ax.text(v, i, f"{pct:.1f} %", va="center", ha="left", fontsize=9)
-
-    fig.tight_layout()
-    fname = f"ranking_vab_estados_top10_{ultimo_anio}.png"
-    fig.savefig(output_dir / fname, dpi=300, bbox_inches="tight")
-    plt.close(fig)
 
     # Participación completa
-    fig, ax = plt.subplots(figsize=(10, 8))
-    ax.barh(resumen["estado"], resumen["participacion_pct"])
-    ax.invert_yaxis()
-    ax.set_title(
-        f"Participación de cada estado en el VAB nacional del comercio informal\n"
-        f"{ultimo_anio} – {metric} – periodo {periodo_ref}"
+    participacion = grafica(
+        output_dir / f"participacion_vab_estados_{ultimo_anio}.png",
+        "barras",
+        figsize=(10, 8),
+        etiquetas=resumen["estado"].tolist(),
+        valores=resumen["participacion_pct"].to_numpy(dtype=float),
+        titulo=(
+            f"Participación de cada estado en el VAB nacional del comercio informal\n"
+            f"{ultimo_anio} – {metric} – periodo {periodo_ref}"
+        ),
+        xlabel="Participación (%)",
+        formato_x="porcentaje",
     )
-    ax.set_xlabel("Participación (%)")
-    ax.xaxis.set_major_formatter(FuncFormatter(fmt_porcentaje))
-    fig.tight_layout()
-    fname = f"participacion_vab_estados_{ultimo_anio}.png"
-    fig.savefig(output_dir / fname, dpi=300, bbox_inches="tight")
-    plt.close(fig)
+
+    return [ranking, participacion]
 
 
 # ---------------------------------------------------------------------------
 # 4. Comparación dinámica nacional vs principales estados (trimestral)
 # ---------------------------------------------------------------------------
 
-def generar_comparaciones_dinamicas(df: pd.DataFrame, output_dir: Path):
+def generar_comparaciones_dinamicas(cubo: CuboMeitef, output_dir: Path) -> list[dict]:
     """
     Compara la trayectoria del VAB informal nacional con los principales estados
     usando la frecuencia original (trimestral). El eje x se construye con 'fecha'.
     """
-    asegurar_directorio(output_dir)
-
     indicador = "vab_comercio_informal"
     metric = "Millones de pesos a precios de 2018"
-    sub = filtrar_subset(df, indicador, metric)
-    if sub.empty:
-        return
+    conteo = cubo.conteo_periodos(indicador, metric)
+    if conteo.empty:
+        return []
 
-    periodo_ref = elegir_periodo_referencia(sub)
-    sub = sub[sub["periodo"] == periodo_ref].copy()
+    periodo_ref = elegir_periodo_referencia(conteo)
+    panel = cubo.panel(indicador, metric, periodo=periodo_ref)
 
-    # Orden por fecha
-    sub = sub.sort_values(["estado", "fecha"])
-
-    # Nacional y estatales
-    serie_nacional = sub[sub["es_nacional"]].copy()
-    sub_estados = sub[~sub["es_nacional"]].copy()
+    # Nacional y estatales (un valor por estado y fecha, columnas ordenadas por fecha)
+    if NACIONAL not in panel.index:
+        return []
+    nacional = panel.loc[NACIONAL]
+    serie_nacional = nacional.dropna()
+    sub_estados = panel.drop(index=NACIONAL).dropna(axis=1, how="all")
 
     if serie_nacional.empty or sub_estados.empty:
-        return
-
-    # Aseguramos unicidad por fecha
-    serie_nacional = (
-        serie_nacional.groupby("fecha", as_index=False)["valor"]
-        .sum()
-        .sort_values("fecha")
-    )
-    sub_estados = (
-        sub_estados.groupby(["estado", "fecha"], as_index=False)["valor"]
-        .sum()
-        .sort_values(["estado", "fecha"])
-    )
-    sub_estados["anio"] = sub_estados["fecha"].dt.year
+        return []
 
     # Último año disponible para ranking de top estados
-    ultimo_anio = sub_estados["anio"].max()
-    sub_ultimo = sub_estados[sub_estados["anio"] == ultimo_anio]
-
-    if sub_ultimo.empty:
-        return
+    ultimo_anio = sub_estados.columns.year.max()
+    sub_ultimo = sub_estados.loc[:, sub_estados.columns.year == ultimo_anio]
 
     top5_estados = (
-        sub_ultimo.groupby("estado", as_index=False)["valor"]
-        .sum()
-        .sort_values("valor", ascending=False)["estado"]
+        sub_ultimo.sum(axis=1, min_count=1)
+        .dropna()
+        .sort_values(ascending=False)
         .head(5)
-        .tolist()
+        .index.tolist()
     )
 
     # Plot 1: nacional vs top 5 en niveles trimestrales
-    fig, ax = plt.subplots(figsize=(10, 6))
-
-    ax.plot(
-        serie_nacional["fecha"],
-        serie_nacional["valor"],
-        marker="o",
-        linewidth=2.0,
-        label="Nacional",
-    )
-
+    series = [(serie_nacional.index.to_numpy(), serie_nacional.to_numpy(dtype=float), "Nacional", 2.0)]
     for estado in top5_estados:
-        sub_e = sub_estados[sub_estados["estado"] == estado]
-        ax.plot(
-            sub_e["fecha"],
-            sub_e["valor"],
-            marker="o",
-            linewidth=1.2,
-            label=estado,
-        )
-
-    ax.set_title(
-        "VAB del comercio informal – Nacional vs principales estados\n"
-        f"{metric} – periodo {periodo_ref}"
+        sub_e = sub_estados.loc[estado].dropna()
+        series.append((sub_e.index.to_numpy(), sub_e.to_numpy(dtype=float), estado, 1.2))
+
+    niveles = grafica(
+        output_dir / "serie_nacional_vs_top5_estados_vab_trimestral.png",
+        "series",
+        figsize=(10, 6),
+        series=series,
+        titulo=(
+            "VAB del comercio informal – Nacional vs principales estados\n"
+            f"{metric} – periodo {periodo_ref}"
+        ),
+        ylabel="VAB (millones de pesos de 2018)",
+        formato_y="monetario",
     )
-    ax.set_xlabel("Fecha (trimestres)")
-    ax.set_ylabel("VAB (millones de pesos de 2018)")
-    ax.yaxis.set_major_formatter(FuncFormatter(fmt_monetario_millones))
-    ax.legend()
-    ax.tick_params(axis="x", rotation=45)
-    fig.tight_layout()
-
-    fname = "serie_nacional_vs_top5_estados_vab_trimestral.png"
-    fig.savefig(output_dir / fname, dpi=300, bbox_inches="tight")
-    plt.close(fig)
 
     # Plot 2: participación trimestral de los top 5 en el total nacional
-    total_nac_fecha = (
-        serie_nacional[["fecha", "valor"]]
-        .rename(columns={"valor": "valor_nac"})
-        .copy()
-    )
-
-    participaciones = (
-        sub_estados.merge(total_nac_fecha, on="fecha", how="left")
-        .assign(participacion_pct=lambda x: 100 * x["valor"] / x["valor_nac"])
-    )
+    participaciones = 100 * sub_estados.loc[top5_estados] / nacional[sub_estados.columns]
 
-    fig, ax = plt.subplots(figsize=(10, 6))
+    series = []
     for estado in top5_estados:
-        sub_e = participaciones[participaciones["estado"] == estado]
-        ax.plot(
-            sub_e["fecha"],
-            sub_e["participacion_pct"],
-            marker="o",
-            linewidth=1.5,
-            label=estado,
-        )
-
-    ax.set_title(
-        "Participación de los principales estados en el VAB informal nacional\n"
-        f"{metric} – periodo {periodo_ref}"
+        sub_e = participaciones.loc[estado, sub_estados.loc[estado].notna()]
+        series.append((sub_e.index.to_numpy(), sub_e.to_numpy(dtype=float), estado, 1.5))
+
+    participacion = grafica(
+        output_dir / "participacion_top5_estados_vab_trimestral.png",
+        "series",
+        figsize=(10, 6),
+        series=series,
+        titulo=(
+            "Participación de los principales estados en el VAB informal nacional\n"
+            f"{metric} – periodo {periodo_ref}"
+        ),
+        ylabel="Participación en el total nacional (%)",
+        formato_y="porcentaje",
     )
-    ax.set_xlabel("Fecha (trimestres)")
-    ax.set_ylabel("Participación en el total nacional (%)")
-    ax.yaxis.set_major_formatter(FuncFormatter(fmt_porcentaje))
-    ax.legend()
-    ax.tick_params(axis="x", rotation=45)
-    fig.tight_layout()
 
-    fname = "participacion_top5_estados_vab_trimestral.png"
-    fig.savefig(output_dir / fname, dpi=300, bbox_inches="tight")
-    plt.close(fig)
+    return [niveles, participacion]
 
 
 # ---------------------------------------------------------------------------
 # 5. Heatmap estado–año (análisis espacial aproximado)
 # ---------------------------------------------------------------------------
 
-def generar_heatmap_estados(df: pd.DataFrame, output_dir: Path):
-    asegurar_directorio(output_dir)
-
+def generar_heatmap_estados(cubo: CuboMeitef, output_dir: Path) -> list[dict]:
     indicador = "vab_comercio_informal"
     metric = "Millones de pesos a precios de 2018"
-    sub = filtrar_subset(df, indicador, metric)
-    sub = sub[~sub["es_nacional"]]
-    if sub.empty:
-        return
-
-    periodo_ref = elegir_periodo_referencia(sub)
-    sub = sub[sub["periodo"] == periodo_ref]
-
-    sub_agg = (
-        sub.groupby(["estado", "anio"], as_index=False)["valor"]
-        .sum()
-        .sort_values(["estado", "anio"])
+    conteo = cubo.conteo_periodos(indicador, metric)
+    if conteo.empty:
+        return []
+
+    periodo_ref = elegir_periodo_referencia(conteo)
+    panel = (
+        cubo.panel(indicador, metric, periodo=periodo_ref)
+        .drop(index=NACIONAL, errors="ignore")
+        .dropna(axis=1, how="all")
     )
+    if panel.empty:
+        return []
 
-    tabla = sub_agg.pivot(index="estado", columns="anio", values="valor")
+    # estado × año (un periodo de referencia por año)
+    tabla = panel.T.groupby(panel.columns.year.rename("anio")).sum(min_count=1).T
 
     tabla_norm = tabla.div(tabla.max(axis=1), axis=0) * 100
 
-    fig, ax = plt.subplots(figsize=(12, 10))
-    sns.heatmap(
-        tabla_norm,
-        cmap="viridis",
-        ax=ax,
-        cbar_kws={"label": "VAB relativo al máximo histórico del estado (máximo = 100)"},
-    )
-    ax.set_title(
-        "Mapa de calor estado–año del VAB del comercio informal\n"
-        f"Millones de pesos de 2018 – periodo {periodo_ref}"
-    )
-    ax.set_xlabel("Año")
-    ax.set_ylabel("Estado")
-    fig.tight_layout()
-
-    fname = "heatmap_vab_estados_anio_normalizado.png"
-    fig.savefig(output_dir / fname, dpi=300, bbox_inches="tight")
-    plt.close(fig)
+    return [grafica(
+        output_dir / "heatmap_vab_estados_anio_normalizado.png",
+        "heatmap",
+        figsize=(12, 10),
+        valores=tabla_norm.to_numpy(dtype=float),
+        filas=tabla_norm.index.tolist(),
+        columnas=[int(a) for a in tabla_norm.columns],
+        titulo=(
+            "Mapa de calor estado–año del VAB del comercio informal\n"
+            f"Millones de pesos de 2018 – periodo {periodo_ref}"
+        ),
+        etiqueta_barra="VAB relativo al máximo histórico del estado (máximo = 100)",
+        xlabel="Año",
+        ylabel="Estado",
+    )]
 
 
 # ---------------------------------------------------------------------------
 # 6. Series nacionales de variación porcentual anual
 # ---------------------------------------------------------------------------
 
-def generar_series_variacion_nacional(df: pd.DataFrame, output_dir: Path):
-    asegurar_directorio(output_dir)
-
+def generar_series_variacion_nacional(cubo: CuboMeitef, output_dir: Path) -> list[dict]:
+    """
+    Variación porcentual anual (contra el mismo trimestre del año anterior) de los
+    niveles trimestrales: se calcula para todos los estados a la vez y se grafica el
+    renglón nacional. Reproduce las variaciones publicadas por MEITEF, salvo el primer
+    año, que el tabulado publica como 0.
+    """
     combos_var = [
-        ("vab_comercio_informal", "VariaciÃ³n porcentual anual"),
-        ("remuneraciones_comercio_informal", "VariaciÃ³n porcentual anual"),
-        ("puestos_trabajo_comercio_informal", "VariaciÃ³n porcentual anual"),
+        ("vab_comercio_informal", "Millones de pesos a precios de 2018"),
+        ("remuneraciones_comercio_informal", "Millones de pesos a precios corrientes"),
+        ("puestos_trabajo_comercio_informal", "Unidades"),
     ]
+    trimestres = cubo.periodos_trimestrales()
 
+    graficas = []
     for indicador, metric in combos_var:
-        sub = filtrar_subset(df, indicador, metric)
-        sub = sub[sub["es_nacional"]]
-        if sub.empty:
+        panel = cubo.panel(indicador, metric, periodo=trimestres)
+        if NACIONAL not in panel.index:
             continue
 
-        sub = sub.sort_values("fecha")
+        var = TRANSFORMACIONES.obtener((indicador, metric, "trimestral"), variacion, panel.to_numpy(), 4)
+        serie = pd.Series(var[panel.index.get_loc(NACIONAL)], index=panel.columns).dropna()
+        if serie.empty:
+            continue
 
-        fig, ax = plt.subplots()
-        ax.plot(sub["fecha"], sub["valor"], marker="o", linewidth=1.8)
+        graficas.append(grafica(
+            output_dir / f"variacion_anual_nacional_{slugify(indicador)}.png",
+            "serie",
+            x=serie.index.to_numpy(),
+            y=serie.to_numpy(dtype=float),
+            titulo=(
+                f"Variación porcentual anual – Serie nacional – {indicador.replace('_', ' ')}\n"
+                f"{metric} – contra el mismo trimestre del año anterior"
+            ),
+            ylabel="Tasa de crecimiento anual (%)",
+            formato_y="porcentaje",
+            referencia=0,
+        ))
 
-        ax.axhline(0, color="grey", linestyle="--", linewidth=1)
-        ax.set_title(
-            f"Variación porcentual anual – Serie nacional – {indicador.replace('_', ' ')}"
-        )
-        ax.set_xlabel("Fecha (trimestres)")
-        ax.set_ylabel("Tasa de crecimiento anual (%)")
-        ax.yaxis.set_major_formatter(FuncFormatter(fmt_porcentaje))
-        ax.tick_params(axis="x", rotation=45)
-        fig.tight_layout()
-
-        fname = f"variacion_anual_nacional_{slugify(indicador)}.png"
-        fig.savefig(output_dir / fname, dpi=300, bbox_inches="tight")
-        plt.close(fig)
+    return graficas
 
 
 # ---------------------------------------------------------------------------
@@ -648,7 +853,7 @@ def generar_series_variacion_nacional(df: pd.DataFrame, output_dir: Path):
 def main():
     configurar_estilo()
 
-    df = cargar_y_preparar_datos(DATA_PATH)
+    cubo = cargar_y_preparar_datos(TIDY_DIR)
 
     # Subcarpetas de salida
     dir_series_nacionales = OUTPUT_PLOTS_DIR / "series_nacionales"
@@ -658,23 +863,28 @@ def main():
     dir_heatmaps = OUTPUT_PLOTS_DIR / "heatmaps"
     dir_variacion = OUTPUT_PLOTS_DIR / "series_variacion_anual"
 
-    print("\nGenerando series de tiempo nacionales...")
-    generar_series_nacionales(df, dir_series_nacionales)
+    graficas = []
+
+    print("\nPreparando series de tiempo nacionales...")
+    graficas += generar_series_nacionales(cubo, dir_series_nacionales)
+
+    print("Preparando series de tiempo por estado...")
+    graficas += generar_series_estatales(cubo, dir_series_estatales, MODO_ESTATALES, PAGINADO_ESTATALES)
 
-    print("Generando series de tiempo por estado...")
-    generar_series_estatales(df, dir_series_estatales)
+    print("Preparando rankings y participaciones estatales...")
+    graficas += generar_rankings_estatales(cubo, dir_rankings)
 
-    print("Generando rankings y participaciones estatales...")
-    generar_rankings_estatales(df, dir_rankings)
+    print("Preparando comparaciones dinámicas (nacional vs top estados, trimestral)...")
+    graficas += generar_comparaciones_dinamicas(cubo, dir_comparaciones)
 
-    print("Generando comparaciones dinámicas (nacional vs top estados, trimestral)...")
-    generar_comparaciones_dinamicas(df, dir_comparaciones)
+    print("Preparando heatmap estado–año...")
+    graficas += generar_heatmap_estados(cubo, dir_heatmaps)
 
-    print("Generando heatmap estado–año...")
-    generar_heatmap_estados(df, dir_heatmaps)
+    print("Preparando series de variación porcentual anual (nacional)...")
+    graficas += generar_series_variacion_nacional(cubo, dir_variacion)
 
-    print("Generando series de variación porcentual anual (nacional)...")
-    generar_series_variacion_nacional(df, dir_variacion)
+    print()
+    renderizar(graficas, OUTPUT_PLOTS_DIR, workers=RENDER_WORKERS, usar_cache=USE_RENDER_CACHE)
 
     print("\nListo. Todas las gráficas se guardaron en:")
     print(OUTPUT_PLOTS_DIR)
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de mínimos cuadrados por lotes para elasticidades (modelos log-log).
+
+- ols_lote(): resuelve B regresiones pequeñas a la vez con QR apilada de NumPy
+  (X de forma B × T × k). Las observaciones con NaN se descartan por regresión.
+  Devuelve coeficientes, errores estándar, R² y n.
+- ols_movil(): regresión simple y = a + b·x en ventanas móviles para B series.
+  Las ventanas se actualizan de forma incremental: al avanzar se suma la fila que
+  entra a X'X, X'y, y'y y se resta la que sale (actualizaciones de rango uno), en
+  lugar de reajustar cada ventana desde cero.
+- elasticidades(): arma los lotes dependiente × serie × rezago (× ventana) a partir
+  de dos DataFrames trimestrales (índice = fecha) y devuelve una tabla tidy.
+- verificar_con_statsmodels(): reajusta una muestra de la tabla con statsmodels
+  (sólo para verificar; el motor no depende de statsmodels).
+"""
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_COEF = ["alpha", "beta", "se_alpha", "se_beta", "t_beta", "r2"]
+
+
+# ==== NÚCLEO =================================================================
+
+def ols_lote(X: np.ndarray, Y: np.ndarray) -> dict:
+    """
+    OLS para cada b: Y[b] = X[b] @ coef[b]. X: (B, T, k), Y: (B, T).
+    Las filas con algún NaN (en X o en Y) no cuentan. El R² es el centrado, así que
+    supone que X incluye la constante. Regresiones sin rango completo o sin grados
+    de libertad quedan en NaN.
+    Devuelve {"coef": (B, k), "se": (B, k), "r2": (B,), "n": (B,)}.
+    """
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    k = X.shape[2]
+
+    ok = np.isfinite(Y) & np.isfinite(X).all(axis=2)
+    Xw = np.where(ok[..., None], X, 0.0)
+    Yw = np.where(ok, Y, 0.0)
+    n = ok.sum(axis=1)
+
+    Q, R = np.linalg.qr(Xw)
+    diag = np.abs(np.diagonal(R, axis1=1, axis2=2))
+    valido = (n > k) & (diag > 1e-10 * np.maximum(diag.max(axis=1, keepdims=True), 1e-300)).all(axis=1)
+    R = np.where(valido[:, None, None], R, np.eye(k))
+
+    coef = np.linalg.solve(R, np.einsum("btk,bt->bk", Q, Yw)[..., None])[..., 0]
+    resid = Yw - np.einsum("btk,bk->bt", Xw, coef)      # filas descartadas: 0 - 0
+    rss = (resid ** 2).sum(axis=1)
+    sigma2 = rss / np.maximum(n - k, 1)
+
+    r_inv = np.linalg.inv(R)
+    var = sigma2[:, None] * (r_inv ** 2).sum(axis=2)     # diag((R'R)^-1) = filas de R^-1 al cuadrado
+    y_media = Yw.sum(axis=1) / np.maximum(n, 1)
+    tss = (np.where(ok, Y - y_media[:, None], 0.0) ** 2).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r2 = 1.0 - rss / tss
+
+    coef[~valido] = np.nan
+    var[~valido] = np.nan
+    r2[~valido] = np.nan
+    return {"coef": coef, "se": np.sqrt(var), "r2": r2, "n": n}
+
+
+def _simple_desde_momentos(n, sx, sy, sxx, sxy, syy, cx, cy) -> dict:
+    """
+    y = a + b·x a partir de los momentos de los datos desplazados (x - cx, y - cy);
+    el desplazamiento sólo mejora el condicionamiento, `a` se regresa en unidades
+    originales.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx = sx / n
+        my = sy / n
+        cxx = sxx - n * mx ** 2
+        cxy = sxy - n * mx * my
+        cyy = syy - n * my ** 2
+        beta = cxy / cxx
+        rss = np.maximum(cyy - beta * cxy, 0.0)
+        sigma2 = rss / (n - 2)
+        x_media = mx + cx
+        out = {
+            "alpha": (my + cy) - beta * x_media,
+            "beta": beta,
+            "se_alpha": np.sqrt(sigma2 * (1.0 / n + x_media ** 2 / cxx)),
+            "se_beta": np.sqrt(sigma2 / cxx),
+            "r2": 1.0 - rss / cyy,
+        }
+    malo = (n <= 2) | ~(cxx > 0)
+    for v in out.values():
+        v[malo] = np.nan
+    return out
+
+
+def ols_movil(x: np.ndarray, y: np.ndarray, ventana: int) -> dict:
+    """
+    Regresión simple y = a + b·x en ventanas de `ventana` periodos para cada renglón
+    de x, y (B × T). El resultado en la columna t usa los periodos t-ventana+1..t
+    (NaN si t < ventana-1); los pares con NaN dentro de la ventana no cuentan.
+    Los momentos de la ventana se actualizan con la fila que entra y la que sale.
+    Devuelve arreglos B × T: alpha, beta, se_alpha, se_beta, r2 y n.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    B, T = x.shape
+    ok = np.isfinite(x) & np.isfinite(y)
+    with np.errstate(invalid="ignore"):
+        cx = np.where(ok.any(axis=1), np.nanmean(np.where(ok, x, np.nan), axis=1), 0.0)
+        cy = np.where(ok.any(axis=1), np.nanmean(np.where(ok, y, np.nan), axis=1), 0.0)
+    xc = np.where(ok, x - cx[:, None], 0.0)
+    yc = np.where(ok, y - cy[:, None], 0.0)
+    w = ok.astype(float)
+
+    # momentos [n, Σx, Σy, Σx², Σxy, Σy²] de la ventana actual
+    filas = np.stack([w, xc, yc, xc * xc, xc * yc, yc * yc], axis=0)   # (6, B, T)
+    mom = np.zeros((6, B))
+
+    out = {c: np.full((B, T), np.nan) for c in ["alpha", "beta", "se_alpha", "se_beta", "r2"]}
+    out["n"] = np.zeros((B, T), dtype=np.int64)
+    for t in range(T):
+        mom += filas[:, :, t]
+        if t >= ventana:
+            mom -= filas[:, :, t - ventana]
+        if t < ventana - 1:
+            continue
+        n = np.rint(mom[0])
+        res = _simple_desde_momentos(n, *mom[1:], cx, cy)
+        for c, v in res.items():
+            out[c][:, t] = v
+        out["n"][:, t] = n
+    return out
+
+
+# ==== TABLA DE ELASTICIDADES =================================================
+
+def _log_positivo(df: pd.DataFrame) -> pd.DataFrame:
+    return np.log(df.where(df > 0))
+
+
+def _etiquetas(columnas: pd.Index) -> pd.DataFrame:
+    """Columnas de x como DataFrame (un campo por nivel; 'serie' si no tienen nombre)."""
+    if isinstance(columnas, pd.MultiIndex):
+        nombres = [n or f"nivel_{i}" for i, n in enumerate(columnas.names)]
+        return pd.DataFrame(list(columnas), columns=nombres)
+    return pd.DataFrame({columnas.name or "serie": list(columnas)})
+
+
+def elasticidades(y: pd.DataFrame, x: pd.DataFrame, rezagos=(0,), ventana: int | None = None) -> pd.DataFrame:
+    """
+    Elasticidades log(y_t) = a + b·log(x_{t-rezago}) para cada columna de `y`
+    (dependientes) × columna de `x` (series explicativas) × rezago.
+    `y`, `x`: DataFrames con el mismo tipo de índice de fechas (se alinean por fecha;
+    valores <= 0 cuentan como faltantes). Sin `ventana` se estima con la muestra
+    completa (ventana = 0 en la tabla); con `ventana` se estima en ventanas móviles
+    completas de ese tamaño, una fila por fecha final.
+    Columnas: dependiente, <niveles de x>, rezago, ventana, inicio, fin, n, alpha,
+    beta, se_alpha, se_beta, t_beta, r2.
+    """
+    fechas = y.index.union(x.index).sort_values()
+    ly = _log_positivo(y.reindex(fechas)).to_numpy(dtype=float)     # (T, ny)
+    lx = _log_positivo(x.reindex(fechas))
+    etiquetas = _etiquetas(x.columns)
+    rezagos = list(rezagos)
+    ny, nx, nr = ly.shape[1], lx.shape[1], len(rezagos)
+
+    # lote: dependiente (lento) × rezago × serie (rápido)
+    X = np.stack([lx.shift(r).to_numpy(dtype=float) for r in rezagos], axis=0)   # (nr, T, nx)
+    xb = np.broadcast_to(X.transpose(0, 2, 1)[None], (ny, nr, nx, len(fechas))).reshape(-1, len(fechas))
+    yb = np.broadcast_to(ly.T[:, None, None, :], (ny, nr, nx, len(fechas))).reshape(-1, len(fechas))
+
+    claves = pd.concat([etiquetas] * (ny * nr), ignore_index=True)
+    claves.insert(0, "dependiente", np.repeat(list(y.columns), nr * nx))
+    claves["rezago"] = np.tile(np.repeat(rezagos, nx), ny)
+
+    if ventana is None:
+        res = ols_lote(np.stack([np.ones_like(xb), xb], axis=2), yb)
+        ok = np.isfinite(xb) & np.isfinite(yb)
+        fechas_arr = fechas.to_numpy()
+        primero = np.where(ok.any(axis=1), ok.argmax(axis=1), 0)
+        ultimo = np.where(ok.any(axis=1), ok.shape[1] - 1 - ok[:, ::-1].argmax(axis=1), 0)
+        tabla = claves.assign(
+            ventana=0,
+            inicio=np.where(ok.any(axis=1), fechas_arr[primero], np.datetime64("NaT")),
+            fin=np.where(ok.any(axis=1), fechas_arr[ultimo], np.datetime64("NaT")),
+            n=res["n"],
+            alpha=res["coef"][:, 0],
+            beta=res["coef"][:, 1],
+            se_alpha=res["se"][:, 0],
+            se_beta=res["se"][:, 1],
+            r2=res["r2"],
+        )
+    else:
+        res = ols_movil(xb, yb, ventana)
+        B, T = xb.shape
+        filas = np.repeat(np.arange(B), T)
+        cols = np.tile(np.arange(T), B)
+        tabla = claves.iloc[filas].reset_index(drop=True).assign(
+            ventana=ventana,
+            inicio=fechas[np.maximum(cols - ventana + 1, 0)],
+            fin=fechas[cols],
+            **{c: res[c].ravel() for c in ["n", "alpha", "beta", "se_alpha", "se_beta", "r2"]},
+        )
+        tabla = tabla[(cols >= ventana - 1) & np.isfinite(tabla["beta"].to_numpy())]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tabla["t_beta"] = tabla["beta"] / tabla["se_beta"]
+    orden = list(claves.columns) + ["ventana", "inicio", "fin", "n"] + COLUMNAS_COEF
+    return tabla[orden].reset_index(drop=True)
+
+
+# ==== VERIFICACIÓN ===========================================================
+
+def verificar_con_statsmodels(tabla: pd.DataFrame, y: pd.DataFrame, x: pd.DataFrame,
+                              muestra: int = 20, semilla: int = 0) -> pd.DataFrame:
+    """
+    Reajusta con statsmodels una muestra de filas de `tabla` (salida de elasticidades
+    con los mismos `y`, `x`) y devuelve, por fila, la diferencia absoluta máxima en
+    coeficientes, errores estándar y R².
+    """
+    import statsmodels.api as sm
+
+    fechas = y.index.union(x.index).sort_values()
+    ly = _log_positivo(y.reindex(fechas))
+    lx = _log_positivo(x.reindex(fechas))
+    niveles = list(_etiquetas(x.columns).columns)
+
+    filas = tabla.sample(min(muestra, len(tabla)), random_state=semilla)
+    difs = []
+    for idx, fila in filas.iterrows():
+        col = tuple(fila[niveles]) if len(niveles) > 1 else fila[niveles[0]]
+        datos = pd.DataFrame({
+            "y": ly[fila["dependiente"]],
+            "x": lx[col].shift(int(fila["rezago"])),
+        })
+        datos = datos.loc[fila["inicio"]:fila["fin"]].dropna()
+        modelo = sm.OLS(datos["y"], sm.add_constant(datos["x"])).fit()
+        esperado = [modelo.params["const"], modelo.params["x"], modelo.bse["const"],
+                    modelo.bse["x"], modelo.rsquared]
+        obtenido = fila[["alpha", "beta", "se_alpha", "se_beta", "r2"]].to_numpy(dtype=float)
+        difs.append({"fila": idx, "n": int(modelo.nobs), "n_tabla": int(fila["n"]),
+                     "dif_max": float(np.max(np.abs(np.asarray(esperado) - obtenido)))})
+    return pd.DataFrame(difs)
@@ -5,8 +5,15 @@ Aplica etiquetas (categorías) de los diccionarios RNM (JSON) a parquets ENOE.
 - Consolida múltiples JSON por tabla/trim para crear un mapeo unificado por base:
   COE1T, COE2T, SDEMT, HOGT, VIVT.
 - Crea nuevas columnas <col>_label con las descripciones.
-- Sin joins (evita ColumnNotFoundError): usa UDF con normalización robusta.
+- Dos modos de etiquetado (LABEL_MODE):
+  * "join": vectorizado; por cada columna se leen sus códigos distintos, se resuelven
+    una sola vez contra {código -> etiqueta} y la tabla resultante se aplica con
+    replace_strict (join nativo de Polars). Es el modo por defecto.
+  * "udf": una función Python por celda (map_elements). Se conserva como referencia;
+    ambos modos producen exactamente las mismas etiquetas.
 - Matching case-insensitive de nombres (JSON vs Parquet).
+- Acepta archivo único (enoe_master_<mod>_labeled.parquet) o dataset particionado
+  hive (enoe_master_<mod>_labeled/anio=/trimestre=); la salida conserva el layout.
 - Diagnóstico:
   * columnas del parquet -> __columns.txt
   * missing_in_parquet
@@ -19,10 +26,15 @@ import re
 import os
 import json
 import glob
+import shutil
 from collections import defaultdict
 from typing import Dict, List, Tuple, Any
 
 import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from parquet_io import is_dataset_dir, dataset_schema, write_common_metadata, PARTITION_COLS
 
 # ============================================================
 # 1) RUTAS POR DEFECTO (EDITA AQUÍ SI CAMBIAN)
@@ -31,6 +43,9 @@ DEFAULT_JSON_ROOT = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semest
 DEFAULT_PARQUET_DIR = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe\parquet_master_labeled"
 DEFAULT_OUT_DIR = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe\parquet_master_labeled_labels"
 
+# "join" (vectorizado) o "udf" (Python por celda, referencia)
+LABEL_MODE = "join"
+
 PARQUET_PATTERNS = [
     "enoe_master_coe1t_labeled.parquet",
     "enoe_master_coe2t_labeled.parquet",
@@ -38,6 +53,8 @@ PARQUET_PATTERNS = [
     "enoe_master_hogt_labeled.parquet",
     "enoe_master_vivt_labeled.parquet",
 ]
+# Versión particionada (hive) de cada maestro: mismo nombre sin ".parquet"
+DATASET_PATTERNS = [p[:-len(".parquet")] for p in PARQUET_PATTERNS]
 
 # ============================================================
 # 2) UTILIDADES: parsing y consolidación de diccionarios
@@ -176,56 +193,115 @@ def build_base_var_mappings(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, D
     return result
 
 # ============================================================
-# 3) APLICACIÓN (sin joins) + DIAGNÓSTICO
+# 3) APLICACIÓN (join vectorizado o UDF) + DIAGNÓSTICO
 # ============================================================
 BASE_FROM_PARQUET_RE = re.compile(
-    r"enoe_master_(coe1t|coe2t|sdemt|hogt|vivt)_labeled\.parquet$", re.IGNORECASE
+    r"enoe_master_(coe1t|coe2t|sdemt|hogt|vivt)_labeled(\.parquet)?$", re.IGNORECASE
 )
 
 def base_from_parquet_path(path: str) -> str:
-    m = BASE_FROM_PARQUET_RE.search(os.path.basename(path))
+    m = BASE_FROM_PARQUET_RE.search(os.path.basename(path.rstrip("/\\")))
     if not m:
         raise ValueError(f"No pude inferir la base desde el nombre: {path}")
     key = m.group(1).upper()
     return {"COE1T": "COE1T", "COE2T": "COE2T",
             "SDEMT": "SDEMT", "HOGT": "HOGT", "VIVT": "VIVT"}[key]
 
+def _file_schema(dataset_path: str) -> Dict[str, pl.DataType]:
+    """Esquema (sin columnas de partición) del dataset, desde _common_metadata."""
+    schema = pl.from_arrow(dataset_schema(dataset_path).empty_table()).schema
+    return {k: v for k, v in schema.items() if k not in PARTITION_COLS}
+
+def scan_any(path: str) -> pl.LazyFrame:
+    """LazyFrame sobre un archivo Parquet o un dataset hive (unión de columnas; faltantes = null)."""
+    if not is_dataset_dir(path):
+        return pl.scan_parquet(path)
+    return pl.scan_parquet(
+        os.path.join(path, "**", "*.parquet"),
+        hive_partitioning=True,
+        hive_schema={c: pl.Int64 for c in PARTITION_COLS},
+        schema=_file_schema(path),
+        missing_columns="insert",
+        extra_columns="ignore",
+    )
+
+def read_any(path: str, n_rows: int = None, columns: List[str] = None) -> pl.DataFrame:
+    lf = scan_any(path)
+    if columns is not None:
+        lf = lf.select(columns)
+    if n_rows is not None:
+        lf = lf.head(n_rows)
+    return lf.collect()
+
+def sink_labeled_dataset(in_dir: str, out_dir: str, exprs: List[pl.Expr]) -> None:
+    """
+    Aplica las expresiones archivo por archivo conservando anio=/trimestre=.
+    Cada archivo de salida trae la unión completa de columnas + *_label.
+    """
+    file_schema = _file_schema(in_dir)
+    tmp_dir = out_dir + ".tmp"
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    out_schema = None
+    for f in sorted(glob.glob(os.path.join(in_dir, "**", "*.parquet"), recursive=True)):
+        rel = os.path.relpath(f, in_dir)
+        dst = os.path.join(tmp_dir, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        lf = pl.scan_parquet(f, schema=file_schema, missing_columns="insert", extra_columns="ignore")
+        if exprs:
+            lf = lf.with_columns(exprs)
+        lf.sink_parquet(dst, compression="zstd", statistics=True)
+        if out_schema is None:
+            out_schema = pq.read_schema(dst)
+    if out_schema is not None:
+        part_fields = [pa.field(c, pa.int64()) for c in PARTITION_COLS]
+        write_common_metadata(tmp_dir, pa.schema(list(out_schema) + part_fields))
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+
 def save_columns_list(out_dir: str, parquet_label: str, columns: List[str]) -> None:
     path = os.path.join(out_dir, f"{parquet_label}__columns.txt")
     with open(path, "w", encoding="utf-8") as f:
         for c in columns:
             f.write(c + "\n")
 
-def _make_lookup_udf(mapping: Dict[str, str]):
+_INT_RE = re.compile(r"-?\d+")
+
+def norm_variants(v: Any) -> List[str]:
     """
-    Devuelve una función que busca etiquetas con normalización robusta del valor de entrada.
+    Variantes del valor de entrada, en orden de prioridad:
     - str.strip()
     - variante upper para no numéricos
     - numérico: '01' <-> '1' + '02d'
     """
-    mapping_keys = set(mapping.keys())
+    if v is None:
+        return []
+    s = str(v).strip()
+    out = [s]
+    if not _INT_RE.fullmatch(s):
+        out.append(s.upper())
+    else:
+        try:
+            n = int(s)
+            out.append(str(n))
+            if 0 <= n < 100:
+                out.append(f"{n:02d}")
+        except ValueError:
+            pass
+    # quitar duplicados preservando orden
+    seen, variants = set(), []
+    for k in out:
+        if k not in seen:
+            variants.append(k); seen.add(k)
+    return variants
 
-    def norm_variants(v: Any) -> List[str]:
-        if v is None:
-            return []
-        s = str(v).strip()
-        out = [s]
-        if not re.fullmatch(r"-?\d+", s):
-            out.append(s.upper())
-        else:
-            try:
-                n = int(s)
-                out.append(str(n))
-                if 0 <= n < 100:
-                    out.append(f"{n:02d}")
-            except ValueError:
-                pass
-        # quitar duplicados preservando orden
-        seen, variants = set(), []
-        for k in out:
-            if k not in seen:
-                variants.append(k); seen.add(k)
-        return variants
+def _make_lookup_udf(mapping: Dict[str, str]):
+    """
+    Devuelve una función que busca etiquetas con normalización robusta del valor de entrada
+    (ver norm_variants). Es el camino lento: se ejecuta en Python celda por celda.
+    """
+    mapping_keys = set(mapping.keys())
 
     def fn(v):
         for k in norm_variants(v):
@@ -235,20 +311,55 @@ def _make_lookup_udf(mapping: Dict[str, str]):
 
     return fn
 
+def build_lookup_table(codes: List[Any], mapping: Dict[str, str]) -> Tuple[List[Any], List[str]]:
+    """
+    Tabla de búsqueda {código crudo -> etiqueta} para los códigos distintos de una columna.
+    Las variantes de normalización se resuelven aquí, una sola vez por código distinto
+    (con la misma lógica que la UDF), en lugar de una vez por celda.
+    Devuelve (codigos, etiquetas) sin nulos y solo con códigos que sí tienen etiqueta.
+    """
+    fn = _make_lookup_udf(mapping)
+    old, new = [], []
+    for code in codes:
+        if code is None:
+            continue
+        label = fn(code)
+        if label is not None:
+            old.append(code); new.append(label)
+    return old, new
+
+def _make_lookup_expr(col: str, dtype: pl.DataType, old: List[Any], new: List[str]) -> pl.Expr:
+    """
+    Expresión nativa equivalente a la UDF: un replace_strict (join contra la tabla pequeña)
+    sobre el valor crudo de la columna. Códigos sin etiqueta y nulos -> null.
+    """
+    return pl.col(col).replace_strict(
+        pl.Series(old, dtype=dtype),
+        pl.Series(new, dtype=pl.Utf8),
+        default=None,
+        return_dtype=pl.Utf8,
+    )
+
 def apply_labels_to_parquet(
     parquet_path: str,
     base_maps: Dict[str, Dict[str, Dict[str, str]]],
     out_path: str,
     overwrite: bool = True,
     preview_n: int = 5,
-    sample_rows_diag: int = 100000
+    sample_rows_diag: int = 100000,
+    mode: str = LABEL_MODE
 ) -> Tuple[int, int, Dict[str, Any]]:
     """
-    Aplica mapeos a un parquet sin joins (UDF) y guarda en out_path.
+    Aplica mapeos a un parquet y guarda en out_path.
+    mode: "join" (vectorizado) o "udf" (Python por celda).
     Retorna:
       (n_cols_mapeadas, n_cols_posibles, diagnostico_dict)
     """
-    parquet_label = os.path.basename(parquet_path)
+    parquet_label = os.path.basename(parquet_path.rstrip("/\\"))
+    partitioned = is_dataset_dir(parquet_path)
+
+    if mode not in ("join", "udf"):
+        raise ValueError(f"Modo de etiquetado desconocido: {mode}")
 
     if (not overwrite) and os.path.exists(out_path):
         raise FileExistsError(f"Ya existe {out_path}")
@@ -257,12 +368,15 @@ def apply_labels_to_parquet(
     var_maps = base_maps.get(base, {})
     if not var_maps:
         print(f"[INFO] No hay diccionario consolidado para base {base}. Se copia tal cual.")
-        pl.scan_parquet(parquet_path).sink_parquet(out_path)
-        schema_cols = pl.read_parquet(parquet_path, n_rows=0).columns
+        if partitioned:
+            sink_labeled_dataset(parquet_path, out_path, [])
+        else:
+            pl.scan_parquet(parquet_path).sink_parquet(out_path)
+        schema_cols = scan_any(parquet_path).collect_schema().names()
         return 0, 0, {"missing_in_parquet": [], "label_all_null_detail": [], "parquet_columns": schema_cols}
 
     # ---------- columnas del parquet (y mapa upper->original) ----------
-    schema = pl.read_parquet(parquet_path, n_rows=0).schema
+    schema = scan_any(parquet_path).collect_schema()
     orig_cols = schema.names()
     col_upper_to_orig = {c.upper(): c for c in orig_cols}
     cols_upper = set(col_upper_to_orig.keys())
@@ -284,21 +398,37 @@ def apply_labels_to_parquet(
         if v_up in cols_upper and mapping:
             candidates += 1
             parquet_col = col_upper_to_orig[v_up]
-            udf = _make_lookup_udf(mapping)
-            exprs.append(
-                pl.col(parquet_col)
-                  .map_elements(udf, return_dtype=pl.Utf8)
-                  .alias(f"{parquet_col}_label")
-            )
             mapped_pairs.append((v_up, parquet_col, mapping))
         else:
             missing_in_parquet.append(var_json)
 
+    if mode == "join" and mapped_pairs:
+        # Una sola pasada columnar para obtener los códigos distintos de cada columna mapeada
+        mapped_cols = list(dict.fromkeys(pc for _, pc, _ in mapped_pairs))
+        uniques = (
+            scan_any(parquet_path)
+              .select([pl.col(c).unique().implode() for c in mapped_cols])
+              .collect()
+        )
+        for _, parquet_col, mapping in mapped_pairs:
+            codes = uniques[parquet_col][0].to_list()
+            old, new = build_lookup_table(codes, mapping)
+            expr = _make_lookup_expr(parquet_col, schema[parquet_col], old, new)
+            exprs.append(expr.alias(f"{parquet_col}_label"))
+    else:
+        for _, parquet_col, mapping in mapped_pairs:
+            udf = _make_lookup_udf(mapping)
+            expr = pl.col(parquet_col).map_elements(udf, return_dtype=pl.Utf8)
+            exprs.append(expr.alias(f"{parquet_col}_label"))
+
     # ---------- aplicar (lazy) y escribir ----------
-    lf = pl.scan_parquet(parquet_path)
-    if exprs:
-        lf = lf.with_columns(exprs)
-    lf.sink_parquet(out_path, compression="zstd", statistics=True)
+    if partitioned:
+        sink_labeled_dataset(parquet_path, out_path, exprs)
+    else:
+        lf = pl.scan_parquet(parquet_path)
+        if exprs:
+            lf = lf.with_columns(exprs)
+        lf.sink_parquet(out_path, compression="zstd", statistics=True)
 
     # ---------- Diagnóstico: *_label 100% nulos + ejemplos ----------
     label_all_null_detail: List[Dict[str, Any]] = []
@@ -306,12 +436,12 @@ def apply_labels_to_parquet(
         mapped_cols = [pc for _, pc, _ in mapped_pairs]
         if mapped_cols:
             # columnas de salida realmente presentes
-            out_cols0 = pl.read_parquet(out_path, n_rows=0).columns
+            out_cols0 = scan_any(out_path).collect_schema().names()
             present_labels = [f"{pc}_label" for pc in mapped_cols if f"{pc}_label" in out_cols0]
 
             if present_labels:
-                sample_labels = pl.read_parquet(out_path, n_rows=sample_rows_diag, columns=present_labels)
-                sample_codes  = pl.read_parquet(parquet_path, n_rows=sample_rows_diag, columns=mapped_cols)
+                sample_labels = read_any(out_path, n_rows=sample_rows_diag, columns=present_labels)
+                sample_codes  = read_any(parquet_path, n_rows=sample_rows_diag, columns=mapped_cols)
 
                 for (v_up, parquet_col, mapping) in mapped_pairs:
                     lab = f"{parquet_col}_label"
@@ -325,28 +455,6 @@ def apply_labels_to_parquet(
                             except Exception:
                                 uniq_vals = []
 
-                            # normalización espejo de la UDF
-                            def norm_variants(v: Any) -> List[str]:
-                                if v is None:
-                                    return []
-                                s = str(v).strip()
-                                out = [s]
-                                if not re.fullmatch(r"-?\d+", s):
-                                    out.append(s.upper())
-                                else:
-                                    try:
-                                        n = int(s)
-                                        out.append(str(n))
-                                        if 0 <= n < 100:
-                                            out.append(f"{n:02d}")
-                                    except ValueError:
-                                        pass
-                                seen, vars2 = set(), []
-                                for k in out:
-                                    if k not in seen:
-                                        vars2.append(k); seen.add(k)
-                                return vars2
-
                             mapping_keys = set(mapping.keys())
                             unmapped_samples = []
                             for u in uniq_vals:
@@ -384,11 +492,11 @@ def apply_labels_to_parquet(
     # Preview
     try:
         show = [f"{pc}_label" for _, pc, _ in mapped_pairs][:8]
-        out_cols0 = pl.read_parquet(out_path, n_rows=0).columns
+        out_cols0 = scan_any(out_path).collect_schema().names()
         show = [c for c in show if c in out_cols0]
         if show:
             print(f"\n[Preview etiquetas] {os.path.basename(out_path)}")
-            print(pl.read_parquet(out_path, n_rows=5, columns=show).to_pandas())
+            print(read_any(out_path, n_rows=5, columns=show).to_pandas())
     except Exception:
         pass
 
@@ -400,10 +508,13 @@ def apply_labels_to_parquet(
 # ============================================================
 def discover_parquets(parquet_dir: str) -> List[str]:
     paths = []
-    for patt in PARQUET_PATTERNS:
+    for patt, dpatt in zip(PARQUET_PATTERNS, DATASET_PATTERNS):
         p = os.path.join(parquet_dir, patt)
+        d = os.path.join(parquet_dir, dpatt)
         if os.path.exists(p):
             paths.append(p)
+        elif is_dataset_dir(d):
+            paths.append(d)
     # Quitar duplicados
     seen, out = set(), []
     for f in paths:
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: etiquetado ENOE con UDF (map_elements) vs join vectorizado (replace_strict).
+
+- Genera un SDEMT sintético (por defecto 10M filas) con códigos "sucios" típicos:
+  '01' / '1' / ' 2 ', minúsculas, valores fuera de catálogo y nulos.
+- Corre apply_labels_to_parquet en ambos modos sobre el mismo parquet.
+- Verifica que las columnas *_label sean idénticas y reporta tiempos.
+
+Uso:
+    python bench_apply_enoe_labels.py            # 10M filas
+    python bench_apply_enoe_labels.py --rows 1000000
+"""
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import polars as pl
+
+from apply_enoe_labels import apply_labels_to_parquet, normalize_code_keys
+
+N_ROWS_DEFAULT = 10_000_000
+SEED = 2025
+
+# Catálogos sintéticos con la forma de build_base_var_mappings
+CATALOGOS = {
+    "sex":     {"1": "Hombre", "2": "Mujer"},
+    "clase1":  {"1": "PEA", "2": "PNEA"},
+    "clase2":  {"1": "Ocupada", "2": "Desocupada", "3": "Disponible", "4": "No disponible"},
+    "pos_ocu": {"0": "No aplica", "1": "Subordinado", "2": "Empleador", "3": "Cuenta propia",
+                "4": "Sin pago", "5": "No especificado"},
+    "ent":     {f"{i:02d}": f"Entidad {i}" for i in range(1, 33)},
+    "cs_p13_1": {"A": "Ninguno", "B": "Preescolar", "C": "Primaria", "99": "No sabe"},
+}
+
+# Valores crudos con las variantes que aparecen en los CSV
+VALORES_CRUDOS = {
+    "sex":     ["1", "2", " 1", "2 ", None],
+    "clase1":  ["1", "2", "01", None],
+    "clase2":  ["1", "2", "3", "4", "0", None],
+    "pos_ocu": ["0", "1", "2", "3", "4", "5", "005", "-1", None],
+    "ent":     [str(i) for i in range(1, 33)] + ["09", "33"],
+    "cs_p13_1": ["A", "a", "b", "C", "99", "x", " c ", None],
+}
+
+
+def build_mappings() -> dict:
+    maps = {}
+    for var, cats in CATALOGOS.items():
+        m = {}
+        for code, label in cats.items():
+            for k in normalize_code_keys(code):
+                m[k] = label
+        maps[var] = m
+    return {"SDEMT": maps}
+
+
+def build_synthetic_sdemt(path: str, n_rows: int) -> None:
+    rng = np.random.default_rng(SEED)
+    cols = {}
+    for var, vals in VALORES_CRUDOS.items():
+        idx = rng.integers(0, len(vals), size=n_rows)
+        cols[var] = pl.Series(var, vals, dtype=pl.Utf8).gather(idx)
+    cols["fac"] = pl.Series("fac", rng.integers(50, 5000, size=n_rows)).cast(pl.Utf8)
+    pl.DataFrame(cols).write_parquet(path, compression="zstd")
+
+
+def run(mode: str, in_path: str, out_dir: str, base_maps: dict) -> float:
+    out_path = os.path.join(out_dir, f"{mode}", os.path.basename(in_path))
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    t0 = time.perf_counter()
+    apply_labels_to_parquet(in_path, base_maps, out_path, overwrite=True, mode=mode)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark UDF vs join en apply_enoe_labels")
+    ap.add_argument("--rows", type=int, default=N_ROWS_DEFAULT, help="Filas del SDEMT sintético")
+    args = ap.parse_args()
+
+    base_maps = build_mappings()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        in_path = os.path.join(tmp, "enoe_master_sdemt_labeled.parquet")
+        print(f"[INFO] Generando SDEMT sintético: {args.rows:,} filas")
+        build_synthetic_sdemt(in_path, args.rows)
+
+        t_join = run("join", in_path, tmp, base_maps)
+        t_udf = run("udf", in_path, tmp, base_maps)
+
+        label_cols = [f"{v}_label" for v in CATALOGOS]
+        out_join = pl.read_parquet(os.path.join(tmp, "join", os.path.basename(in_path)), columns=label_cols)
+        out_udf = pl.read_parquet(os.path.join(tmp, "udf", os.path.basename(in_path)), columns=label_cols)
+        iguales = out_join.equals(out_udf, null_equal=True)
+
+    print("\n================ RESULTADOS ================")
+    print(f"Filas:          {args.rows:,}")
+    print(f"UDF  (python):  {t_udf:8.2f} s")
+    print(f"JOIN (nativo):  {t_join:8.2f} s")
+    print(f"Aceleración:    {t_udf / t_join:8.1f}x")
+    print(f"Salidas idénticas: {'SÍ' if iguales else 'NO'}")
+    if not iguales:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: ingestión ENOE con CSV_ENGINE="pandas" vs CSV_ENGINE="arrow" (parquet.py).
+
+- Genera CSV sintéticos de los cinco módulos (VIVT, HOGT, SDEMT, COE1T, COE2T) con
+  columnas enteras, texto, nulos, algunos bytes CP1252 y un archivo sin año en el
+  nombre (metadatos desde PER).
+- Corre pasada 1 + pasada 2 de parquet.py con cada motor en un SUBPROCESO aparte, así
+  el pico de memoria (ru_maxrss) de uno no contamina al otro.
+- Verifica que los cinco Parquet maestro sean idénticos y reporta tiempo y RSS pico.
+
+Uso:
+    python bench_csv_engine.py                  # 200k filas por archivo
+    python bench_csv_engine.py --rows 1000000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+import pyarrow.parquet as pq
+
+N_ROWS_DEFAULT = 200_000
+SEED = 2025
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENGINES = ["pandas", "arrow"]
+
+# Columnas por módulo (subconjunto con la forma de los CSV reales)
+MODULOS = {
+    "VIVT":  ["cd_a", "ent", "con", "v_sel", "p1", "p2", "p3", "fac"],
+    "HOGT":  ["cd_a", "ent", "con", "v_sel", "n_hog", "h_mud", "p1", "fac"],
+    "SDEMT": ["cd_a", "ent", "con", "v_sel", "n_hog", "h_mud", "n_ren", "sex", "eda",
+              "clase1", "clase2", "pos_ocu", "ing_x_hrs", "l_nac_c", "fac"],
+    "COE1T": ["cd_a", "ent", "con", "v_sel", "n_hog", "h_mud", "n_ren", "p1", "p2", "p3",
+              "p4a", "p4_1", "fac"],
+    "COE2T": ["cd_a", "ent", "con", "v_sel", "n_hog", "h_mud", "n_ren", "p6b2", "p6c",
+              "p7", "p7a", "fac"],
+}
+PERIODOS = [(2023, 1), (2023, 2)]
+
+
+def build_column(rng, name: str, n: int) -> np.ndarray:
+    if name == "fac":
+        return rng.integers(50, 5000, size=n).astype(str)
+    if name == "ing_x_hrs":
+        return np.char.mod("%.2f", rng.random(n) * 200)
+    if name == "l_nac_c":
+        # Texto con acentos: en CP1252 fuerza la decodificación alternativa
+        return rng.choice(np.array(["México", "Jalisco", "Nuevo León", "", "Querétaro"]), n)
+    return rng.integers(0, 100, size=n).astype(str)
+
+
+def build_synthetic_csvs(files_dir: str, n_rows: int) -> None:
+    rng = np.random.default_rng(SEED)
+    for mod, cols in MODULOS.items():
+        for anio, tri in PERIODOS:
+            data = np.column_stack([build_column(rng, c, n_rows) for c in cols])
+            lines = "\n".join(",".join(row) for row in data)
+            name = f"{mod.lower()}_{anio}_trim{tri}.csv"
+            enc = "cp1252" if (mod, tri) == ("SDEMT", 2) else "utf-8"
+            with open(os.path.join(files_dir, name), "w", encoding=enc, newline="") as f:
+                f.write(",".join(cols) + "\n" + lines + "\n")
+    # Sin año en el nombre: anio/trimestre salen de PER (trimestre 3 de 2023 = "323")
+    cols = ["per"] + MODULOS["SDEMT"]
+    data = np.column_stack([np.full(n_rows // 4, "323")] +
+                           [build_column(rng, c, n_rows // 4) for c in MODULOS["SDEMT"]])
+    with open(os.path.join(files_dir, "sdemt_extra.csv"), "w", encoding="utf-8", newline="") as f:
+        f.write(",".join(cols) + "\n" + "\n".join(",".join(r) for r in data) + "\n")
+
+
+def worker(engine: str, base: str) -> None:
+    """Corre parquet.py completo con un motor y escribe métricas en JSON (stdout)."""
+    sys.path.insert(0, HERE)
+    os.chdir(base)  # parquet.py crea sus carpetas por defecto al importarse
+    import glob
+    import parquet as P
+
+    out_dir = os.path.join(base, engine)
+    P.FILES_DIR = os.path.join(base, "files")
+    P.OUT_DIR = out_dir
+    P.REPORTS_DIR = os.path.join(out_dir, "reports")
+    P.MANIFEST_PATH = os.path.join(out_dir, "manifest.json")
+    P.CSV_ENGINE = engine
+    P.FULL_REBUILD = True
+    os.makedirs(P.REPORTS_DIR, exist_ok=True)
+
+    t0 = time.perf_counter()
+    manifest = P.load_manifest(P.MANIFEST_PATH)
+    csvs = sorted(glob.glob(os.path.join(P.FILES_DIR, "*.csv")))
+    info, union, _ = P.pass1(csvs, manifest)
+    t1 = time.perf_counter()
+    P.build_with_dask(info, union, manifest)
+    t2 = time.perf_counter()
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB en Linux
+    print(json.dumps({"pass1": t1 - t0, "pass2": t2 - t1, "rss_mb": rss_mb}))
+
+
+def run(engine: str, base: str) -> dict:
+    res = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", engine, "--base", base],
+                         capture_output=True, text=True, check=True)
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark pandas vs pyarrow.csv en parquet.py")
+    ap.add_argument("--rows", type=int, default=N_ROWS_DEFAULT, help="Filas por CSV sintético")
+    ap.add_argument("--worker", choices=ENGINES, help=argparse.SUPPRESS)
+    ap.add_argument("--base", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.base)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "files"))
+        print(f"[INFO] Generando CSV sintéticos: {args.rows:,} filas x {len(PERIODOS)} periodos x 5 módulos")
+        build_synthetic_csvs(os.path.join(tmp, "files"), args.rows)
+
+        res = {eng: run(eng, tmp) for eng in ENGINES}
+
+        iguales = True
+        for mod in MODULOS:
+            name = f"enoe_master_{mod.lower()}.parquet"
+            a = pq.read_table(os.path.join(tmp, "pandas", name))
+            b = pq.read_table(os.path.join(tmp, "arrow", name))
+            if not a.equals(b):
+                print(f"[WARN] {mod}: salidas distintas")
+                iguales = False
+
+    print("\n================ RESULTADOS ================")
+    print(f"Filas por CSV:  {args.rows:,}")
+    print(f"{'motor':8s} {'pasada1 (s)':>12s} {'pasada2 (s)':>12s} {'RSS pico (MB)':>14s}")
+    for eng in ENGINES:
+        r = res[eng]
+        print(f"{eng:8s} {r['pass1']:12.2f} {r['pass2']:12.2f} {r['rss_mb']:14.0f}")
+    print(f"Aceleración pasada 2: {res['pandas']['pass2'] / res['arrow']['pass2']:8.1f}x")
+    print(f"Salidas idénticas: {'SÍ' if iguales else 'NO'}")
+    if not iguales:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
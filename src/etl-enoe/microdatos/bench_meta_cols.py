@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark: metadatos anio/trimestre/anio_trimestre de parquet.py.
+
+- "anterior": la versión con listas de Python ([anio]*n), regex sobre cada PER y
+  anio_trimestre armado por concatenación de strings (dos veces: add_meta_cols y load_one).
+- "vectorizada": parquet.add_meta_cols (difusión de constantes, aritmética entera sobre
+  PER, anio_trimestre categórico) y parquet.arrow_meta_cols (motor "arrow").
+- Mide ambos casos: periodo desde el nombre del archivo y periodo desde PER.
+- Verifica que los valores coincidan (anio_trimestre comparado como texto).
+
+Uso:
+    python bench_meta_cols.py                 # 5M filas
+    python bench_meta_cols.py --rows 1000000 --repeat 5
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+N_ROWS_DEFAULT = 5_000_000
+SEED = 2025
+
+
+def legacy_meta_cols(df: pd.DataFrame, anio_from_name, tri_from_name):
+    """Versión anterior (add_meta_cols + casteos repetidos de load_one)."""
+    if anio_from_name is None or tri_from_name is None:
+        per = df["per"].astype(str).str.replace(r"\D", "", regex=True).str.zfill(3)
+        tri_ser = pd.to_numeric(per.str[0], errors="coerce")
+        anio_ser = 2000 + pd.to_numeric(per.str[1:3], errors="coerce")
+    else:
+        anio_ser = pd.Series([anio_from_name] * len(df))
+        tri_ser = pd.Series([tri_from_name] * len(df))
+    df.insert(0, "anio", pd.to_numeric(anio_ser, errors="coerce").astype("Int64"))
+    df.insert(1, "trimestre", pd.to_numeric(tri_ser, errors="coerce").astype("Int64"))
+    df.insert(2, "anio_trimestre",
+              (df["anio"].astype("string") + "T" + df["trimestre"].astype("string")).astype(pd.StringDtype()))
+    df["anio"] = pd.to_numeric(df["anio"], errors="coerce").astype("Int64")
+    df["trimestre"] = pd.to_numeric(df["trimestre"], errors="coerce").astype("Int64")
+    df["anio_trimestre"] = (df["anio"].astype("string") + "T" + df["trimestre"].astype("string")).astype(pd.StringDtype())
+    return df
+
+
+def build_frame(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(SEED)
+    per = rng.choice(np.array(["123", "223", "323", "423", "124"]), n_rows)
+    ent = rng.integers(1, 33, n_rows).astype(str)
+    return pd.DataFrame({"per": pd.array(per, dtype="str"), "ent": pd.array(ent, dtype="str")})
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Microbenchmark de metadatos (anio/trimestre)")
+    ap.add_argument("--rows", type=int, default=N_ROWS_DEFAULT, help="Filas del DataFrame sintético")
+    ap.add_argument("--repeat", type=int, default=3, help="Repeticiones (se reporta la mejor)")
+    args = ap.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(tempfile.gettempdir())  # parquet.py crea sus carpetas por defecto al importarse
+    from parquet import add_meta_cols, arrow_meta_cols
+
+    base = build_frame(args.rows)
+    tbl = pa.Table.from_pandas(base, preserve_index=False)
+    print(f"[INFO] {args.rows:,} filas, mejor de {args.repeat}")
+
+    resultados, iguales = [], True
+    for caso, anio, tri in [("nombre", 2023, 3), ("PER", None, None)]:
+        t_old = timeit(lambda: legacy_meta_cols(base.copy(deep=False), anio, tri), args.repeat)
+        t_new = timeit(lambda: add_meta_cols(base.copy(deep=False), anio, tri), args.repeat)
+        t_arw = timeit(lambda: arrow_meta_cols(tbl, anio, tri), args.repeat)
+        resultados.append((caso, t_old, t_new, t_arw))
+
+        old = legacy_meta_cols(base.copy(deep=False), anio, tri)
+        new = add_meta_cols(base.copy(deep=False), anio, tri)
+        a, t, at = arrow_meta_cols(tbl, anio, tri)
+        iguales &= old["anio"].equals(new["anio"]) and old["trimestre"].equals(new["trimestre"])
+        iguales &= old["anio_trimestre"].equals(new["anio_trimestre"].astype(pd.StringDtype()))
+        iguales &= a.to_pylist() == new["anio"].tolist() and t.to_pylist() == new["trimestre"].tolist()
+        iguales &= at.cast(pa.string()).to_pylist() == old["anio_trimestre"].tolist()
+
+    print("\n================ RESULTADOS ================")
+    print(f"{'periodo desde':14s} {'anterior (s)':>13s} {'pandas (s)':>11s} {'arrow (s)':>10s} {'acel.':>7s}")
+    for caso, t_old, t_new, t_arw in resultados:
+        print(f"{caso:14s} {t_old:13.3f} {t_new:11.3f} {t_arw:10.3f} {t_old / t_new:6.1f}x")
+    print(f"Salidas idénticas: {'SÍ' if iguales else 'NO'}")
+    if not iguales:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
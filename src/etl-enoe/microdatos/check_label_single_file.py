@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Verificación: label_ent_mun.label_one_parquet sobre un maestro tipado de archivo único.
+
+- Arma un maestro pequeño como lo deja parquet.py: enteros angostos (int8/int16),
+  anio_trimestre y una variable categórica como dictionary<int32, string>, sin
+  metadatos de pandas (Dask ve categóricos con categorías desconocidas) y con varios
+  row groups (varias particiones).
+- Lo etiqueta con un catálogo de juguete y revisa que el archivo de salida conserve los
+  tipos de entrada, traiga ent_nombre / mun_nombre y que los nombres coincidan con un
+  merge hecho en pandas.
+- Antes, el esquema salía de pa.Schema.from_pandas(meta) y los categóricos quedaban como
+  dictionary<values=null>: la escritura fallaba con "Unsupported cast ... to null".
+
+Uso:
+    python check_label_single_file.py
+    python check_label_single_file.py --rows 100000
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+N_ROWS_DEFAULT = 10_000
+SEED = 2025
+
+
+def build_master(n_rows: int) -> pa.Table:
+    rng = np.random.default_rng(SEED)
+    dict_type = pa.dictionary(pa.int32(), pa.string())
+    periodos = rng.choice(np.array(["2024T1", "2024T2"]), n_rows)
+    return pa.table({
+        "anio": pa.array(np.full(n_rows, 2024, dtype=np.int16)),
+        "trimestre": pa.array(np.char.rpartition(periodos, "T")[:, 2].astype(np.int8)),
+        "anio_trimestre": pa.array(periodos).cast(dict_type),
+        "ent": pa.array(rng.integers(1, 5, n_rows).astype(np.int8)),
+        "mun": pa.array(rng.integers(1, 4, n_rows).astype(np.int16)),
+        "sex": pa.array(rng.choice(np.array(["1", "2"]), n_rows)).cast(dict_type),
+    })
+
+
+def build_catalog():
+    ent_df = pd.DataFrame({"CVE_ENT": ["01", "02", "03"],
+                           "NOM_ENT": ["Aguascalientes", "Baja California", "Baja California Sur"]})
+    muni_df = pd.DataFrame({"CVE_ENT": ["01", "01", "02"],
+                            "CVE_MUN": ["001", "002", "001"],
+                            "NOM_MUN": ["Aguascalientes", "Asientos", "Ensenada"]})
+    return ent_df, muni_df
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Etiquetado de un maestro tipado de archivo único")
+    ap.add_argument("--rows", type=int, default=N_ROWS_DEFAULT, help="Filas del maestro sintético")
+    args = ap.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # label_ent_mun crea su carpeta de salida por defecto al importarse
+        import label_ent_mun
+
+        master = build_master(args.rows)
+        src = os.path.join(tmp, "enoe_master_sdemt.parquet")
+        pq.write_table(master, src, row_group_size=max(1, args.rows // 4))
+        label_ent_mun.OUT_DIR = os.path.join(tmp, "labeled")
+        os.makedirs(label_ent_mun.OUT_DIR, exist_ok=True)
+
+        ent_df, muni_df = build_catalog()
+        label_ent_mun.label_one_parquet(src, ent_df, muni_df)
+        out = pq.read_table(os.path.join(label_ent_mun.OUT_DIR, "enoe_master_sdemt_labeled.parquet"))
+
+        errores = []
+        if out.num_rows != master.num_rows:
+            errores.append(f"filas: {out.num_rows:,} != {master.num_rows:,}")
+        for f in master.schema:
+            got = out.schema.field(f.name).type
+            same = (pa.types.is_dictionary(got) and pa.types.is_dictionary(f.type)) or got == f.type
+            if not same:
+                errores.append(f"tipo de {f.name}: {got} (entrada {f.type})")
+        for col in ("ent_nombre", "mun_nombre"):
+            if col not in out.column_names:
+                errores.append(f"falta la columna {col}")
+
+        if not errores:
+            # mismos nombres que un merge directo en pandas (el orden de filas puede cambiar)
+            df = master.to_pandas()
+            df["CVE_ENT"] = df["ent"].astype(str).str.zfill(2)
+            df["CVE_MUN"] = df["mun"].astype(str).str.zfill(3)
+            esperado = (df.merge(ent_df, how="left", on="CVE_ENT")
+                          .merge(muni_df, how="left", on=["CVE_ENT", "CVE_MUN"]))
+            cols = ["ent", "mun"]
+            a = esperado.groupby(cols)[["NOM_ENT", "NOM_MUN"]].first().fillna("")
+            b = (out.select(cols + ["ent_nombre", "mun_nombre"]).to_pandas()
+                    .groupby(cols)[["ent_nombre", "mun_nombre"]].first().fillna(""))
+            if not (a.to_numpy().astype(str) == b.to_numpy().astype(str)).all():
+                errores.append("ent_nombre / mun_nombre no coinciden con el merge de pandas")
+
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    print(f"[INFO] {args.rows:,} filas, {master.num_rows // max(1, args.rows // 4)} row groups")
+    for e in errores:
+        print(f"[ERROR] {e}")
+    print(f"Etiquetado de archivo único: {'OK' if not errores else 'FALLA'}")
+    if errores:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
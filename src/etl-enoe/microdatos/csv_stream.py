@@ -0,0 +1,331 @@
+# csv_stream.py
+# -*- coding: utf-8 -*-
+"""
+Lector CSV en streaming con memoria acotada (reemplaza las lecturas completas de
+read_full_csv_robust).
+
+- DecodedStream: decodifica el archivo por bloques (CHUNK_BYTES) con el encoding
+  detectado. Solo donde falla (bytes inválidos) se decodifica ESE tramo con otro
+  encoding (CP1252 → Latin-1; en UTF-16/32 se usa U+FFFD) y se sigue con el original.
+  En UTF-8 el tramo se decodifica byte a byte con CP1252 (Latin-1 solo en los cinco
+  bytes que CP1252 no define), así el texto no depende de dónde caen los bloques.
+  Cada tramo queda registrado en `replaced` como (byte_inicio, byte_fin, como); los
+  tramos contiguos (en UTF-8: separados solo por ASCII) se fusionan y solo se guardan
+  los primeros MAX_REPLACED (el total queda en `n_replaced`). La decodificación es de
+  una pasada por bloque: los tramos malos los resuelve un manejador de errores de
+  codecs, sin volver a decodificar el resto del bloque por cada error (un CP1252 leído
+  como UTF-8 tiene miles).
+- CsvBatchReader: pandas.read_csv(chunksize=BATCH_ROWS) sobre ese stream; entrega
+  DataFrames (todo string) o Tables de Arrow de tamaño fijo.
+- ArrowCsvBatchReader: lo mismo con pyarrow.csv (lector en streaming, decodificación por
+  bloques y conversión multihilo), sin pasar por pandas. El stream se re-codifica a UTF-8
+  con el mismo DecodedStream, así ambos motores reemplazan exactamente los mismos bytes.
+- Nunca hay en memoria más que un bloque de bytes + un lote de filas; no se hacen
+  copias completas del archivo (ni bytes ni io.StringIO).
+"""
+
+import io, re, codecs, logging, threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from zip_source import open_source
+
+CHUNK_BYTES = 1024 * 1024
+BATCH_ROWS = 250_000
+ARROW_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Los mismos valores que pandas.read_csv trata como nulos por defecto (keep_default_na)
+PANDAS_NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+                    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+                    "n/a", "nan", "null"]
+FALLBACK_ENCODINGS = ["cp1252", "latin-1"]
+MAX_REPLACED = 1000
+
+# Una secuencia UTF-8 multibyte válida. Entre un byte inválido y la siguiente de estas
+# solo hay ASCII y bytes inválidos: ese tramo se decodifica de una vez con CP1252.
+_UTF8_MULTIBYTE = re.compile(
+    rb"[\xc2-\xdf][\x80-\xbf]|\xe0[\xa0-\xbf][\x80-\xbf]|[\xe1-\xec\xee\xef][\x80-\xbf]{2}"
+    rb"|\xed[\x80-\x9f][\x80-\xbf]|\xf0[\x90-\xbf][\x80-\xbf]{2}|[\xf1-\xf3][\x80-\xbf]{3}"
+    rb"|\xf4[\x80-\x8f][\x80-\xbf]{2}")
+
+# CP1252 byte a byte; 0x81, 0x8D, 0x8F, 0x90 y 0x9D no están definidos y van como Latin-1
+_CP1252_TABLA = "".join(
+    bytes([i]).decode(FALLBACK_ENCODINGS[0], errors="ignore") or chr(i) for i in range(256))
+_NO_ASCII = re.compile(rb"[\x80-\xff]")
+_ASCII = bytes(range(128))
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32-le"), (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+
+def _resolve_bom(head: bytes, encoding: str):
+    """(encoding sin BOM, bytes de BOM a saltar). 'utf-16' + FFFE -> ('utf-16-le', 2)."""
+    for bom, enc in _BOMS:
+        if head.startswith(bom):
+            return enc, len(bom)
+    name = codecs.lookup(encoding).name
+    if name == "utf-16":
+        return "utf-16-le", 0
+    if name == "utf-32":
+        return "utf-32-le", 0
+    if name == "utf-8-sig":
+        return "utf-8", 0
+    return encoding, 0
+
+
+# El manejador de errores de codecs es global; el stream que está decodificando en cada
+# hilo se guarda aquí (parquet.py lee varios archivos a la vez en hilos).
+_decoding = threading.local()
+
+def _stream_error_handler(exc):
+    return _decoding.stream._on_error(exc)
+
+codecs.register_error("decodedstream", _stream_error_handler)
+
+
+class DecodedStream(io.TextIOBase):
+    """Texto decodificado por bloques desde un archivo binario (ver módulo)."""
+
+    def __init__(self, raw, encoding: str, chunk_bytes: int = CHUNK_BYTES):
+        self.raw = raw
+        self.chunk_bytes = chunk_bytes
+        head = raw.read(chunk_bytes)
+        self.encoding_used, skip = _resolve_bom(head, encoding)
+        self._wide = codecs.lookup(self.encoding_used).name.startswith(("utf-16", "utf-32"))
+        self._utf8 = codecs.lookup(self.encoding_used).name == "utf-8"
+        self._pending = b""
+        self._pos = skip          # offset absoluto del primer byte de _pending
+        self._eof = False
+        self.replaced = []        # [(byte_inicio, byte_fin, encoding_o_'replace')]
+        self.n_replaced = 0       # tramos en total (replaced se corta en MAX_REPLACED)
+        self._last = None         # último tramo (fin, como), para fusionar contiguos
+        self._data = b""          # bloque que se está decodificando
+        self._final = False
+        self._cut = None
+        self._buf = self._decode(head[skip:], final=False)
+
+    def readable(self):
+        return True
+
+    def _fallback(self, bad: bytes) -> tuple:
+        if not self._wide:
+            for enc in FALLBACK_ENCODINGS:
+                try:
+                    return bad.decode(enc), enc
+                except UnicodeDecodeError:
+                    continue
+        return "\ufffd", "replace"
+
+    def _contiguo(self, a: int, how: str) -> bool:
+        """¿El tramo que empieza en a sigue al anterior? En UTF-8 basta con ASCII entre ambos."""
+        if self._last is None or self._last[1] != how:
+            return False
+        if not self._utf8:
+            return self._last[0] == a
+        # lo anterior a este bloque ya se revisó al terminar el bloque previo (_decode)
+        desde = max(self._last[0] - self._pos, 0)
+        return _NO_ASCII.search(self._data, desde, a - self._pos) is None
+
+    def _record(self, a: int, b: int, how: str) -> None:
+        if self._contiguo(a, how):
+            # contiguo al anterior con el mismo encoding: se extiende ese tramo
+            if self.n_replaced <= len(self.replaced):
+                self.replaced[-1] = (self.replaced[-1][0], b, how)
+        else:
+            self.n_replaced += 1
+            if len(self.replaced) < MAX_REPLACED:
+                self.replaced.append((a, b, how))
+        self._last = (b, how)
+
+    def _on_error(self, e: UnicodeDecodeError) -> tuple:
+        """Manejador de errores de codecs: texto de reemplazo y posición donde seguir."""
+        data, a, b = e.object, e.start, e.end
+        if b >= len(data) and not self._final and len(data) - a < 4:
+            # Carácter multibyte partido entre bloques: se completa con el siguiente
+            self._cut = a
+            return "", len(data)
+        if self._utf8:
+            # Un CP1252 leído como UTF-8 falla en cada acento: se toma todo el tramo
+            # hasta la siguiente secuencia UTF-8 válida (el ASCII decodifica igual)
+            m = _UTF8_MULTIBYTE.search(data, b)
+            c = m.start() if m else len(data)
+            if c == len(data) and not self._final:
+                c = max(b, c - 3)  # lo último puede ser un carácter partido
+            tramo = data[a:c]
+            text, _ = codecs.charmap_decode(tramo, "strict", _CP1252_TABLA)
+            # se registra hasta el último byte no ASCII: el corte c depende del bloque
+            fin = a + len(tramo.rstrip(_ASCII))
+            self._record(self._pos + a, self._pos + fin, FALLBACK_ENCODINGS[0])
+            return text, c
+        text, how = self._fallback(data[a:b])
+        self._record(self._pos + a, self._pos + b, how)
+        return text, b
+
+    def _decode(self, data: bytes, final: bool) -> str:
+        """Decodifica data; deja en _pending un carácter cortado al final (si no es final)."""
+        self._final, self._cut, self._data = final, None, data
+        _decoding.stream = self
+        try:
+            text = data.decode(self.encoding_used, errors="decodedstream")
+        finally:
+            _decoding.stream = None
+            self._data = b""
+        if self._utf8 and self._last is not None:
+            # UTF-8 válido (no ASCII) después del último tramo: el siguiente ya no se fusiona
+            fin = len(data) if self._cut is None else self._cut
+            if _NO_ASCII.search(data, max(self._last[0] - self._pos, 0), fin):
+                self._last = None
+        if self._cut is not None:
+            self._pending = data[self._cut:]
+            self._pos += self._cut
+        else:
+            self._pending = b""
+            self._pos += len(data)
+        return text
+
+    def _fill(self) -> None:
+        chunk = self.raw.read(self.chunk_bytes)
+        data = self._pending + chunk
+        self._eof = not chunk
+        self._buf += self._decode(data, final=self._eof)
+
+    def read(self, size: int = -1) -> str:
+        while not self._eof and (size is None or size < 0 or len(self._buf) < size):
+            self._fill()
+        if size is None or size < 0 or size >= len(self._buf):
+            out, self._buf = self._buf, ""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+class CsvBatchReader:
+    """
+    Itera un CSV en lotes de batch_rows filas (todas las columnas como string).
+    Si el parser C falla por el formato (no por el encoding), reintenta con el
+    parser de Python desde el inicio. Tras iterar, `replaced` tiene los tramos
+    de bytes que se decodificaron con otro encoding (`n_replaced`, cuántos en total).
+    """
+
+    def __init__(self, path: str, encoding: str, delimiter: str, batch_rows: int = BATCH_ROWS):
+        self.path, self.encoding, self.delimiter = path, encoding, delimiter
+        self.batch_rows = batch_rows
+        self.replaced, self.n_replaced = [], 0
+
+    def _iter_engine(self, engine: str):
+        stream = DecodedStream(open_source(self.path), self.encoding)
+        try:
+            kw = {"low_memory": False} if engine == "c" else {}
+            reader = pd.read_csv(stream, sep=self.delimiter, dtype=str, engine=engine,
+                                 chunksize=self.batch_rows, **kw)
+            with reader:
+                for df in reader:
+                    yield df.reset_index(drop=True)
+        finally:
+            self.replaced, self.n_replaced = stream.replaced, stream.n_replaced
+            stream.close()
+
+    def __iter__(self):
+        emitted = False
+        try:
+            for df in self._iter_engine("c"):
+                emitted = True
+                yield df
+        except (pd.errors.ParserError, ValueError):
+            if emitted:
+                raise
+            logging.warning("Parser C falló en %s; se reintenta con engine='python'", self.path)
+            yield from self._iter_engine("python")
+        if self.replaced:
+            logging.warning("%s: %d tramos de bytes decodificados con otro encoding (p.ej. %s)",
+                            self.path, self.n_replaced, self.replaced[:3])
+
+    def tables(self):
+        """Los mismos lotes como Tables de Arrow."""
+        for df in self:
+            yield pa.Table.from_pandas(df, preserve_index=False)
+
+
+class Utf8Reencoder(io.RawIOBase):
+    """Vista binaria UTF-8 de un DecodedStream (entrada para pyarrow.csv)."""
+
+    def __init__(self, text_stream: DecodedStream, chars: int = CHUNK_BYTES):
+        self.text = text_stream
+        self.chars = chars
+        self._buf = b""
+
+    def readable(self):
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            out, self._buf = self._buf + self.text.read().encode("utf-8"), b""
+            return out
+        while len(self._buf) < size:
+            more = self.text.read(self.chars)
+            if not more:
+                break
+            self._buf += more.encode("utf-8")
+        out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.text.close()
+        super().close()
+
+
+class ArrowCsvBatchReader:
+    """
+    Lotes (pa.RecordBatch, todo string) de un CSV con pyarrow.csv.open_csv.
+    `columns` son los nombres ya normalizados como pandas (header_scan), así los
+    duplicados se llaman igual en ambos motores. Nulos = los de pandas por defecto.
+    Lanza pa.ArrowInvalid si el archivo tiene filas mal formadas (el llamador puede
+    volver al lector de pandas, que las tolera).
+    """
+
+    def __init__(self, path: str, encoding: str, delimiter: str, columns,
+                 block_bytes: int = ARROW_BLOCK_BYTES):
+        self.path, self.encoding, self.delimiter = path, encoding, delimiter
+        self.columns = list(columns)
+        self.block_bytes = block_bytes
+        self.replaced, self.n_replaced = [], 0
+
+    def __iter__(self):
+        stream = DecodedStream(open_source(self.path), self.encoding)
+        raw = Utf8Reencoder(stream)
+        try:
+            reader = pacsv.open_csv(
+                raw,
+                read_options=pacsv.ReadOptions(column_names=self.columns, skip_rows=1,
+                                               block_size=self.block_bytes, use_threads=True),
+                parse_options=pacsv.ParseOptions(delimiter=self.delimiter),
+                convert_options=pacsv.ConvertOptions(
+                    column_types={c: pa.string() for c in self.columns},
+                    null_values=PANDAS_NA_VALUES, strings_can_be_null=True),
+            )
+            for batch in reader:
+                yield batch
+        finally:
+            self.replaced, self.n_replaced = stream.replaced, stream.n_replaced
+            raw.close()
+        if self.replaced:
+            logging.warning("%s: %d tramos de bytes decodificados con otro encoding (p.ej. %s)",
+                            self.path, self.n_replaced, self.replaced[:3])
+
+
+def iter_csv_batches(path: str, encoding: str, delimiter: str, batch_rows: int = BATCH_ROWS):
+    """Atajo: lotes (DataFrame) de un CSV. Ver CsvBatchReader."""
+    return iter(CsvBatchReader(path, encoding, delimiter, batch_rows))
@@ -4,11 +4,23 @@ Descompresor ENOE (ZIP → carpetas)
 - Recorre todos los .zip dentro de la carpeta 'comprimidos'
 - Extrae cada ZIP en una subcarpeta dentro de 'descompressed' con el mismo nombre del ZIP
 - Incluye protección contra 'zip slip' (paths maliciosos) y logging claro
+- Copia por bloques (CHUNK_SIZE): no carga miembros completos en memoria
+- Extracción concurrente (WORKERS hilos sobre todos los miembros de todos los ZIP)
+- Reanudable: se omiten miembros ya extraídos con mismo tamaño y CRC; cada miembro se
+  escribe a .part y se renombra al terminar (un fallo no deja archivos a medias)
+- Reporta throughput por ZIP (MB/s)
+- Opcional: con parquet.INPUT_MODE = "zip" este paso (y files.py) no hace falta;
+  los CSV se leen directo desde los ZIP (zip_source.py)
 
 Requisitos: Python 3.9+ (probado en 3.12). Sin librerías externas.
 """
 
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+import zlib
+import shutil
 import zipfile
 import logging
 
@@ -16,37 +28,132 @@ import logging
 INPUT_DIR = Path(r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe\comprimidos")
 OUTPUT_DIR = Path(r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe\descompressed")
 
+# === OPCIONES ===
+CHUNK_SIZE = 1024 * 1024                     # bytes por bloque al copiar (1 MiB)
+WORKERS = min(8, (os.cpu_count() or 2))      # 1 = secuencial (como antes)
+VERIFY_CRC = True                            # False = omitir solo por tamaño (más rápido)
+
 # === LOGGING ===
 logging.basicConfig(
     level=logging.INFO,
     format="%(levelname)s | %(message)s"
 )
 
-def safe_extract_zip(zip_path: Path, dest_dir: Path) -> None:
+def _member_target(info: zipfile.ZipInfo, dest_dir: Path):
+    """Ruta destino del miembro o None si escapa de dest_dir (zip slip)."""
+    target_path = (dest_dir / info.filename).resolve()
+    # Protección: el archivo a extraer DEBE quedar dentro de dest_dir
+    if not str(target_path).startswith(str(dest_dir.resolve())):
+        return None
+    return target_path
+
+def _file_crc(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+def already_extracted(info: zipfile.ZipInfo, target_path: Path) -> bool:
+    """True si el destino ya existe con el mismo tamaño (y CRC, si VERIFY_CRC)."""
+    try:
+        if target_path.stat().st_size != info.file_size:
+            return False
+    except FileNotFoundError:
+        return False
+    return (not VERIFY_CRC) or _file_crc(target_path) == info.CRC
+
+def extract_member(zip_path: Path, info: zipfile.ZipInfo, target_path: Path) -> int:
     """
-    Extrae un archivo ZIP en dest_dir, evitando path traversal.
-    Crea directorios necesarios automáticamente.
+    Extrae un miembro por bloques a <destino>.part y lo renombra al terminar.
+    Devuelve los bytes escritos (0 si ya estaba extraído).
     """
+    if already_extracted(info, target_path):
+        return 0
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target_path.with_name(target_path.name + ".part")
+    # Un ZipFile por tarea: cada hilo lee con su propio descriptor
+    with zipfile.ZipFile(zip_path, mode="r") as zf, zf.open(info, "r") as src, open(tmp_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.replace(tmp_path, target_path)
+    return info.file_size
+
+def plan_zip(zip_path: Path, dest_dir: Path):
+    """Lista (info, destino) de los archivos a extraer; crea carpetas y omite zip slip."""
     dest_dir.mkdir(parents=True, exist_ok=True)
-
+    tasks = []
     with zipfile.ZipFile(zip_path, mode="r") as zf:
         for info in zf.infolist():
             # Ruta de destino propuesta (se respeta la estructura interna del ZIP)
-            target_path = (dest_dir / info.filename).resolve()
-
-            # Protección: el archivo a extraer DEBE quedar dentro de dest_dir
-            if not str(target_path).startswith(str(dest_dir.resolve())):
+            target_path = _member_target(info, dest_dir)
+            if target_path is None:
                 logging.warning("Omitido por path traversal: %s dentro de %s", info.filename, zip_path.name)
                 continue
 
             if info.is_dir():
                 target_path.mkdir(parents=True, exist_ok=True)
                 continue
+            tasks.append((info, target_path))
+    return tasks
+
+def safe_extract_zip(zip_path: Path, dest_dir: Path) -> None:
+    """
+    Extrae un archivo ZIP en dest_dir, evitando path traversal.
+    Crea directorios necesarios automáticamente.
+    """
+    for info, target_path in plan_zip(zip_path, dest_dir):
+        extract_member(zip_path, info, target_path)
+
+def _log_throughput(zip_path: Path, stats: dict) -> None:
+    secs = max(stats["end"] - stats["start"], 1e-9)
+    mb = stats["bytes"] / (1024 * 1024)
+    logging.info("Listo %s: %d extraídos, %d ya estaban, %d errores | %.1f MB en %.1f s (%.1f MB/s)",
+                 zip_path.name, stats["extracted"], stats["skipped"], stats["errors"],
+                 mb, secs, mb / secs)
 
-            # Asegurar carpeta y escribir el archivo
-            target_path.parent.mkdir(parents=True, exist_ok=True)
-            with zf.open(info, "r") as src, open(target_path, "wb") as dst:
-                dst.write(src.read())
+def extract_all(zip_files, output_dir: Path, workers: int = WORKERS) -> int:
+    """
+    Extrae todos los ZIP con un pool de hilos sobre (ZIP, miembro). La descompresión (zlib)
+    y la escritura liberan el GIL, así que los hilos sí trabajan en paralelo.
+    Devuelve el número de miembros con error (se reintentan en la siguiente corrida).
+    """
+    plans = {}
+    for zip_path in zip_files:
+        # Subcarpeta destino: nombre del ZIP sin extensión
+        dest_subdir = output_dir / zip_path.stem
+        try:
+            plans[zip_path] = plan_zip(zip_path, dest_subdir)
+            logging.info("Extrayendo: %s  →  %s (%d archivos)", zip_path.name, dest_subdir, len(plans[zip_path]))
+        except Exception as e:
+            logging.error("Error al extraer %s: %s", zip_path.name, e)
+
+    def run(zip_path, info, target_path):
+        t0 = time.perf_counter()
+        n = extract_member(zip_path, info, target_path)
+        return t0, time.perf_counter(), n
+
+    errors = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futures = {zp: [(info, ex.submit(run, zp, info, tp)) for info, tp in tasks]
+                   for zp, tasks in plans.items()}
+        for zip_path, items in futures.items():
+            stats = {"start": float("inf"), "end": 0.0, "bytes": 0,
+                     "extracted": 0, "skipped": 0, "errors": 0}
+            for info, fut in items:
+                try:
+                    t0, t1, n = fut.result()
+                except Exception as e:
+                    stats["errors"] += 1
+                    logging.error("Error al extraer %s de %s: %s", info.filename, zip_path.name, e)
+                    continue
+                stats["start"], stats["end"] = min(stats["start"], t0), max(stats["end"], t1)
+                stats["bytes"] += n
+                stats["extracted" if n else "skipped"] += 1
+            if stats["end"] == 0.0:
+                stats["start"] = stats["end"] = 0.0
+            _log_throughput(zip_path, stats)
+            errors += stats["errors"]
+    return errors
 
 def main():
     if not INPUT_DIR.exists():
@@ -62,16 +169,12 @@ def main():
 
     logging.info("ZIPs encontrados: %d", len(zip_files))
 
-    for zip_path in zip_files:
-        # Subcarpeta destino: nombre del ZIP sin extensión
-        dest_subdir = OUTPUT_DIR / zip_path.stem
-        logging.info("Extrayendo: %s  →  %s", zip_path.name, dest_subdir)
-        try:
-            safe_extract_zip(zip_path, dest_subdir)
-        except Exception as e:
-            logging.error("Error al extraer %s: %s", zip_path.name, e)
+    t0 = time.perf_counter()
+    errores = extract_all(zip_files, OUTPUT_DIR)
+    if errores:
+        logging.warning("%d archivos fallaron; vuelve a correr para reintentar solo esos.", errores)
 
-    logging.info("Proceso terminado. Archivos extraídos en: %s", OUTPUT_DIR)
+    logging.info("Proceso terminado en %.1f s. Archivos extraídos en: %s", time.perf_counter() - t0, OUTPUT_DIR)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,267 @@
+# enoe_aggregate.py
+# -*- coding: utf-8 -*-
+"""
+Agregados ENOE con factor de expansión, calculados directo del maestro SDEMT.
+
+- Totales expandidos (suma de fac_tri / fac), observaciones muestrales y tasas por
+  cualquier cruce de DIMENSIONES (estado, sexo, acceso a salud, informalidad, sector...).
+- Cada dimensión se codifica como entero (catálogo → 0..k-1) y el cruce completo es un
+  solo código en base mixta: la agregación es un np.bincount ponderado por trimestre.
+- Fuera de memoria: por trimestre se leen SOLO las columnas necesarias del maestro
+  (partición anio=/trimestre= o row groups con estadísticas en el archivo único).
+- Los trimestres se procesan en paralelo (hilos: lectura Arrow y bincount sueltan el GIL).
+- `python enoe_aggregate.py` regenera data/enoe/enoe_comercio_estado_sexo_salud_tidy.csv
+  (ocupados en comercio por estado, sexo y acceso a instituciones de salud) con el mismo
+  formato que producía clean_enoe.py a partir del tabulado exportado de INEGI.
+"""
+
+import os, time, logging, argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from parquet_io import is_dataset_dir, open_dataset
+from join_index import code_column, module_periods
+
+# ========= RUTAS =========
+BASE_DIR = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi"
+MASTER_SDEMT = os.path.join(BASE_DIR, "microdatos-enoe", "parquet_master", "enoe_master_sdemt.parquet")
+OUT_TIDY = os.path.join(BASE_DIR, "UNAM-INEGI", "data", "enoe", "enoe_comercio_estado_sexo_salud_tidy.csv")
+
+AGG_WORKERS = max(1, min(8, os.cpu_count() or 1))
+
+# Factor de expansión: ENOEN (2020T3+) trae fac_tri; la ENOE clásica, fac
+WEIGHT_COLS = ["fac_tri", "fac"]
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+
+# ========= CATÁLOGOS =========
+ENTIDADES = {
+    1: "Aguascalientes", 2: "Baja California", 3: "Baja California Sur", 4: "Campeche",
+    5: "Coahuila de Zaragoza", 6: "Colima", 7: "Chiapas", 8: "Chihuahua",
+    9: "Ciudad de México", 10: "Durango", 11: "Guanajuato", 12: "Guerrero",
+    13: "Hidalgo", 14: "Jalisco", 15: "México", 16: "Michoacán de Ocampo",
+    17: "Morelos", 18: "Nayarit", 19: "Nuevo León", 20: "Oaxaca", 21: "Puebla",
+    22: "Querétaro", 23: "Quintana Roo", 24: "San Luis Potosí", 25: "Sinaloa",
+    26: "Sonora", 27: "Tabasco", 28: "Tamaulipas", 29: "Tlaxcala",
+    30: "Veracruz de Ignacio de la Llave", 31: "Yucatán", 32: "Zacatecas",
+}
+
+# nombre -> {"col": columna SDEMT, "labels": {código: etiqueta}}
+# "groups" (opcional) agrupa códigos crudos en los códigos de "labels".
+DIMENSIONES = {
+    "estado": {"col": "ent", "labels": ENTIDADES},
+    "sexo": {"col": "sex", "labels": {1: "Hombre", 2: "Mujer"}},
+    "acceso_salud": {
+        "col": "imssissste",
+        "groups": {1: 1, 2: 1, 3: 1, 4: 2, 5: 3},
+        "labels": {1: "Con acceso a instituciones de salud",
+                   2: "Sin acceso a instituciones de salud", 3: "No especificado"},
+    },
+    "informalidad": {"col": "emp_ppal", "labels": {1: "Informal", 2: "Formal"}},
+    "sector": {
+        "col": "rama",
+        "labels": {1: "Construcción", 2: "Industria manufacturera", 3: "Comercio", 4: "Servicios",
+                   5: "Otros", 6: "Agropecuario", 7: "No especificado"},
+    },
+}
+
+# Población de referencia de INEGI: entrevista completa, residentes habituales, 15+ años
+FILTROS_BASE = {"r_def": [0], "c_res": [1, 3], "eda": (15, 98)}
+FILTROS_OCUPADOS = {**FILTROS_BASE, "clase2": [1]}
+FILTROS_COMERCIO = {**FILTROS_OCUPADOS, "rama": [3]}
+
+TRIMESTRE_TEXTO = {1: "Primer", 2: "Segundo", 3: "Tercer", 4: "Cuarto"}
+
+# Etiqueta del total nacional (suma de los estados) cuando se pide con `nacional`
+NACIONAL = "Estados Unidos Mexicanos"
+# En el tabulado exportado de INEGI (y en el tidy de clean_enoe.py) esa fila va sin nombre
+NACIONAL_TIDY = " "
+
+# ========= LECTURA =========
+def open_master(path: str) -> ds.Dataset:
+    """Archivo único o dataset particionado del maestro."""
+    return open_dataset(path) if is_dataset_dir(path) else ds.dataset(path, format="parquet")
+
+def resolve_columns(schema: pa.Schema, names) -> dict:
+    """{nombre pedido: nombre real} sin distinguir mayúsculas (solo las que existen)."""
+    low = {n.lower(): n for n in schema.names}
+    return {n: low[n.lower()] for n in names if n.lower() in low}
+
+def int_codes(tbl: pa.Table, col: str) -> np.ndarray:
+    """Códigos enteros (int64, -1 = nulo o no numérico)."""
+    arr = code_column(tbl, col.lower())
+    if arr is None:
+        return np.full(tbl.num_rows, -1, dtype=np.int64)
+    return pc.fill_null(arr, -1).to_numpy()
+
+def _weights(tbl: pa.Table) -> np.ndarray:
+    """Primer factor no nulo de WEIGHT_COLS por fila (0 si ninguno)."""
+    w = None
+    for c in WEIGHT_COLS:
+        if c not in tbl.column_names:
+            continue
+        arr = tbl[c]
+        if not (pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type)):
+            arr = pc.cast(pc.cast(arr, pa.string()), pa.float64(), safe=False)
+        arr = pc.cast(arr, pa.float64())
+        w = arr if w is None else pc.coalesce(w, arr)
+    if w is None:
+        raise ValueError(f"El maestro no trae factor de expansión ({', '.join(WEIGHT_COLS)})")
+    return pc.fill_null(w, 0.0).to_numpy()
+
+def _filter_mask(tbl: pa.Table, filters: dict) -> np.ndarray:
+    mask = np.ones(tbl.num_rows, dtype=bool)
+    for col, allowed in filters.items():
+        if col not in tbl.column_names:
+            continue  # variable que no existe en esa época de la encuesta
+        v = int_codes(tbl, col)
+        if isinstance(allowed, tuple):
+            mask &= (v >= allowed[0]) & (v <= allowed[1])
+        else:
+            mask &= np.isin(v, allowed)
+    return mask
+
+def _lookup(spec: dict) -> tuple:
+    """(tabla código crudo → índice 0..k-1 o -1, etiquetas en orden de índice)."""
+    labels = list(spec["labels"].items())
+    pos = {code: i for i, (code, _) in enumerate(labels)}
+    raw = spec.get("groups") or {code: code for code in spec["labels"]}
+    lut = np.full(max(raw) + 2, -1, dtype=np.int64)
+    for code, group in raw.items():
+        lut[code] = pos[group]
+    return lut, [lab for _, lab in labels]
+
+# ========= AGREGACIÓN =========
+def encode_period(dataset: ds.Dataset, anio: int, tri: int, dims, filters: dict, extra=()) -> dict:
+    """
+    Lee un trimestre (solo columnas de dims, filtros, factores y `extra`) y codifica el cruce.
+    Devuelve {"tbl", "mask", "w", "code", "sizes", "labels"}: code es el índice de la celda
+    en base mixta (válido donde mask), sizes/labels las categorías de cada dimensión.
+    """
+    specs = [DIMENSIONES[d] for d in dims]
+    wanted = [s["col"] for s in specs] + list(filters) + WEIGHT_COLS + list(extra)
+    cols = resolve_columns(dataset.schema, wanted)
+    tbl = dataset.to_table(columns=sorted(set(cols.values())),
+                           filter=(ds.field("anio") == anio) & (ds.field("trimestre") == tri))
+    tbl = tbl.rename_columns([c.lower() for c in tbl.column_names])
+
+    mask = _filter_mask(tbl, filters)
+    w = _weights(tbl)
+    code = np.zeros(tbl.num_rows, dtype=np.int64)
+    sizes, all_labels = [], []
+    for spec in specs:
+        lut, labels = _lookup(spec)
+        raw = int_codes(tbl, spec["col"])
+        idx = np.where((raw >= 0) & (raw < len(lut)), lut[np.clip(raw, 0, len(lut) - 1)], -1)
+        mask &= idx >= 0
+        code = code * len(labels) + idx
+        sizes.append(len(labels))
+        all_labels.append(labels)
+    return {"tbl": tbl, "mask": mask, "w": w, "code": code, "sizes": sizes, "labels": all_labels}
+
+def cells_frame(anio: int, tri: int, dims, enc: dict, cells: np.ndarray) -> pd.DataFrame:
+    """anio, trimestre y etiquetas de dims para los índices de celda dados."""
+    out = {"anio": np.full(len(cells), anio), "trimestre": np.full(len(cells), tri)}
+    sizes = enc["sizes"]
+    for d, labels, idx in zip(dims, enc["labels"], np.unravel_index(cells, sizes) if sizes else []):
+        out[d] = pd.Categorical.from_codes(idx, categories=labels)
+    return pd.DataFrame(out)
+
+def aggregate_period(dataset: ds.Dataset, anio: int, tri: int, dims, filters: dict,
+                     nacional: str = None) -> pd.DataFrame:
+    """
+    Un trimestre: total expandido y observaciones por cada celda no vacía del cruce dims.
+    Con `nacional` (y "estado" en dims) agrega las filas de la suma de los estados con
+    esa etiqueta en "estado".
+    """
+    enc = encode_period(dataset, anio, tri, dims, filters)
+    mask, w, combined, sizes = enc["mask"], enc["w"], enc["code"], enc["sizes"]
+    size = int(np.prod(sizes)) if sizes else 1
+    total = np.bincount(combined[mask], weights=w[mask], minlength=size)
+    n_obs = np.bincount(combined[mask], minlength=size)
+    cells = np.flatnonzero(n_obs)
+
+    out = cells_frame(anio, tri, dims, enc, cells)
+    out["total"] = total[cells]
+    out["n_obs"] = n_obs[cells]
+    if nacional is None or "estado" not in dims:
+        return out
+
+    # Nacional: se suma el eje de estado de las celdas ya agregadas
+    k = list(dims).index("estado")
+    total_n = total.reshape(sizes).sum(axis=k).ravel()
+    n_obs_n = n_obs.reshape(sizes).sum(axis=k).ravel()
+    cells_n = np.flatnonzero(n_obs_n)
+    sub = {"sizes": [s for i, s in enumerate(sizes) if i != k],
+           "labels": [lab for i, lab in enumerate(enc["labels"]) if i != k]}
+    nac = cells_frame(anio, tri, [d for d in dims if d != "estado"], sub, cells_n)
+    nac.insert(2, "estado", nacional)
+    nac["total"] = total_n[cells_n]
+    nac["n_obs"] = n_obs_n[cells_n]
+    out["estado"] = out["estado"].cat.add_categories([nacional])
+    nac["estado"] = pd.Categorical(nac["estado"], categories=out["estado"].cat.categories)
+    return pd.concat([nac, out[nac.columns]], ignore_index=True)
+
+def weighted_crosstab(master: str, dims, filters: dict = FILTROS_OCUPADOS, periods=None,
+                      workers: int = AGG_WORKERS, nacional: str = None) -> pd.DataFrame:
+    """
+    Totales expandidos por trimestre y cruce de dims (nombres de DIMENSIONES).
+    periods: lista de (anio, trimestre) o None para todos los del maestro.
+    nacional: etiqueta para agregar el total nacional (ver aggregate_period).
+    """
+    dataset = open_master(master)
+    periods = sorted(periods or module_periods(dataset))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        parts = list(ex.map(lambda p: aggregate_period(dataset, p[0], p[1], dims, filters, nacional),
+                            periods))
+    if not parts:
+        return pd.DataFrame(columns=["anio", "trimestre", *dims, "total", "n_obs"])
+    return pd.concat(parts, ignore_index=True)
+
+def add_rates(df: pd.DataFrame, by, col: str = "total", name: str = "tasa") -> pd.DataFrame:
+    """Tasa (%) de cada celda dentro de su grupo `by` (además de anio/trimestre)."""
+    keys = ["anio", "trimestre", *by]
+    den = df.groupby(keys, observed=True)[col].transform("sum")
+    df[name] = 100 * df[col] / den.where(den > 0)
+    return df
+
+# ========= TABLA TIDY: COMERCIO × ESTADO × SEXO × SALUD =========
+def comercio_estado_sexo_salud(master: str, workers: int = AGG_WORKERS) -> pd.DataFrame:
+    """
+    Mismo formato que enoe_comercio_estado_sexo_salud_tidy.csv (clean_enoe.py): los 32
+    estados más la fila nacional sin nombre (NACIONAL_TIDY) del tabulado.
+    """
+    tidy = weighted_crosstab(master, ["estado", "acceso_salud", "sexo"], FILTROS_COMERCIO,
+                             workers=workers, nacional=NACIONAL_TIDY)
+    tidy["trimestre_texto"] = (tidy["trimestre"].map(TRIMESTRE_TEXTO) + " trimestre del "
+                               + tidy["anio"].astype(str))
+    tidy["periodo"] = pd.PeriodIndex.from_fields(year=tidy["anio"], quarter=tidy["trimestre"], freq="Q-DEC")
+    # Último instante del trimestre en ns (como el to_timestamp(how="end") de clean_enoe.py)
+    inicio_sig = (tidy["periodo"] + 1).dt.start_time.astype("datetime64[ns]")
+    tidy["fecha_fin_trimestre"] = inicio_sig - pd.Timedelta(1, "ns")
+    tidy["valor"] = tidy["total"].round().astype("int64")
+    for c in ["estado", "acceso_salud", "sexo"]:
+        tidy[c] = tidy[c].astype(str)
+    cols = ["estado", "acceso_salud", "sexo", "anio", "trimestre", "trimestre_texto",
+            "periodo", "fecha_fin_trimestre", "valor"]
+    return tidy[cols].sort_values(["estado", "acceso_salud", "anio", "trimestre", "sexo"],
+                                  ignore_index=True)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Agregados ENOE ponderados desde el maestro SDEMT")
+    ap.add_argument("--master", default=MASTER_SDEMT, help="enoe_master_sdemt.parquet o su dataset particionado")
+    ap.add_argument("--out", default=OUT_TIDY, help="CSV tidy de salida")
+    ap.add_argument("--workers", type=int, default=AGG_WORKERS)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    tidy = comercio_estado_sexo_salud(args.master, args.workers)
+    tidy.to_csv(args.out, index=False, encoding="utf-8-sig")
+    logging.info("Tidy comercio×estado×sexo×salud: %s filas, %d trimestres en %.1f s → %s",
+                 f"{len(tidy):,}", tidy[["anio", "trimestre"]].drop_duplicates().shape[0],
+                 time.perf_counter() - t0, args.out)
@@ -0,0 +1,306 @@
+# enoe_variance.py
+# -*- coding: utf-8 -*-
+"""
+Errores estándar, CV e intervalos de confianza de las estimaciones ENOE con el diseño
+muestral (UPM, estrato, factor de expansión), como los que publica INEGI.
+
+- Dominios = celdas del cruce de DIMENSIONES (enoe_aggregate.py); totales expandidos y
+  tasas (% de un dominio dentro de su grupo `by`, p.ej. informales dentro de cada estado).
+- "taylor": linealización de Taylor con conglomerados (UPM) dentro de estratos:
+      V(Y) = Σ_h n_h/(n_h-1) Σ_i (z_hi - z̄_h)²
+  z_hi es el total ponderado de la UPM i (para tasas, el residuo linealizado y - R·x).
+  Todos los dominios a la vez: totales por (UPM, dominio) y por (estrato, dominio) con
+  np.bincount sobre códigos enteros, sin ciclos por dominio.
+- "bootstrap": bootstrap de Rao-Wu (n_h - 1 UPM con reemplazo por estrato). Las réplicas
+  se generan UNA vez por trimestre y se guardan compactas en REPLICATES_DIR:
+  multiplicidades int16 [UPM × réplica] + ajuste n_h/(n_h-1) float32 por UPM.
+  Las estimaciones replicadas son productos de esas matrices con los totales por UPM.
+- Estratos con una sola UPM no aportan varianza (se reportan en el log).
+- Trimestres en paralelo (hilos). La salida lleva las llaves de los tidy MEITEF
+  (estado con "Estados Unidos Mexicanos" para el nacional, anio, periodo "Tn", fecha) para
+  unirse a las tablas que usa analisis_meitef.py.
+"""
+
+import os, time, logging, argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from join_index import module_periods
+from enoe_aggregate import (BASE_DIR, MASTER_SDEMT, AGG_WORKERS, FILTROS_COMERCIO, FILTROS_OCUPADOS,
+                            open_master, encode_period, cells_frame, int_codes)
+
+# ========= RUTAS =========
+REPLICATES_DIR = os.path.join(BASE_DIR, "microdatos-enoe", "parquet_master", "replicates")
+OUT_VARIANZA = os.path.join(BASE_DIR, "UNAM-INEGI", "data", "enoe", "enoe_comercio_estado_varianza.csv")
+
+# ========= DISEÑO =========
+PSU_COL = "upm"
+STRATUM_COLS = ["est_d_tri", "est_d"]   # ENOEN / ENOE clásica
+N_REPLICATES = 200
+SEED = 2025
+REP_CHUNK = 50          # réplicas que se multiplican a la vez (memoria ~ celdas × REP_CHUNK)
+Z90 = 1.6448536         # INEGI publica intervalos al 90%
+NACIONAL = "Estados Unidos Mexicanos"
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+
+# ========= DISEÑO MUESTRAL =========
+def design_arrays(tbl) -> dict:
+    """
+    UPM y estrato de cada fila → {"psu": índice 0..n_upm-1 (-1 si falta), "upm": ids,
+    "psu_h": estrato (0..H-1) de cada UPM, "n_h": UPM por estrato}.
+    """
+    upm_raw = int_codes(tbl, PSU_COL)
+    strat = np.full(tbl.num_rows, -1, dtype=np.int64)
+    for c in STRATUM_COLS:
+        if c in tbl.column_names:
+            v = int_codes(tbl, c)
+            strat = np.where(strat < 0, v, strat)
+    ok = (upm_raw >= 0) & (strat >= 0)
+    upm, first, inv = np.unique(upm_raw[ok], return_index=True, return_inverse=True)
+    psu = np.full(tbl.num_rows, -1, dtype=np.int64)
+    psu[ok] = inv
+    strata, psu_h = np.unique(strat[ok][first], return_inverse=True)
+    n_h = np.bincount(psu_h, minlength=len(strata))
+    return {"psu": psu, "upm": upm, "psu_h": psu_h, "n_h": n_h}
+
+def make_replicates(design: dict, n_rep: int, seed: int) -> dict:
+    """Rao-Wu: por réplica, n_h-1 UPM con reemplazo en cada estrato → multiplicidades int16."""
+    psu_h, n_h = design["psu_h"], design["n_h"]
+    n_psu = len(psu_h)
+    order = np.argsort(psu_h, kind="stable")            # UPM agrupadas por estrato
+    start = np.concatenate([[0], np.cumsum(n_h)[:-1]])
+    m_h = np.where(n_h > 1, n_h - 1, 0)
+    draw_h = np.repeat(np.arange(len(n_h)), m_h)
+    rng = np.random.default_rng(seed)
+    mult = np.empty((n_psu, n_rep), dtype=np.int16)
+    for b in range(n_rep):
+        pos = start[draw_h] + (rng.random(len(draw_h)) * n_h[draw_h]).astype(np.int64)
+        mult[order, b] = np.bincount(pos, minlength=n_psu)
+    single = n_h[psu_h] == 1
+    mult[single, :] = 1
+    factor = np.where(single, 1.0, n_h[psu_h] / np.maximum(n_h[psu_h] - 1, 1)).astype(np.float32)
+    return {"upm": design["upm"], "mult": mult, "factor": factor}
+
+def load_replicates(design: dict, anio: int, tri: int, n_rep: int = N_REPLICATES,
+                    rep_dir: str = None) -> dict:
+    """Réplicas del trimestre: se reutilizan si las UPM y el número de réplicas coinciden."""
+    rep_dir = rep_dir or REPLICATES_DIR
+    path = os.path.join(rep_dir, f"rep_{anio}T{tri}.npz")
+    if os.path.exists(path):
+        with np.load(path) as z:
+            if z["mult"].shape[1] == n_rep and np.array_equal(z["upm"], design["upm"]):
+                return {"upm": z["upm"], "mult": z["mult"], "factor": z["factor"]}
+    reps = make_replicates(design, n_rep, SEED + anio * 10 + tri)
+    os.makedirs(rep_dir, exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, **reps)
+    os.replace(tmp, path)
+    return reps
+
+# ========= ESTIMADORES =========
+def psu_cells(psu: np.ndarray, idx: np.ndarray, values: np.ndarray, n_idx: int):
+    """Totales por (UPM, índice) no vacíos → (upm de la celda, índice, total, llaves ordenadas)."""
+    key = psu * n_idx + idx
+    ukey, inv = np.unique(key, return_inverse=True)
+    return ukey // n_idx, ukey % n_idx, np.bincount(inv, weights=values), ukey
+
+def taylor_var(cell_psu, cell_idx, z, design: dict, n_idx: int) -> np.ndarray:
+    """Σ_h n_h/(n_h-1) (Σ_i z² - (Σ_i z)²/n_h) por índice; las UPM sin el dominio aportan z=0."""
+    psu_h, n_h = design["psu_h"], design["n_h"]
+    h = psu_h[cell_psu]
+    ukey, inv = np.unique(h * n_idx + cell_idx, return_inverse=True)
+    s1 = np.bincount(inv, weights=z)
+    s2 = np.bincount(inv, weights=z * z)
+    nh = n_h[ukey // n_idx].astype(float)
+    contrib = np.where(nh > 1, nh / np.maximum(nh - 1, 1) * (s2 - s1 * s1 / nh), 0.0)
+    return np.bincount(ukey % n_idx, weights=contrib, minlength=n_idx)
+
+def replicate_totals(cell_psu, cell_idx, z, reps: dict, n_idx: int) -> np.ndarray:
+    """Totales replicados [n_idx × réplicas] = Σ_celdas ajuste·multiplicidad·z (por bloques)."""
+    n_rep = reps["mult"].shape[1]
+    order = np.argsort(cell_idx, kind="stable")
+    cell_psu, cell_idx, z = cell_psu[order], cell_idx[order], z[order]
+    present, starts = np.unique(cell_idx, return_index=True)
+    base = (reps["factor"][cell_psu] * z)[:, None]
+    out = np.zeros((n_idx, n_rep))
+    for b0 in range(0, n_rep, REP_CHUNK):
+        m = reps["mult"][cell_psu, b0:b0 + REP_CHUNK] * base
+        out[present, b0:b0 + REP_CHUNK] = np.add.reduceat(m, starts, axis=0)
+    return out
+
+def parent_index(sizes, dims, by) -> tuple:
+    """Para cada dominio, el índice de su grupo `by` (subconjunto de dims) y cuántos grupos hay."""
+    coords = np.unravel_index(np.arange(int(np.prod(sizes))), sizes)
+    keep = [i for i, d in enumerate(dims) if d in by]
+    psizes = [sizes[i] for i in keep]
+    if not keep:
+        return np.zeros(int(np.prod(sizes)), dtype=np.int64), 1
+    return np.ravel_multi_index([coords[i] for i in keep], psizes), int(np.prod(psizes))
+
+def estimate_domains(design: dict, psu, dom, w, n_dom: int, method: str, reps=None,
+                     parent_of=None, n_par: int = 0) -> dict:
+    """
+    Estimación y varianza para todos los dominios. Sin parent_of: totales; con parent_of:
+    tasa (%) de cada dominio dentro de su grupo.
+    """
+    total = np.bincount(dom, weights=w, minlength=n_dom)
+    c_psu, c_dom, z, ukey = psu_cells(psu, dom, w, n_dom)
+    if parent_of is None:
+        est = total
+        if method == "taylor":
+            var = taylor_var(c_psu, c_dom, z, design, n_dom)
+        else:
+            var = replicate_totals(c_psu, c_dom, z, reps, n_dom).var(axis=1, ddof=1)
+        return {"est": est, "var": var}
+
+    # Tasas R_d = Y_d / X_p(d)
+    par = parent_of[dom]
+    x_tot = np.bincount(par, weights=w, minlength=n_par)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = total / x_tot[parent_of]
+    p_psu, p_idx, pz, _ = psu_cells(psu, par, w, n_par)
+    if method == "taylor":
+        # Celdas (UPM, dominio) para toda UPM donde aparece el grupo del dominio
+        order = np.argsort(parent_of, kind="stable")
+        n_child = np.bincount(parent_of, minlength=n_par)
+        first = np.concatenate([[0], np.cumsum(n_child)[:-1]])
+        rep_cell = np.repeat(np.arange(len(p_psu)), n_child[p_idx])
+        offset = np.arange(len(rep_cell)) - np.repeat(np.cumsum(n_child[p_idx]) - n_child[p_idx], n_child[p_idx])
+        d = order[first[p_idx[rep_cell]] + offset]
+        cpsu = p_psu[rep_cell]
+        key = cpsu * n_dom + d
+        pos = np.clip(np.searchsorted(ukey, key), 0, len(ukey) - 1)
+        y = np.where(ukey[pos] == key, z[pos], 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lin = (y - r[d] * pz[rep_cell]) / x_tot[parent_of[d]]
+        var = taylor_var(cpsu, d, np.nan_to_num(lin), design, n_dom)
+    else:
+        yb = replicate_totals(c_psu, c_dom, z, reps, n_dom)
+        xb = replicate_totals(p_psu, p_idx, pz, reps, n_par)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = (yb / xb[parent_of]).var(axis=1, ddof=1)
+    return {"est": 100 * r, "var": 100 ** 2 * var}
+
+def estimate_period(dataset, anio: int, tri: int, dims, filters: dict, by=None,
+                    method: str = "taylor", nacional: bool = True, n_rep: int = N_REPLICATES) -> pd.DataFrame:
+    """Un trimestre: estimación, EE, CV e IC 90% por dominio (y el nacional si dims trae estado)."""
+    enc = encode_period(dataset, anio, tri, dims, filters, extra=[PSU_COL] + STRATUM_COLS)
+    design = design_arrays(enc["tbl"])
+    ok = enc["mask"] & (design["psu"] >= 0)
+    sin_diseno = int((enc["mask"] & (design["psu"] < 0)).sum())
+    if sin_diseno:
+        logging.warning("%dT%d: %d registros del dominio sin UPM/estrato (se omiten)", anio, tri, sin_diseno)
+    if (design["n_h"] == 1).any():
+        logging.info("%dT%d: %d estratos con una sola UPM (sin aporte a la varianza)",
+                     anio, tri, int((design["n_h"] == 1).sum()))
+    reps = load_replicates(design, anio, tri, n_rep) if method == "bootstrap" else None
+
+    psu, w = design["psu"][ok], enc["w"][ok]
+    variants = [(list(dims), enc["sizes"], enc["code"][ok], None)]
+    if nacional and "estado" in dims:
+        k = list(dims).index("estado")
+        coords = list(np.unravel_index(enc["code"][ok], enc["sizes"]))
+        sizes_n = [s for i, s in enumerate(enc["sizes"]) if i != k]
+        code_n = (np.ravel_multi_index([c for i, c in enumerate(coords) if i != k], sizes_n)
+                  if sizes_n else np.zeros(len(psu), dtype=np.int64))
+        variants.append(([d for d in dims if d != "estado"], sizes_n, code_n, NACIONAL))
+
+    frames = []
+    for vdims, sizes, dom, estado in variants:
+        n_dom = int(np.prod(sizes)) if sizes else 1
+        parent_of, n_par = (parent_index(sizes, vdims, [b for b in by if b in vdims])
+                            if by is not None else (None, 0))
+        res = estimate_domains(design, psu, dom, w, n_dom, method, reps, parent_of, n_par)
+        n_obs = np.bincount(dom, minlength=n_dom)
+        n_upm = np.bincount(np.unique(psu * n_dom + dom) % n_dom, minlength=n_dom)
+        cells = np.flatnonzero(n_obs)
+        sub = {"sizes": sizes, "labels": [enc["labels"][list(dims).index(d)] for d in vdims]}
+        out = cells_frame(anio, tri, vdims, sub, cells)
+        if estado is not None:
+            out.insert(2, "estado", estado)
+        ee = np.sqrt(res["var"][cells])
+        est = res["est"][cells]
+        out["estimacion"] = est
+        out["ee"] = ee
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["cv"] = 100 * ee / est
+        out["li90"] = est - Z90 * ee
+        out["ls90"] = est + Z90 * ee
+        out["n_obs"] = n_obs[cells]
+        out["n_upm"] = n_upm[cells]
+        frames.append(out)
+    df = pd.concat(frames, ignore_index=True)
+    for d in dims:
+        df[d] = df[d].astype(str)
+    df["metodo"] = method
+    return df
+
+def estimate(master: str, dims, filters: dict = FILTROS_OCUPADOS, by=None, method: str = "taylor",
+             periods=None, nacional: bool = True, n_rep: int = N_REPLICATES,
+             workers: int = AGG_WORKERS) -> pd.DataFrame:
+    """
+    Estimaciones con precisión para todos los trimestres del maestro (o `periods`).
+    by=None → totales expandidos; by=[dims...] → % de cada dominio dentro de ese grupo.
+    """
+    if method not in ("taylor", "bootstrap"):
+        raise ValueError(f"method debe ser 'taylor' o 'bootstrap': {method}")
+    dataset = open_master(master)
+    periods = sorted(periods or module_periods(dataset))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        parts = list(ex.map(lambda p: estimate_period(dataset, p[0], p[1], dims, filters, by,
+                                                      method, nacional, n_rep), periods))
+    return add_meitef_keys(pd.concat(parts, ignore_index=True)) if parts else pd.DataFrame()
+
+# ========= SALIDA COMPATIBLE CON LOS TIDY MEITEF =========
+def add_meitef_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega periodo ('T1'..'T4') y fecha (fin de trimestre) como en meitef_*_tidy.csv."""
+    df["periodo"] = "T" + df["trimestre"].astype(str)
+    fin = pd.PeriodIndex.from_fields(year=df["anio"], quarter=df["trimestre"], freq="Q-DEC").end_time
+    df["fecha"] = fin.strftime("%Y-%m-%d")
+    return df
+
+METRICAS = {"estimacion": None, "ee": "Error estándar", "cv": "Coeficiente de variación (%)",
+            "li90": "Límite inferior IC 90%", "ls90": "Límite superior IC 90%"}
+
+def to_meitef_long(df: pd.DataFrame, indicador: str, unidad: str, dims) -> pd.DataFrame:
+    """
+    Formato largo de los tidy MEITEF (estado, anio, periodo, fecha, metric, indicador,
+    fuente, valor). Las dimensiones distintas de estado se agregan al nombre del indicador.
+    """
+    extra = [d for d in dims if d != "estado"]
+    ind = pd.Series(indicador, index=df.index)
+    for d in extra:
+        ind = ind + "_" + df[d].str.lower().str.replace(" ", "_")
+    base = df[["estado", "anio", "periodo", "fecha"]].assign(indicador=ind)
+    parts = []
+    for col, metric in METRICAS.items():
+        parts.append(base.assign(metric=metric or unidad, valor=df[col]))
+    out = pd.concat(parts, ignore_index=True)
+    out["fuente"] = "ENOE microdatos (" + df["metodo"].iloc[0] + ")"
+    return out[["estado", "anio", "periodo", "fecha", "metric", "indicador", "fuente", "valor"]]
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="EE/CV de estimaciones ENOE (Taylor o bootstrap)")
+    ap.add_argument("--master", default=MASTER_SDEMT, help="enoe_master_sdemt.parquet o su dataset particionado")
+    ap.add_argument("--out", default=OUT_VARIANZA, help="CSV largo compatible con los tidy MEITEF")
+    ap.add_argument("--metodo", default="taylor", choices=["taylor", "bootstrap"])
+    ap.add_argument("--replicas", type=int, default=N_REPLICATES)
+    ap.add_argument("--workers", type=int, default=AGG_WORKERS)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    # Ocupados en comercio por estado y % de informalidad dentro de cada estado
+    tot = estimate(args.master, ["estado"], FILTROS_COMERCIO, method=args.metodo,
+                   n_rep=args.replicas, workers=args.workers)
+    inf = estimate(args.master, ["estado", "informalidad"], FILTROS_COMERCIO, by=["estado"],
+                   method=args.metodo, n_rep=args.replicas, workers=args.workers)
+    inf = inf[inf["informalidad"] == "Informal"].drop(columns="informalidad")
+    out = pd.concat([to_meitef_long(tot, "ocupados_comercio_enoe", "Personas", ["estado"]),
+                     to_meitef_long(inf, "tasa_informalidad_comercio_enoe", "Porcentaje", ["estado"])],
+                    ignore_index=True)
+    out.to_csv(args.out, index=False, encoding="utf-8-sig")
+    logging.info("Varianza (%s): %s filas en %.1f s → %s", args.metodo, f"{len(out):,}",
+                 time.perf_counter() - t0, args.out)
@@ -4,35 +4,187 @@ Copiador de CSVs (aplana estructura):
 - Busca recursivamente todos los .csv dentro de 'descompressed'
 - Copia cada archivo a 'files' (una sola carpeta)
 - Si hay colisiones de nombre, agrega __<subcarpeta> y un contador incremental
+- Deduplica por contenido (sha256, calculado en paralelo): el mismo CSV repetido en
+  varios ZIP se guarda UNA vez (evita que parquet.py cuente filas dos veces)
+- LINK_MODE: reflink / hardlink cuando origen y destino están en el mismo disco
+  (sin duplicar bytes); si no se puede, copia normal
+- Escribe files/_mapping.tsv: ruta original → archivo canónico (y sha256); en corridas
+  siguientes se reutiliza para no volver a copiar lo que ya está
+- Los canónicos que el mapeo nuevo ya no referencia (origen borrado o con contenido
+  nuevo, que se coloca aparte) se eliminan de 'files': parquet.py no los lee dos veces
+- Una carpeta 'files' del copiador anterior (sin _mapping.tsv) se adopta: se hashean
+  sus CSV, se borran los duplicados byte a byte (__tag__N) y los orígenes que coinciden
+  reutilizan ese archivo en vez de colocarse otra vez
+- Un hardlink comparte el archivo con su origen: si el origen se editó en su lugar, el
+  canónico cambió con él y se vuelve a colocar (no se confía en el sha256 guardado)
+- Opcional: con parquet.INPUT_MODE = "zip" no se copia nada (ver zip_source.py)
 """
 
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import os
+import csv
 import shutil
 import logging
 import re
 
+from manifest import file_hash
+
 # === RUTAS (ajústalas si cambian) ===
 SRC_ROOT = Path(r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe\descompressed")
 DST_DIR  = Path(r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe\files")
 
+# === OPCIONES ===
+# "auto" = reflink → hardlink → copia; "reflink", "hardlink" o "copy" para forzar uno
+LINK_MODE = "auto"
+HASH_WORKERS = min(8, (os.cpu_count() or 2))
+MAPPING_NAME = "_mapping.tsv"   # no .csv: parquet.py/headers.py no deben leerlo como dato
+
 logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
 
+FICLONE = 0x40049409  # ioctl de Linux (btrfs/xfs) para clonar un archivo sin copiar datos
+
 def sanitize(name: str) -> str:
     """Deja el nombre seguro para usar en archivo (sin caracteres raros)."""
     name = name.strip().replace(" ", "_")
     return re.sub(r'[^A-Za-z0-9_\-\.]+', "_", name)
 
-def unique_dest_path(base_dir: Path, stem: str, suffix: str, tag: str) -> Path:
-    """Genera una ruta de destino única evitando choques."""
-    candidate = base_dir / f"{stem}__{tag}{suffix}"
-    if not candidate.exists():
-        return candidate
+def unique_dest_path(base_dir: Path, stem: str, suffix: str, tag: str, used: set) -> Path:
+    """
+    Genera una ruta de destino única evitando choques. `used` tiene los nombres ya
+    ocupados en base_dir (se lista una vez), así no se consulta el disco por candidato.
+    """
+    name = f"{stem}__{tag}{suffix}"
     i = 2
-    while True:
-        cand = base_dir / f"{stem}__{tag}__{i}{suffix}"
-        if not cand.exists():
-            return cand
+    while name.lower() in used:
+        name = f"{stem}__{tag}__{i}{suffix}"
         i += 1
+    used.add(name.lower())
+    return base_dir / name
+
+def _reflink(src: Path, dest: Path) -> None:
+    import fcntl
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.remove(dest)
+            raise
+
+def place_file(src: Path, dest: Path, mode: str = LINK_MODE) -> str:
+    """Pone src en dest según mode. Devuelve el método usado."""
+    same_fs = src.stat().st_dev == dest.parent.stat().st_dev
+    if mode in ("auto", "reflink") and same_fs and os.name == "posix":
+        try:
+            _reflink(src, dest)
+            return "reflink"
+        except (OSError, ImportError):
+            if mode == "reflink":
+                logging.warning("Reflink no soportado para %s; se copia", src)
+    if mode in ("auto", "hardlink") and same_fs:
+        try:
+            os.link(src, dest)
+            return "hardlink"
+        except OSError:
+            if mode == "hardlink":
+                logging.warning("Hardlink no soportado para %s; se copia", src)
+    shutil.copy2(src, dest)
+    return "copy"
+
+def load_mapping(dst_dir: Path) -> dict:
+    """Filas del mapeo anterior (origen → fila) cuyo archivo canónico sigue en dst_dir."""
+    path = dst_dir / MAPPING_NAME
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return {row["origen"]: row for row in csv.DictReader(f, delimiter="\t")
+                if (dst_dir / row["canonico"]).exists()}
+
+def write_mapping(dst_dir: Path, rows) -> None:
+    path = dst_dir / MAPPING_NAME
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=["origen", "canonico", "sha256", "duplicado", "metodo"],
+                           delimiter="\t")
+        w.writeheader()
+        w.writerows(rows)
+    os.replace(tmp, path)
+
+def stale_hardlinks(dst_dir: Path, previo: dict, digest_by_src: dict) -> set:
+    """
+    Canónicos colocados por hardlink cuyo contenido ya no es el del sha256 guardado: el
+    origen se editó en su lugar y, al ser el mismo archivo, el canónico cambió con él.
+    El hash actual es el del origen (ya calculado); si no se tiene, se recalcula.
+    """
+    stale = set()
+    for row in previo.values():
+        if row["metodo"] != "hardlink":
+            continue
+        src, dest = Path(row["origen"]), dst_dir / row["canonico"]
+        try:
+            if not (src.exists() and os.path.samefile(src, dest)):
+                continue
+        except OSError:
+            continue
+        actual = digest_by_src.get(src) or _safe_hash(dest)
+        if actual != row["sha256"]:
+            logging.warning("Canónico modificado junto con su origen (hardlink): %s", dest)
+            stale.add(row["canonico"])
+    return stale
+
+def adopt_existing(dst_dir: Path) -> dict:
+    """
+    Para una carpeta armada por el copiador anterior (sin mapeo): sha256 -> archivo de los
+    CSV que ya están en dst_dir. De cada grupo de copias idénticas se queda el nombre más
+    corto (el que no lleva __N) y las demás se borran.
+    """
+    existentes = sorted(p for p in dst_dir.iterdir() if p.is_file() and p.suffix.lower() == ".csv")
+    if not existentes:
+        return {}
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as ex:
+        hashes = list(ex.map(_safe_hash, existentes))
+
+    grupos = {}
+    for p, digest in zip(existentes, hashes):
+        if digest is not None:
+            grupos.setdefault(digest, []).append(p)
+    canonical, borrados = {}, 0
+    for digest, paths in grupos.items():
+        paths.sort(key=lambda p: (len(p.name), p.name))
+        canonical[digest] = paths[0]
+        for p in paths[1:]:
+            try:
+                p.unlink()
+                borrados += 1
+                logging.info("Copia repetida eliminada: %s  =  %s", p.name, paths[0].name)
+            except OSError as e:
+                logging.error("No se pudo eliminar %s: %s", p, e)
+    logging.info("Sin %s: se adoptan %d CSV existentes (%d copias repetidas eliminadas)",
+                 MAPPING_NAME, len(canonical), borrados)
+    return canonical
+
+def remove_unreferenced(dst_dir: Path, previo: dict, rows) -> int:
+    """Borra los canónicos del mapeo anterior que ya no referencia ninguna fila."""
+    referenced = {row["canonico"] for row in rows}
+    removed = 0
+    for name in {row["canonico"] for row in previo.values()} - referenced:
+        try:
+            (dst_dir / name).unlink()
+            removed += 1
+            logging.info("Eliminado (ya no referenciado): %s", name)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error("No se pudo eliminar %s: %s", name, e)
+    return removed
+
+def _safe_hash(path: Path):
+    try:
+        return file_hash(str(path))
+    except Exception as e:
+        logging.error("No se pudo leer %s: %s", path, e)
+        return None
 
 def main():
     if not SRC_ROOT.exists():
@@ -41,16 +193,54 @@ def main():
     DST_DIR.mkdir(parents=True, exist_ok=True)
 
     # Recorre recursivamente todos los .csv (cualquier mayúscula/minúscula)
-    csv_files = [p for p in SRC_ROOT.rglob("*") if p.is_file() and p.suffix.lower() == ".csv"]
+    csv_files = sorted(p for p in SRC_ROOT.rglob("*") if p.is_file() and p.suffix.lower() == ".csv")
     if not csv_files:
         logging.warning("No se encontraron .csv dentro de: %s", SRC_ROOT)
         return
 
     logging.info("CSVs encontrados: %d", len(csv_files))
-    copiados = 0
 
-    for src in csv_files:
+    # Hash de contenido en paralelo (hashlib libera el GIL sobre bloques grandes)
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as ex:
+        hashes = list(ex.map(_safe_hash, csv_files))
+
+    previo = load_mapping(DST_DIR)
+    stale = stale_hardlinks(DST_DIR, previo, dict(zip(csv_files, hashes)))
+    canonical = {row["sha256"]: DST_DIR / row["canonico"]  # sha256 -> destino
+                 for row in previo.values() if row["canonico"] not in stale}
+    adoptados = set()  # archivos del copiador anterior que aún no tienen origen
+    if not (DST_DIR / MAPPING_NAME).exists():
+        canonical = adopt_existing(DST_DIR)
+        adoptados = {p.name for p in canonical.values()}
+    used = {n.lower() for n in os.listdir(DST_DIR)}
+    rows, copiados, duplicados, sin_cambios = [], 0, 0, 0
+
+    for src, digest in zip(csv_files, hashes):
+        prev = previo.get(str(src))
+        if digest is None:
+            if prev and prev["canonico"] not in stale:
+                rows.append(prev)  # error de lectura: se conserva lo anterior
+            continue
         try:
+            if prev and prev["sha256"] == digest and prev["canonico"] not in stale:
+                # Ya se procesó en una corrida anterior con el mismo contenido
+                sin_cambios += 1
+                rows.append(prev)
+                continue
+            if digest in canonical and canonical[digest].name in adoptados:
+                # Ya estaba en 'files' (copiador anterior): este origen pasa a ser el suyo
+                adoptados.discard(canonical[digest].name)
+                sin_cambios += 1
+                rows.append({"origen": str(src), "canonico": canonical[digest].name,
+                             "sha256": digest, "duplicado": 0, "metodo": "existente"})
+                continue
+            if digest in canonical:
+                duplicados += 1
+                rows.append({"origen": str(src), "canonico": canonical[digest].name,
+                             "sha256": digest, "duplicado": 1, "metodo": ""})
+                logging.info("Duplicado: %s  =  %s", src, canonical[digest])
+                continue
+
             # Subcarpeta "top-level" relativa a SRC_ROOT (para etiquetar el origen)
             rel = src.relative_to(SRC_ROOT)
             top = rel.parts[0] if len(rel.parts) > 1 else "root"
@@ -58,15 +248,25 @@ def main():
 
             # Construir nombre destino único
             stem, suffix = src.stem, src.suffix  # e.g., .csv
-            dest = unique_dest_path(DST_DIR, sanitize(stem), suffix, tag)
+            dest = unique_dest_path(DST_DIR, sanitize(stem), suffix, tag, used)
 
-            shutil.copy2(src, dest)  # si prefieres mover: shutil.move(src, dest)
+            metodo = place_file(src, dest)
+            canonical[digest] = dest
             copiados += 1
-            logging.info("Copiado: %s  →  %s", src, dest)
+            rows.append({"origen": str(src), "canonico": dest.name,
+                         "sha256": digest, "duplicado": 0, "metodo": metodo})
+            logging.info("Copiado (%s): %s  →  %s", metodo, src, dest)
         except Exception as e:
             logging.error("Error copiando %s: %s", src, e)
 
-    logging.info("Proceso terminado. Archivos copiados: %d. Destino: %s", copiados, DST_DIR)
+    if adoptados:
+        logging.warning("%d CSV de 'files' no coinciden con ningún origen (se dejan; revísalos): %s",
+                        len(adoptados), ", ".join(sorted(adoptados)[:5]))
+    # Antes de escribir el mapeo: fuera los canónicos de orígenes borrados o cambiados
+    eliminados = remove_unreferenced(DST_DIR, previo, rows)
+    write_mapping(DST_DIR, rows)
+    logging.info("Proceso terminado. Archivos copiados: %d, duplicados omitidos: %d, sin cambios: %d, "
+                 "eliminados: %d. Destino: %s", copiados, duplicados, sin_cambios, eliminados, DST_DIR)
 
 if __name__ == "__main__":
     main()
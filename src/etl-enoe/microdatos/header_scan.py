@@ -0,0 +1,140 @@
+# header_scan.py
+# -*- coding: utf-8 -*-
+"""
+Escáner rápido de headers CSV, compartido por headers.py y parquet.py (pasada 1).
+
+- Lee UNA vez los primeros KB del archivo (HEAD_BYTES; más solo si la primera línea
+  no cabe) y en esa misma pasada detecta:
+    * encoding: BOM (UTF-8/16/32), UTF-16 sin BOM por posición de los bytes nulos,
+      y si no, UTF-8 estricto → CP1252 → Latin-1
+    * delimitador: el candidato más frecuente en la línea de encabezado
+    * columnas: csv.reader sobre esa línea (mismos nombres que pandas: duplicados
+      con sufijo .1/.2 y vacíos como "Unnamed: i"); "raw" guarda los tokens tal cual
+      vienen (headers.py agrupa con esos)
+- Cache en el manifest de parquet.py (sección "headers", por ruta + tamaño + mtime/CRC):
+  ambos scripts reutilizan lo ya escaneado y no pueden discrepar en el encoding.
+- scan_headers escanea en paralelo (hilos; es E/S).
+"""
+
+import os, io, csv, codecs, zipfile, logging
+from concurrent.futures import ThreadPoolExecutor
+
+from zip_source import is_zip_member, open_source, split_member
+
+HEAD_BYTES = 64 * 1024
+MAX_HEAD_BYTES = 1024 * 1024      # tope si la primera línea es enorme
+DELIMITERS = [",", ";", "|", "\t"]
+SCAN_WORKERS = min(16, (os.cpu_count() or 2) * 2)
+
+def detect_encoding(head: bytes) -> str:
+    """Encoding a partir de los primeros bytes (BOM, nulos y decodificación estricta)."""
+    if head.startswith(codecs.BOM_UTF8): return "utf-8-sig"
+    if head.startswith(b"\xFF\xFE\x00\x00") or head.startswith(b"\x00\x00\xFE\xFF"): return "utf-32"
+    if head.startswith(b"\xFF\xFE") or head.startswith(b"\xFE\xFF"): return "utf-16"
+    sample = head[:4096]
+    if sample.count(b"\x00") > len(sample) // 8:
+        # Texto ASCII en UTF-16: el byte nulo va después (LE) o antes (BE) de cada carácter
+        odd = sample[1::2].count(b"\x00")
+        even = sample[0::2].count(b"\x00")
+        return "utf-16le" if odd >= even else "utf-16be"
+    for enc in ("utf-8", "cp1252"):
+        try:
+            # Un carácter multibyte puede quedar cortado al final del bloque
+            codecs.getincrementaldecoder(enc)("strict").decode(head, final=False)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+def sniff_delimiter_line(line: str) -> str:
+    """El delimitador candidato que más aparece en la línea (',' si ninguno)."""
+    counts = {d: line.count(d) for d in DELIMITERS}
+    best = max(counts, key=counts.get)
+    return best if counts[best] > 0 else ","
+
+def _pandas_names(row):
+    """Nombres como los deja pandas.read_csv: vacíos → 'Unnamed: i', duplicados → x.1, x.2."""
+    out, seen = [], {}
+    for i, name in enumerate(row):
+        name = name if name != "" else f"Unnamed: {i}"
+        base = name
+        while name in seen:
+            seen[base] += 1
+            name = f"{base}.{seen[base]}"
+        seen.setdefault(name, 0)
+        out.append(name)
+    return out
+
+class NoHeader(ValueError):
+    """Archivo vacío o con la primera línea sin nombres; guarda lo que se leyó."""
+
+    def __init__(self, path: str, raw, delimiter: str):
+        super().__init__(f"Sin encabezado: {path}")
+        self.raw, self.delimiter = raw, delimiter
+
+def scan_header(path: str) -> dict:
+    """
+    {"cols", "raw", "encoding", "delimiter"} leyendo solo el inicio del archivo.
+    Lanza NoHeader (un ValueError) si no hay encabezado.
+    """
+    with open_source(path) as f:
+        head = f.read(HEAD_BYTES)
+        # Si no hay salto de línea, seguir leyendo (hasta MAX_HEAD_BYTES)
+        while b"\n" not in head and len(head) < MAX_HEAD_BYTES:
+            more = f.read(HEAD_BYTES)
+            if not more:
+                break
+            head += more
+
+    enc = detect_encoding(head)
+    text = codecs.getincrementaldecoder(enc)("replace").decode(head, final=False)
+    text = text.lstrip("\ufeff")
+    line = text.splitlines()[0] if text else ""
+    delim = sniff_delimiter_line(line)
+    row = next(csv.reader(io.StringIO(text), delimiter=delim), [])
+    if not row or all(c.strip() == "" for c in row):
+        raise NoHeader(path, row, delim)
+    return {"cols": _pandas_names(row), "raw": row, "encoding": enc, "delimiter": delim}
+
+def _stat_key(path: str) -> dict:
+    """Lo que invalida la cache: tamaño + mtime (archivo) o tamaño + CRC (miembro ZIP)."""
+    if is_zip_member(path):
+        zip_path, member = split_member(path)
+        with zipfile.ZipFile(zip_path) as zf:
+            info = zf.getinfo(member)
+        return {"size": info.file_size, "crc": info.CRC}
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+def scan_headers(paths, manifest: dict = None, workers: int = SCAN_WORKERS) -> dict:
+    """
+    Escanea en paralelo. Devuelve {ruta: {"cols","raw","encoding","delimiter"} o {"error": msg}}
+    (sin encabezado: {"error", "raw", "delimiter"}). Si se da manifest, usa y actualiza
+    manifest["headers"] (cache por tamaño + mtime/CRC; las entradas sin "raw" se reescanean).
+    """
+    cache = manifest.setdefault("headers", {}) if manifest is not None else {}
+
+    def one(path):
+        try:
+            key = _stat_key(path)
+            prev = cache.get(path)
+            if prev and "raw" in prev and all(prev.get(k) == v for k, v in key.items()):
+                return path, prev, False
+            return path, dict(key, **scan_header(path)), True
+        except NoHeader as e:
+            return path, {"error": str(e), "raw": e.raw, "delimiter": e.delimiter}, False
+        except Exception as e:
+            return path, {"error": str(e)}, False
+
+    out, escaneados, errores = {}, 0, 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for path, res, fresh in ex.map(one, paths):
+            out[path] = res
+            if fresh:
+                cache[path] = res
+                escaneados += 1
+            elif "error" in res:
+                errores += 1
+    logging.info("Headers: %d escaneados, %d desde cache, %d sin encabezado o con error",
+                 escaneados, len(out) - escaneados - errores, errores)
+    return out
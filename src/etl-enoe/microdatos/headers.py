@@ -8,19 +8,24 @@ Agrupador de CSVs por headers (ENOE)
     * Grupos con el mismo header (cuántos y cuáles archivos)
     * CSVs con headers únicos (solo un archivo por header)
 - Opcional: guarda un resumen en CSV y un reporte en TXT.
+- Encoding/delimitador/columnas salen de header_scan.py (el mismo escáner que usa
+  parquet.py), en paralelo y con cache en el manifest de parquet_master.
 
-Requisitos: solo librerías estándar de Python.
+Requisitos: librerías estándar de Python + pandas (lo importa zip_source.py).
 """
 
 from pathlib import Path
 from collections import defaultdict
-import csv
-import io
 import logging
 import re
 
+from header_scan import scan_header, scan_headers, NoHeader
+from manifest import load_manifest, save_manifest
+
 # === RUTAS (ajústalas si cambian) ===
 CSV_DIR = Path(r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe\files")
+# Manifest compartido con parquet.py (None = sin cache)
+MANIFEST_PATH = Path(r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe\parquet_master\manifest.json")
 
 # === OPCIONES ===
 RECURSIVO = True                 # Si True, busca con rglob; si False, solo en el directorio inmediato
@@ -40,55 +45,25 @@ def _normalize_header_name(s: str) -> str:
     s = re.sub(r"\s+", " ", s)          # contrae espacios múltiples
     return s.lower()
 
-def _best_decode(b: bytes) -> str:
-    """Decodifica bytes a texto intentando utf-8-sig y latin-1 (fallback)."""
-    for enc in ("utf-8-sig", "utf-8", "latin-1"):
-        try:
-            return b.decode(enc)
-        except Exception:
-            continue
-    # Último recurso (no debería ocurrir):
-    return b.decode("utf-8", errors="replace")
-
-def _sniff_delimiter(sample_text: str, default=",") -> str:
-    """Intenta detectar el delimitador; si falla, devuelve default (',')."""
-    try:
-        dialect = csv.Sniffer().sniff(sample_text, delimiters=[",", ";", "|", "\t"])
-        return dialect.delimiter
-    except Exception:
-        return default
-
-def read_csv_header(path: Path):
+def read_csv_header(path: Path, scan: dict = None):
     """
     Devuelve (header_original:list[str], header_normalizado:tuple[str], delimiter:str)
-    Si el archivo está vacío o no hay filas, devuelve ([], (), delim).
+    `scan` es el resultado de header_scan (si ya se tiene); si no, se escanea aquí.
+    Se agrupa con los tokens crudos del encabezado ("raw"), no con los nombres que deja
+    pandas (col.1, Unnamed: i). Si el archivo está vacío o no tiene encabezado, devuelve
+    lo que haya en la primera línea (p.ej. ([], (), ',')) y el archivo se agrupa igual.
     """
-    # Leemos un bloque pequeño para olfatear (sniff) el delimitador
-    with open(path, "rb") as f:
-        chunk = f.read(64 * 1024)  # 64KB
-    text = _best_decode(chunk)
-
-    delim = _sniff_delimiter(text)
-    # Usamos solo la primera línea completa. Si el sniff no capturó salto, usamos el lector.
-    sio = io.StringIO(text)
-    reader = csv.reader(sio, delimiter=delim)
-    try:
-        row = next(reader, [])
-    except Exception:
-        row = []
-
-    # Si por alguna razón la primera línea salió vacía, intentamos abrir completo
-    if not row:
+    if scan is None:
         try:
-            with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
-                reader2 = csv.reader(f, delimiter=delim)
-                row = next(reader2, [])
-        except Exception:
-            row = []
+            scan = scan_header(str(path))
+        except NoHeader as e:
+            scan = {"error": str(e), "raw": e.raw, "delimiter": e.delimiter}
+    if "raw" not in scan:
+        raise ValueError(scan.get("error", f"Sin encabezado: {path}"))
 
-    header_original = [c.strip() for c in row]
+    header_original = [c.strip() for c in scan["raw"]]
     header_normalizado = tuple(_normalize_header_name(c) for c in header_original)
-    return header_original, header_normalizado, delim
+    return header_original, header_normalizado, scan.get("delimiter", ",")
 
 # ---------- Proceso principal ----------
 
@@ -110,9 +85,15 @@ def main():
     key_to_delimiter = {}          # key -> delimitador detectado
     errores = []
 
+    # Escaneo en paralelo (reutiliza lo que parquet.py ya escaneó)
+    manifest = load_manifest(str(MANIFEST_PATH)) if MANIFEST_PATH and MANIFEST_PATH.parent.exists() else None
+    scans = scan_headers([str(p) for p in sorted(csv_files)], manifest)
+    if manifest is not None:
+        save_manifest(manifest, str(MANIFEST_PATH))
+
     for p in sorted(csv_files):
         try:
-            hdr_orig, hdr_norm, delim = read_csv_header(p)
+            hdr_orig, hdr_norm, delim = read_csv_header(p, scans[str(p)])
             groups[hdr_norm].append(p)
             key_to_delimiter.setdefault(hdr_norm, delim)
             # Guardar un ejemplo legible del header original (la 1ª vez que vemos el grupo)
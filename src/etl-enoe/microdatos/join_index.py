@@ -0,0 +1,265 @@
+# join_index.py
+# -*- coding: utf-8 -*-
+"""
+Índice de llaves entre módulos ENOE (VIVT → HOGT → SDEMT → COE1T/COE2T).
+
+- Llave empaquetada en un int64 por nivel de la jerarquía:
+    vivienda = periodo, cd_a, ent, con, v_sel
+    hogar    = vivienda + n_hog, h_mud
+    persona  = hogar + n_ren
+  Los campos van en bits fijos (KEY_FIELDS, del más al menos significativo), así la
+  llave de un nivel superior es la del nivel inferior corrida a la derecha:
+  key_hog = key_per >> BITS[n_ren]. Ordenar por key_per ordena también por key_hog/key_viv.
+  periodo = (anio - 2000) * 4 + (trimestre - 1). Un valor nulo, no numérico o fuera de
+  rango deja la llave en nulo (se reporta).
+- Por periodo (en paralelo) cada módulo se copia a enoe_keyed/<mod>/anio=/trimestre=/
+  con las llaves de su nivel y de los superiores al frente, ORDENADO por la llave más fina
+  (sorting_columns en el Parquet): los joins pasan a ser merge-joins o búsquedas por llave
+  en lugar de joins de 7 columnas string.
+- enoe_keyed/_index/<mod>/: por llave del nivel del módulo, la primera fila y cuántas
+  filas tiene dentro del archivo ordenado del periodo (búsqueda directa).
+- Reporte de huérfanos por trimestre (reports/orphans_join_index.csv): hogares sin
+  vivienda, personas sin hogar, registros COE sin persona en SDEMT y llaves inválidas.
+- Incremental: solo se rehace un periodo si cambió alguno de sus CSV (manifest["join_index"]).
+"""
+
+import os, json, shutil, hashlib, logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from parquet_io import (PARTITION_COLS, ROW_GROUP_MAX, COMPRESSION, open_dataset,
+                        write_common_metadata)
+
+# (campo, bits) del más significativo al menos significativo: 61 bits en total
+KEY_FIELDS = [("periodo", 9), ("cd_a", 7), ("ent", 6), ("con", 17), ("v_sel", 7),
+              ("n_hog", 4), ("h_mud", 4), ("n_ren", 7)]
+BITS = dict(KEY_FIELDS)
+LEVELS = {"vivienda": 5, "hogar": 7, "persona": 8}   # cuántos campos de KEY_FIELDS usa
+KEY_COLS = {"vivienda": "key_viv", "hogar": "key_hog", "persona": "key_per"}
+MODULE_LEVEL = {"VIVT": "vivienda", "HOGT": "hogar", "SDEMT": "persona",
+                "COE1T": "persona", "COE2T": "persona"}
+# (hijo, padre, nivel al que se cruzan)
+PARENTS = [("HOGT", "VIVT", "vivienda"), ("SDEMT", "HOGT", "hogar"),
+           ("COE1T", "SDEMT", "persona"), ("COE2T", "SDEMT", "persona")]
+
+KEYED_DIR = "enoe_keyed"
+INDEX_DIR = "_index"
+ORPHANS_CSV = "orphans_join_index.csv"
+JOIN_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+assert sum(BITS.values()) <= 63
+
+def period_code(anio: int, tri: int) -> int:
+    return (anio - 2000) * 4 + (tri - 1)
+
+def level_fields(level: str):
+    return KEY_FIELDS[:LEVELS[level]]
+
+def ancestor_levels(level: str):
+    """Niveles que lleva un módulo de este nivel, del más grueso al suyo."""
+    return [lv for lv in LEVELS if LEVELS[lv] <= LEVELS[level]]
+
+def shift_to_level(key, from_level: str, to_level: str):
+    """Llave de un nivel inferior → llave del nivel superior (corrimiento a la derecha)."""
+    drop = sum(b for _, b in KEY_FIELDS[LEVELS[to_level]:LEVELS[from_level]])
+    return pc.shift_right(key, drop) if drop else key
+
+def code_column(tbl: pa.Table, name: str):
+    """Columna de identificación como int64 (acepta int, float entero, string o diccionario)."""
+    col = next((c for c in tbl.column_names if c.lower() == name), None)
+    if col is None:
+        return None
+    arr = tbl[col]
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.cast(arr.type.value_type)
+    if pa.types.is_integer(arr.type):
+        return pc.cast(arr, pa.int64())
+    if pa.types.is_floating(arr.type):
+        whole = pc.equal(pc.floor(arr), arr)
+        return pc.cast(pc.if_else(whole, arr, pa.scalar(None, arr.type)), pa.int64())
+    s = pc.utf8_trim_whitespace(pc.cast(arr, pa.string()))
+    s = pc.if_else(pc.match_substring_regex(s, r"^\d+$"), s, pa.scalar(None, pa.string()))
+    return pc.cast(s, pa.int64())
+
+def pack_key(tbl: pa.Table, level: str, periodo: int):
+    """Llave int64 del nivel para cada fila (nula si falta o no cabe algún campo)."""
+    fields = level_fields(level)
+    n = tbl.num_rows
+    key = pa.repeat(pa.scalar(0, pa.int64()), n)
+    shift = sum(b for _, b in fields)
+    for name, bits in fields:
+        shift -= bits
+        if name == "periodo":
+            v = pa.repeat(pa.scalar(periodo, pa.int64()), n)
+        else:
+            v = code_column(tbl, name)
+            if v is None:
+                return pa.nulls(n, pa.int64())
+        ok = pc.and_(pc.greater_equal(v, 0), pc.less(v, 1 << bits))
+        v = pc.if_else(ok, v, pa.scalar(None, pa.int64()))
+        key = pc.add(key, pc.shift_left(v, shift))
+    return key
+
+def period_fingerprint(manifest: dict, anio: int, tri: int) -> str:
+    """Hash de lo que determina el periodo: sus CSV (sha256) y columnas/tipos de cada módulo."""
+    files = sorted((fi.get("mod"), fi.get("sha256")) for fi in manifest["files"].values()
+                   if fi.get("mod") in MODULE_LEVEL
+                   and ((fi.get("anio"), fi.get("tri")) == (anio, tri) or fi.get("anio") is None))
+    mods = {m: [info.get("columns"), info.get("types"), info.get("meta")]
+            for m, info in manifest["modules"].items()}
+    blob = json.dumps([files, mods], sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+def module_dataset(info: dict) -> ds.Dataset:
+    if info.get("layout") == "partitioned":
+        return open_dataset(info["out_path"])
+    return ds.dataset(info["out_path"], format="parquet")
+
+def module_periods(dataset: ds.Dataset) -> set:
+    """Periodos (anio, trimestre) presentes; solo lee esas dos columnas."""
+    t = dataset.to_table(columns=PARTITION_COLS).group_by(PARTITION_COLS).aggregate([])
+    return {(a, q) for a, q in zip(t["anio"].to_pylist(), t["trimestre"].to_pylist())
+            if a is not None and q is not None}
+
+def partition_dir(root: str, anio: int, tri: int) -> str:
+    return os.path.join(root, f"anio={anio}", f"trimestre={tri}")
+
+def key_index(keys: np.ndarray) -> pa.Table:
+    """Llaves ya ordenadas (sin nulos) → (llave, primera fila, n filas)."""
+    if len(keys) == 0:
+        return pa.table({"key": pa.array([], pa.int64()), "fila": pa.array([], pa.int64()),
+                         "n": pa.array([], pa.int64())})
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+    counts = np.diff(np.concatenate([starts, [len(keys)]]))
+    return pa.table({"key": keys[starts], "fila": starts.astype("int64"), "n": counts.astype("int64")})
+
+def _write(tbl: pa.Table, path: str, sorting=None) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(tbl, tmp, compression=COMPRESSION, write_statistics=True,
+                   row_group_size=ROW_GROUP_MAX, sorting_columns=sorting)
+    os.replace(tmp, path)
+
+def key_module_period(tbl: pa.Table, mod: str, anio: int, tri: int):
+    """Agrega las llaves de los niveles del módulo y ordena por la más fina."""
+    level = MODULE_LEVEL[mod]
+    fine = pack_key(tbl, level, period_code(anio, tri))
+    cols = [KEY_COLS[lv] for lv in ancestor_levels(level)]
+    keys = [shift_to_level(fine, level, lv) for lv in ancestor_levels(level)]
+    rest = [c for c in tbl.column_names if c not in PARTITION_COLS and c not in cols]
+    keyed = pa.Table.from_arrays(keys + [tbl[c] for c in rest], names=cols + rest)
+    return keyed.sort_by([(KEY_COLS[level], "ascending")])  # nulos al final
+
+def build_period(datasets: dict, keyed_root: str, anio: int, tri: int) -> list:
+    """Escribe los módulos ordenados + índice del periodo y devuelve sus filas de reporte."""
+    flt = (ds.field("anio") == anio) & (ds.field("trimestre") == tri)
+    own_keys, parent_keys, rows = {}, {}, []
+    for mod, dataset in datasets.items():
+        level = MODULE_LEVEL[mod]
+        keyed = key_module_period(dataset.to_table(filter=flt), mod, anio, tri)
+        kcol = KEY_COLS[level]
+        _write(keyed, os.path.join(partition_dir(os.path.join(keyed_root, mod), anio, tri), "part-0.parquet"),
+               sorting=[pq.SortingColumn(keyed.column_names.index(kcol))])
+
+        valid = pc.drop_null(keyed[kcol]).to_numpy()
+        idx = key_index(valid)
+        _write(idx, os.path.join(partition_dir(os.path.join(keyed_root, INDEX_DIR, mod), anio, tri),
+                                 "index-0.parquet"))
+        own_keys[mod] = idx["key"]
+        invalid = keyed.num_rows - len(valid)
+        rows.append({"anio": anio, "trimestre": tri, "modulo": mod, "padre": None, "nivel": level,
+                     "registros": keyed.num_rows, "llave_invalida": invalid, "huerfanos": 0,
+                     "unidades_huerfanas": 0})
+        for child, parent, plevel in PARENTS:
+            if child == mod:
+                parent_keys[mod] = (parent, plevel, keyed[KEY_COLS[plevel]])
+        del keyed
+
+    for mod, (parent, plevel, pkeys) in parent_keys.items():
+        row = next(r for r in rows if r["modulo"] == mod)
+        row["padre"] = parent
+        if parent not in own_keys:
+            continue
+        parent_set = own_keys[parent] if MODULE_LEVEL[parent] == plevel else \
+            pc.unique(shift_to_level(own_keys[parent], MODULE_LEVEL[parent], plevel))
+        present = pc.drop_null(pkeys)
+        missing = pc.invert(pc.is_in(present, value_set=parent_set))
+        row["huerfanos"] = pc.sum(missing).as_py() or 0
+        row["unidades_huerfanas"] = len(pc.unique(pc.filter(present, missing)))
+    return rows
+
+def build_join_index(out_dir: str, manifest: dict, reports_dir: str,
+                     workers: int = JOIN_WORKERS, full_rebuild: bool = False):
+    """
+    Construye/actualiza enoe_keyed/ y el reporte de huérfanos a partir de los maestros
+    registrados en manifest["modules"]. Devuelve la ruta del reporte (o None).
+    """
+    mods = [m for m in MODULE_LEVEL if m in manifest["modules"]
+            and os.path.exists(manifest["modules"][m]["out_path"])]
+    if not mods:
+        logging.warning("Índice de llaves: no hay maestros construidos")
+        return None
+    datasets = {m: module_dataset(manifest["modules"][m]) for m in mods}
+    periods = sorted(set().union(*(module_periods(d) for d in datasets.values())))
+
+    keyed_root = os.path.join(out_dir, KEYED_DIR)
+    state = {} if full_rebuild else manifest.setdefault("join_index", {})
+    prints = {p: period_fingerprint(manifest, *p) for p in periods}
+    todo = [p for p in periods
+            if state.get(f"{p[0]}T{p[1]}", {}).get("fingerprint") != prints[p]]
+    logging.info("Índice de llaves: %d periodos a construir, %d sin cambios",
+                 len(todo), len(periods) - len(todo))
+
+    # Periodos que ya no existen
+    for label in [k for k in state if tuple(map(int, k.split("T"))) not in prints]:
+        a, t = map(int, label.split("T"))
+        for root in [os.path.join(keyed_root, m) for m in MODULE_LEVEL] + \
+                    [os.path.join(keyed_root, INDEX_DIR, m) for m in MODULE_LEVEL]:
+            shutil.rmtree(partition_dir(root, a, t), ignore_errors=True)
+        del state[label]
+
+    def one(p):
+        return p, build_period(datasets, keyed_root, *p)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for (a, t), rows in ex.map(one, todo):
+            state[f"{a}T{t}"] = {"fingerprint": prints[(a, t)], "report": rows}
+            logging.info("Índice de llaves %dT%d: %s", a, t,
+                         ", ".join(f"{r['modulo']}={r['registros']:,}" for r in rows))
+
+    # Esquema común de cada módulo con llaves (periodos viejos pueden no traer columnas nuevas)
+    for m in mods:
+        level = MODULE_LEVEL[m]
+        base = datasets[m].schema
+        kcols = [KEY_COLS[lv] for lv in ancestor_levels(level)]
+        schema = pa.schema([pa.field(c, pa.int64()) for c in kcols] +
+                           [f for f in base if f.name not in kcols])
+        if os.path.isdir(os.path.join(keyed_root, m)):
+            write_common_metadata(os.path.join(keyed_root, m), schema)
+    manifest["join_index"] = state
+
+    report = pd.DataFrame([r for label in sorted(state) for r in state[label]["report"]])
+    if report.empty:
+        return None
+    report["pct_huerfanos"] = (100 * report["huerfanos"] / report["registros"].where(report["registros"] > 0)).round(3)
+    out_csv = os.path.join(reports_dir, ORPHANS_CSV)
+    report.to_csv(out_csv, index=False, encoding="utf-8")
+    bad = report[(report["huerfanos"] > 0) | (report["llave_invalida"] > 0)]
+    for r in bad.itertuples():
+        logging.warning("%dT%d %s: %s huérfanos de %s, %s llaves inválidas", r.anio, r.trimestre,
+                        r.modulo, f"{r.huerfanos:,}", r.padre, f"{r.llave_invalida:,}")
+    return out_csv
+
+def open_keyed(out_dir: str, mod: str) -> ds.Dataset:
+    """Dataset ordenado por llave de un módulo (filtrable por anio/trimestre)."""
+    return open_dataset(os.path.join(out_dir, KEYED_DIR, mod))
+
+def open_key_index(out_dir: str, mod: str) -> ds.Dataset:
+    """Índice (key, fila, n) del módulo, por periodo."""
+    return open_dataset(os.path.join(out_dir, KEYED_DIR, INDEX_DIR, mod))
@@ -6,17 +6,19 @@ Etiqueta ENT (Entidad) y MUN (Municipio) en Parquet ENOE/ENOEN usando catálogo
 - VIVT / HOGT / SDEMT: agrega ent_nombre y mun_nombre
 - COE1T / COE2T: agrega solo ent_nombre (no traen MUN)
 - No borra columnas originales salvo que lo configures
+- Acepta el archivo único (enoe_master_<mod>.parquet) o el dataset particionado
+  (enoe_master_<mod>/anio=/trimestre=); la salida conserva el mismo layout
 
 Requisitos:
   conda install -c conda-forge dask pyarrow pandas
 """
 
-import os, io, csv, logging
+import os, csv, shutil, logging
 import pandas as pd
 import dask.dataframe as dd
-from dask import delayed, compute
-import pyarrow as pa
-import pyarrow.parquet as pq
+
+from parquet_io import (is_dataset_dir, dataset_schema, PARTITIONING,
+                        write_partitioned_from_parts, write_single_parquet_from_ddf)
 
 # =================== CONFIG ===================
 BASE_DIR = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe"
@@ -103,47 +105,34 @@ def find_col_case_insensitive(cols, target):
     return None
 
 
-def write_single_parquet_from_ddf(ddf: dd.DataFrame, out_path: str):
-    """
-    Escribe un único archivo Parquet agregando particiones de Dask.
-    Evita consumir mucha RAM.
-    """
-    parts = ddf.to_delayed()
-    if not parts:
-        raise RuntimeError("No hay particiones que escribir.")
-
-    # primera partición para fijar esquema
-    first_df = compute(parts[0])[0]
-    table = pa.Table.from_pandas(first_df, preserve_index=False)
-    writer = pq.ParquetWriter(out_path, table.schema, compression="snappy")
-
-    writer.write_table(table)
-    for p in parts[1:]:
-        pdf = compute(p)[0]
-        tbl = pa.Table.from_pandas(pdf, preserve_index=False)
-        if tbl.schema != writer.schema:
-            # Alinear por seguridad (no debería ocurrir)
-            cols_writer = [f.name for f in writer.schema]
-            for c in cols_writer:
-                if c not in pdf.columns:
-                    pdf[c] = pd.NA
-            pdf = pdf[cols_writer]
-            tbl = pa.Table.from_pandas(pdf, preserve_index=False)
-        writer.write_table(tbl)
-
-    writer.close()
+def resolve_input(path: str):
+    """Devuelve la ruta existente: el archivo .parquet o, si no, el dataset particionado."""
+    if os.path.isfile(path):
+        return path
+    dataset_dir = path[:-len(".parquet")] if path.endswith(".parquet") else path
+    if is_dataset_dir(dataset_dir):
+        return dataset_dir
+    return None
 
 
 def label_one_parquet(parquet_path: str, ent_df: pd.DataFrame, muni_df: pd.DataFrame):
     """
-    Etiqueta ENT (siempre) y MUN (si existe) en un Parquet.
+    Etiqueta ENT (siempre) y MUN (si existe) en un Parquet (archivo o dataset particionado).
     Crea nuevas columnas: ent_nombre, mun_nombre.
     """
-    fname = os.path.basename(parquet_path)
-    out_path = os.path.join(OUT_DIR, fname.replace(".parquet", "_labeled.parquet"))
+    partitioned = is_dataset_dir(parquet_path)
+    fname = os.path.basename(parquet_path.rstrip("/\\"))
+    if partitioned:
+        out_path = os.path.join(OUT_DIR, fname + "_labeled")
+    else:
+        out_path = os.path.join(OUT_DIR, fname.replace(".parquet", "_labeled.parquet"))
 
     logging.info("Leyendo: %s", parquet_path)
-    ddf = dd.read_parquet(parquet_path, engine="pyarrow")
+    if partitioned:
+        ddf = dd.read_parquet(parquet_path, engine="pyarrow",
+                              dataset={"schema": dataset_schema(parquet_path), "partitioning": PARTITIONING})
+    else:
+        ddf = dd.read_parquet(parquet_path, engine="pyarrow")
 
     # ----- ENT -----
     ent_col = find_col_case_insensitive(ddf.columns, "ent")
@@ -195,14 +184,39 @@ def label_one_parquet(parquet_path: str, ent_df: pd.DataFrame, muni_df: pd.DataF
         if todrop:
             ddf = ddf.drop(columns=todrop)
 
+    if partitioned:
+        # ----- escribir dataset particionado (se arma en tmp y luego se reemplaza) -----
+        logging.info("Escribiendo dataset: %s", out_path)
+        tmp_dir = out_path + ".tmp"
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        parts = ddf.to_delayed()
+        rows, _ = write_partitioned_from_parts(parts, tmp_dir, [f"part-{i:05d}" for i in range(len(parts))])
+        if os.path.isdir(out_path):
+            shutil.rmtree(out_path)
+        os.replace(tmp_dir, out_path)
+        logging.info("Listo %s | Filas=%s", out_path, f"{sum(rows):,}")
+        return
+
     # ----- escribir un único parquet -----
     logging.info("Escribiendo: %s", out_path)
-    write_single_parquet_from_ddf(ddf, out_path)
-    # pequeño resumen
-    nrows = ddf.shape[0].compute()
+    # particiones en paralelo (ventana acotada); las filas se cuentan al escribir
+    nrows = write_single_parquet_from_ddf(ddf, out_path)
     logging.info("Listo %s | Filas=%s", out_path, f"{nrows:,}")
 
 
+def resumen_etiquetas(labeled_path: str):
+    """Revisión rápida de un Parquet etiquetado: filas sin nombre y top 10 por conteo."""
+    ddf = dd.read_parquet(labeled_path)
+    for col in ("ent_nombre", "mun_nombre"):
+        if col not in ddf.columns:
+            continue
+        # ¿Cuántas filas quedaron sin nombre?
+        print(ddf[col].isna().sum().compute())
+        # Top 10 por conteo
+        print(ddf[col].value_counts().head(10))
+
+
 # =================== MAIN ===================
 if __name__ == "__main__":
     # 1) catálogo de ENT/MUN
@@ -210,25 +224,15 @@ if __name__ == "__main__":
 
     # 2) aplicar a cada parquet
     for p in PARQUETS_IN:
-        if os.path.exists(p):
-            label_one_parquet(p, ent_df, muni_df)
+        src = resolve_input(p)
+        if src:
+            label_one_parquet(src, ent_df, muni_df)
         else:
             logging.warning("No existe el Parquet: %s (saltando)", p)
 
     logging.info("¡Terminado! Revisa: %s", OUT_DIR)
 
-import dask.dataframe as dd
-
-
-p = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe\parquet_master_labeled\enoe_master_sdemt_labeled.parquet"
-ddf = dd.read_parquet(p)
-
-# ¿Cuántas filas quedaron sin nombre de entidad?
-print(ddf["ent_nombre"].isna().sum().compute())
-
-# Top 10 entidades por conteo
-print(ddf["ent_nombre"].value_counts().head(10))
+    sdemt = os.path.join(OUT_DIR, "enoe_master_sdemt_labeled.parquet")
+    if os.path.exists(sdemt):
+        resumen_etiquetas(sdemt)
 
-# Para municipios (en VIVT/HOGT/SDEMT)
-print(ddf["mun_nombre"].isna().sum().compute())
-print(ddf["mun_nombre"].value_counts().head(10))
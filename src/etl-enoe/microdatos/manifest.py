@@ -0,0 +1,77 @@
+# manifest.py
+# -*- coding: utf-8 -*-
+"""
+Manifest persistente de los CSV de entrada ENOE y de los Parquet maestro.
+
+- Por archivo: ruta, tamaño, mtime, hash de contenido (sha256), encoding y
+  delimitador detectados, módulo, año/trimestre, columnas y filas escritas.
+- Por módulo: columnas del Parquet maestro y en qué row groups quedó cada archivo,
+  para poder copiar tal cual lo que no cambió y decodificar solo lo nuevo.
+- "headers": cache del escáner de encabezados (header_scan.py), compartida con headers.py.
+- "join_index": huella y reporte de huérfanos por periodo del índice de llaves (join_index.py).
+- Se guarda como JSON con escritura atómica (tmp + os.replace).
+"""
+
+import os, json, hashlib, logging
+
+MANIFEST_VERSION = 1
+HASH_CHUNK = 1024 * 1024
+
+def empty_manifest() -> dict:
+    return {"version": MANIFEST_VERSION, "files": {}, "modules": {}, "headers": {}, "join_index": {}}
+
+def load_manifest(path: str) -> dict:
+    """Carga el manifest; si no existe o es de otra versión, devuelve uno vacío."""
+    if not os.path.exists(path):
+        return empty_manifest()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        logging.warning("Manifest ilegible (%s): %s. Se reconstruye desde cero.", path, e)
+        return empty_manifest()
+    if data.get("version") != MANIFEST_VERSION:
+        logging.warning("Manifest con versión distinta en %s. Se reconstruye desde cero.", path)
+        return empty_manifest()
+    data.setdefault("files", {})
+    data.setdefault("modules", {})
+    data.setdefault("headers", {})
+    data.setdefault("join_index", {})
+    return data
+
+def save_manifest(manifest: dict, path: str) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+def stream_hash(f) -> str:
+    """sha256 de un archivo binario ya abierto, leyendo por bloques."""
+    h = hashlib.sha256()
+    for block in iter(lambda: f.read(HASH_CHUNK), b""):
+        h.update(block)
+    return h.hexdigest()
+
+def file_hash(path: str) -> str:
+    """sha256 del contenido, leyendo por bloques (no carga el archivo completo)."""
+    with open(path, "rb") as f:
+        return stream_hash(f)
+
+def file_status(path: str, prev: dict | None):
+    """
+    Compara el archivo en disco contra su entrada previa del manifest.
+    Devuelve (status, stat_dict) con status ∈ {"new", "changed", "unchanged"}.
+    Solo se recalcula el hash si cambió tamaño o mtime.
+    """
+    st = os.stat(path)
+    stat = {"size": st.st_size, "mtime": st.st_mtime_ns}
+    if prev is None:
+        stat["sha256"] = file_hash(path)
+        return "new", stat
+    if prev.get("size") == stat["size"] and prev.get("mtime") == stat["mtime"]:
+        stat["sha256"] = prev.get("sha256")
+        return "unchanged", stat
+    stat["sha256"] = file_hash(path)
+    if prev.get("size") == stat["size"] and prev.get("sha256") == stat["sha256"]:
+        return "unchanged", stat  # solo lo "tocaron"
+    return "changed", stat
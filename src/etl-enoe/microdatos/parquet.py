@@ -3,29 +3,92 @@
 """
 ENOE/ENOEN → 5 Parquets maestro por módulo (SIN renombrar columnas)
 - Unión de columnas por módulo (VIVT, HOGT, SDEMT, COE1T, COE2T)
-- Metadatos: anio (Int64), trimestre (Int64), anio_trimestre (string)
+- Metadatos: anio (Int64), trimestre (Int64), anio_trimestre (diccionario/categórico)
 - Detección robusta de encoding (UTF-16/LE/BE, UTF-8, CP1252, Latin-1) y delimitador
-- Carga en paralelo con Dask (delayed) y escritura en UN SOLO archivo Parquet por módulo
+- Lectura por lotes en streaming (csv_stream.py): memoria acotada y reporte de los
+  tramos de bytes que hubo que decodificar con otro encoding
+- Carga en paralelo con Dask (delayed), con ventana acotada de piezas en memoria
+  (parquet_io.IN_FLIGHT), y escritura en UN SOLO archivo Parquet por módulo
+- Reconstrucción incremental guiada por manifest (manifest.json en OUT_DIR):
+  solo se decodifican los CSV nuevos o modificados; lo demás se copia por row groups
+  desde el maestro anterior (alineado a la unión de columnas, si creció)
+- OUTPUT_LAYOUT="partitioned": dataset hive anio=/trimestre= por módulo
+  (enoe_master_<mod>/) en lugar del archivo único; en modo incremental solo se
+  reescriben los archivos de los CSV nuevos/modificados.
+  `python parquet.py compact` fusiona archivos pequeños dentro de cada partición.
+- Tipos inferidos por columna (schema_infer.py) en lugar de todo string: en pasada 1 se
+  muestrea cada CSV y se elige el tipo más angosto que no pierde información
+  (int8/16/32/64, float32, diccionario o string). Si los archivos de un módulo no
+  coinciden, esa columna queda como string. El esquema queda en schema_<mod>.json.
+- CSV_ENGINE="arrow": los CSV se leen con pyarrow.csv (bloques decodificados y convertidos
+  en varios hilos) y los metadatos/alineación al esquema del módulo se hacen en Arrow,
+  sin pasar por pandas. "pandas" (por defecto) conserva el lector anterior.
+- Tras construir los maestros, join_index.py agrega llaves int64 por nivel (vivienda,
+  hogar, persona), deja cada módulo ordenado por llave en enoe_keyed/ con su índice y
+  escribe el reporte de huérfanos por trimestre (BUILD_JOIN_INDEX; `python parquet.py index`).
+- INPUT_MODE="zip": lee los CSV directo desde los ZIP de 'comprimidos' (zip_source.py),
+  sin las copias intermedias en 'descompressed' y 'files'. La protección zip slip y la
+  procedencia __<subcarpeta> se conservan (esta última como metadato "origen").
 """
 
-import os, re, io, csv, glob, logging
+import os, re, io, csv, glob, shutil, logging, argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-import dask.dataframe as dd
-from dask import delayed, compute
+from dask import delayed
 
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 
+from manifest import load_manifest, save_manifest, file_status
+from header_scan import scan_headers, SCAN_WORKERS
+from csv_stream import CsvBatchReader, ArrowCsvBatchReader
+from zip_source import (list_zip_csvs, is_zip_member, member_status, source_name,
+                        source_origin, open_source, read_csv_source)
+from parquet_io import (write_single_parquet_from_parts, write_partitioned_from_parts,
+                        write_common_metadata, remove_dataset_files, recast_dataset_files,
+                        compact_dataset)
+from join_index import build_join_index
+from schema_infer import (SAMPLE_ROWS, TypeConflict, infer_table_types, module_types,
+                          module_schema, cast_column, save_schema_sidecar, schema_sidecar_path,
+                          meta_signature,
+                          ARROW_TYPES, META_TYPES)
+
 # ========= RUTAS =========
 BASE_DIR  = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\microdatos-enoe"
 FILES_DIR = os.path.join(BASE_DIR, "files")
+ZIPS_DIR  = os.path.join(BASE_DIR, "comprimidos")
 OUT_DIR   = os.path.join(BASE_DIR, "parquet_master")
 REPORTS_DIR = os.path.join(OUT_DIR, "reports")
+MANIFEST_PATH = os.path.join(OUT_DIR, "manifest.json")
 os.makedirs(OUT_DIR, exist_ok=True)
 os.makedirs(REPORTS_DIR, exist_ok=True)
 
+# True = ignora el manifest y reconstruye todos los maestros desde los CSV
+FULL_REBUILD = False
+
+# "files" = CSV ya extraídos y aplanados en FILES_DIR (descompresor.py + files.py)
+# "zip"   = CSV leídos en streaming desde los ZIP de ZIPS_DIR (sin copias en disco)
+INPUT_MODE = "files"
+
+# "single" = un archivo enoe_master_<mod>.parquet
+# "partitioned" = dataset hive enoe_master_<mod>/anio=AAAA/trimestre=T/
+OUTPUT_LAYOUT = "single"
+
+# "pandas" = pandas.read_csv por lotes (csv_stream.CsvBatchReader)
+# "arrow"  = pyarrow.csv en streaming (csv_stream.ArrowCsvBatchReader), sin pandas
+CSV_ENGINE = "pandas"
+
+# True = tras los maestros, construye enoe_keyed/ (llaves por nivel + reporte de huérfanos)
+BUILD_JOIN_INDEX = True
+
 MODULES = ["VIVT", "HOGT", "SDEMT", "COE1T", "COE2T"]
 
+# Tope de reintentos por choques de tipos en un módulo (cada uno ensancha una columna y
+# solo decodifica los CSV que faltaban; lo ya escrito se recastea)
+MAX_TYPE_RETRIES = 50
+
 logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
 
 # ========= UTILIDADES =========
@@ -44,39 +107,91 @@ def find_col_ci(df: pd.DataFrame, target: str):
             return c
     return None
 
+def per_to_int(per: pd.Series) -> pd.Series:
+    """
+    PER como entero (Int64). Solo los valores que no son números limpios pasan por regex.
+    Un PER con decimales (p.ej. 123.5) no es un periodo: queda NA ("123.0" sí vale).
+    """
+    num = pd.to_numeric(per, errors="coerce")
+    dirty = num.isna() & per.notna()
+    if dirty.any():
+        num[dirty] = pd.to_numeric(per[dirty].astype(str).str.replace(r"\D", "", regex=True), errors="coerce")
+    num = num.where(num % 1 == 0)
+    return num.astype("Int64")
+
 def derive_year_trim_from_per(df: pd.DataFrame):
-    """Si no vienen en el nombre, intentar PER (dígito1=trimestre, dígitos2-3=año-2000)."""
+    """
+    Si no vienen en el nombre, intentar PER (TAA: dígito1=trimestre, dígitos2-3=año-2000).
+    Aritmética entera sobre la columna: trimestre = PER // 100, año = 2000 + PER % 100.
+    """
     per_col = find_col_ci(df, "per")
     if per_col is None:
-        n = len(df)
-        return pd.Series([pd.NA]*n), pd.Series([pd.NA]*n)
-    per = df[per_col].astype(str).str.replace(r"\D", "", regex=True).str.zfill(3)
-    tri = pd.to_numeric(per.str[0], errors="coerce")
-    yy  = pd.to_numeric(per.str[1:3], errors="coerce")
-    anio = 2000 + yy
-    return anio, tri
+        na = pd.array([pd.NA] * len(df), dtype="Int64")
+        return pd.Series(na), pd.Series(na)
+    per = per_to_int(df[per_col]).reset_index(drop=True)
+    return 2000 + per % 100, per // 100
+
+def period_labels(anio: pd.Series, tri: pd.Series) -> pd.Categorical:
+    """anio_trimestre categórico: las etiquetas 'AAAATn' se arman solo para los periodos distintos."""
+    codes, keys = pd.factorize(anio * 10 + tri, use_na_sentinel=True)
+    cats = pd.Index([f"{k // 10}T{k % 10}" for k in keys], dtype="string")
+    return pd.Categorical.from_codes(codes, categories=cats)
 
 def add_meta_cols(df: pd.DataFrame, anio_from_name, tri_from_name):
-    """Inserta meta y devuelve con dtypes CANÓNICOS: anio/trimestre=Int64, anio_trimestre=string."""
+    """
+    Inserta meta con dtypes CANÓNICOS: anio/trimestre=Int64, anio_trimestre=category.
+    Si el periodo viene del nombre, las tres columnas son constantes (difusión, sin listas).
+    """
+    n = len(df)
     if anio_from_name is None or tri_from_name is None:
         anio_ser, tri_ser = derive_year_trim_from_per(df)
+        at = period_labels(anio_ser, tri_ser)
+        anio_arr, tri_arr = anio_ser.array, tri_ser.array
     else:
-        anio_ser = pd.Series([anio_from_name]*len(df))
-        tri_ser  = pd.Series([tri_from_name]*len(df))
-
-    df.insert(0, "anio", pd.to_numeric(anio_ser, errors="coerce").astype("Int64"))
-    df.insert(1, "trimestre", pd.to_numeric(tri_ser, errors="coerce").astype("Int64"))
+        anio_arr = pd.array(np.full(n, anio_from_name, dtype="int64"), dtype="Int64")
+        tri_arr = pd.array(np.full(n, tri_from_name, dtype="int64"), dtype="Int64")
+        at = pd.Categorical.from_codes(np.zeros(n, dtype="int8"),
+                                       categories=pd.Index([f"{anio_from_name}T{tri_from_name}"], dtype="string"))
+
+    df.insert(0, "anio", anio_arr)
+    df.insert(1, "trimestre", tri_arr)
+    df.insert(2, "anio_trimestre", at)
+    return df
 
+def arrow_per_to_int(per) -> pa.Array:
+    """per_to_int en Arrow: cast directo y, si algún valor no es número limpio, regex."""
+    per = pc.utf8_trim_whitespace(pc.cast(per, pa.string()))
     try:
-        str_dtype = pd.StringDtype()
-    except Exception:
-        str_dtype = "object"
-    df.insert(
-        2,
-        "anio_trimestre",
-        (df["anio"].astype("string") + "T" + df["trimestre"].astype("string")).astype(str_dtype)
-    )
-    return df
+        return pc.cast(per, pa.int64())
+    except pa.ArrowInvalid:
+        digits = pc.replace_substring_regex(per, r"\D", "")
+        digits = pc.if_else(pc.equal(digits, ""), pa.scalar(None, pa.string()), digits)
+        return pc.cast(digits, pa.int64())
+
+def arrow_meta_cols(tbl: pa.Table, anio_from_name, tri_from_name):
+    """
+    add_meta_cols en Arrow: (anio, trimestre, anio_trimestre) como int64/int64/diccionario
+    con las mismas reglas (nombre del archivo o, si no, aritmética entera sobre PER).
+    """
+    n = tbl.num_rows
+    if anio_from_name is not None and tri_from_name is not None:
+        anio = pa.repeat(pa.scalar(anio_from_name, pa.int64()), n)
+        tri = pa.repeat(pa.scalar(tri_from_name, pa.int64()), n)
+        at = pa.DictionaryArray.from_arrays(pa.repeat(pa.scalar(0, pa.int32()), n),
+                                            pa.array([f"{anio_from_name}T{tri_from_name}"]))
+        return anio, tri, at
+
+    per_col = next((c for c in tbl.column_names if c.lower() == "per"), None)
+    if per_col is None:
+        anio = tri = pa.nulls(n, pa.int64())
+        return anio, tri, pa.nulls(n, META_TYPES["anio_trimestre"])
+    per = arrow_per_to_int(tbl[per_col].combine_chunks())
+    tri = pc.divide(per, 100)
+    anio = pc.add(pc.subtract(per, pc.multiply(tri, 100)), 2000)
+    # Etiquetas solo para los periodos distintos; las filas guardan el índice
+    enc = pc.dictionary_encode(pc.add(pc.multiply(anio, 10), tri))
+    labels = pa.array([f"{k // 10}T{k % 10}" for k in enc.dictionary.to_pylist()], pa.string())
+    return anio, tri, pa.DictionaryArray.from_arrays(enc.indices, labels)
 
 def detect_module_from_filename(fname: str):
     up = fname.upper()
@@ -89,7 +204,7 @@ def detect_module_from_filename(fname: str):
 
 # --- Detección de encoding por BOM + heurística ---
 def sniff_encoding(path: str):
-    with open(path, "rb") as f:
+    with open_source(path) as f:
         head = f.read(4096)
     if head.startswith(b"\xEF\xBB\xBF"): return "utf-8-sig"
     if head.startswith(b"\xFF\xFE\x00\x00"): return "utf-32le"
@@ -112,12 +227,13 @@ def sniff_delimiter(text_sample: str):
 
 def headers_only(path: str):
     """
+    Respaldo del escáner rápido (header_scan.scan_header), solo si éste falla.
     Devuelve: (cols:list[str], encoding:str, delimiter:str)
     Lee un bloque pequeño y prueba varios encodings hasta conseguir headers válidos.
     """
     enc0 = sniff_encoding(path)
     encodings_try = [e for e in [enc0, "utf-8", "utf-8-sig", "cp1252", "latin-1", "utf-16", "utf-16le", "utf-16be"] if e]
-    with open(path, "rb") as f:
+    with open_source(path) as f:
         sample = f.read(128 * 1024)
 
     for enc in encodings_try:
@@ -135,7 +251,7 @@ def headers_only(path: str):
             pass
         # intentar nrows=0 sobre archivo real
         try:
-            df0 = pd.read_csv(path, sep=delim, nrows=0, dtype=str, engine="python", encoding=enc)
+            df0 = read_csv_source(path, sep=delim, nrows=0, dtype=str, engine="python", encoding=enc)
             if len(df0.columns) > 0:
                 return list(df0.columns), enc, delim
         except Exception:
@@ -145,7 +261,7 @@ def headers_only(path: str):
     for enc in encodings_try:
         for delim in [",",";","|","\t"]:
             try:
-                df0 = pd.read_csv(path, sep=delim, nrows=0, dtype=str, engine="python", encoding=enc)
+                df0 = read_csv_source(path, sep=delim, nrows=0, dtype=str, engine="python", encoding=enc)
                 if len(df0.columns) > 0:
                     return list(df0.columns), enc, delim
             except Exception:
@@ -153,164 +269,418 @@ def headers_only(path: str):
 
     raise UnicodeDecodeError("failed", b"", 0, 1, "No se pudo decodificar con encodings probados")
 
-# --- Lector completo robusto (por archivo) para usar con delayed ---
+# --- Lector robusto por lotes (csv_stream.py): memoria acotada, sin copias completas ---
 def read_full_csv_robust(path: str, enc: str, delim: str) -> pd.DataFrame:
-    # 1) engine='c' rápido
-    try:
-        return pd.read_csv(path, sep=delim, dtype=str, engine="c", encoding=enc, low_memory=False)
-    except Exception:
-        pass
-    # 2) engine='python' (sin low_memory)
+    """
+    Archivo completo como DataFrame (todo string). Decodifica en streaming y solo cambia
+    de encoding en los bytes que fallan (ver csv_stream). Para no materializar el
+    archivo completo en pandas, load_one usa CsvBatchReader directamente.
+    """
+    batches = list(CsvBatchReader(path, enc, delim))
+    if not batches:
+        return pd.DataFrame()
+    return pd.concat(batches, ignore_index=True)
+
+def sample_types(path: str, enc: str, delim: str) -> dict:
+    """Tipos inferidos sobre las primeras SAMPLE_ROWS filas del CSV ({} si no se puede leer)."""
     try:
-        return pd.read_csv(path, sep=delim, dtype=str, engine="python", encoding=enc)
-    except UnicodeDecodeError:
-        # 3) re-try con encodings alternos
-        for enc2 in ["utf-8-sig","utf-16","utf-16le","utf-16be","cp1252","latin-1"]:
-            try:
-                return pd.read_csv(path, sep=delim, dtype=str, engine="python", encoding=enc2)
-            except Exception:
-                continue
-        # 4) lectura manual → reemplaza caracteres ilegales
-        with open(path, "rb") as f:
-            data = f.read()
-        text = data.decode("latin-1", errors="replace")
-        return pd.read_csv(io.StringIO(text), sep=delim, dtype=str, engine="python")
-    except Exception:
-        # fallback general
-        with open(path, "rb") as f:
-            data = f.read()
-        text = data.decode("latin-1", errors="replace")
-        return pd.read_csv(io.StringIO(text), sep=delim, dtype=str, engine="python")
+        df = read_csv_source(path, sep=delim, dtype=str, encoding=enc, nrows=SAMPLE_ROWS,
+                         engine="c", encoding_errors="replace")
+    except Exception as e:
+        logging.warning("No se pudo muestrear %s para inferir tipos: %s", os.path.basename(path), e)
+        return {}
+    return infer_table_types(pa.Table.from_pandas(df, preserve_index=False))
 
 # ========= PASADA 1: headers + meta por archivo =========
-def pass1(csv_paths):
+def pass1(csv_paths, manifest):
+    """
+    Devuelve info por archivo (entradas del manifest + "status"), unión de columnas
+    y archivos por módulo. Los headers (y la muestra para inferir tipos) solo se vuelven
+    a leer si el archivo es nuevo o cambió su contenido (tamaño/mtime y, si hace falta, hash).
+    Headers y muestras se leen en paralelo; los headers con el escáner compartido
+    (header_scan.py, cache en manifest["headers"]) y headers_only solo como respaldo.
+    """
     info = []  # lista de dicts por archivo
     module_to_union = {m: set() for m in MODULES}
     module_to_files = {m: [] for m in MODULES}
+    prev_files = {} if FULL_REBUILD else manifest["files"]
+    counts = {"new": 0, "changed": 0, "unchanged": 0}
 
     logging.info("Escaneando headers (pasada 1)")
+    # 1) Estado de cada archivo contra el manifest
+    pending = []
     for path in csv_paths:
-        fname = os.path.basename(path)
+        fname = source_name(path)
         mod = detect_module_from_filename(fname)
         if mod is None:
             logging.warning("No se infiere módulo para: %s (omitido)", fname)
             continue
         try:
-            cols, enc, delim = headers_only(path)
-            anio, tri = parse_year_trim_from_name(fname)
-            info.append({"path": path, "mod": mod, "anio": anio, "tri": tri,
-                         "encoding": enc, "delimiter": delim, "cols": cols})
-            module_to_union[mod] |= set(cols)
-            module_to_files[mod].append(path)
+            prev = prev_files.get(path)
+            status, stat = (member_status if is_zip_member(path) else file_status)(path, prev)
+            pending.append((path, fname, mod, prev, status, stat))
         except Exception as e:
             logging.error("Headers fallaron para %s: %s", fname, e)
+
+    # 2) Headers de nuevos/modificados, en paralelo
+    scans = scan_headers([t[0] for t in pending if t[4] != "unchanged"], manifest)
+
+    def build_entry(item):
+        path, fname, mod, prev, status, stat = item
+        if status == "unchanged":
+            entry = dict(prev, **stat)
+            if "types" not in entry:  # manifest anterior a la inferencia de tipos
+                entry["types"] = sample_types(path, entry["encoding"], entry["delimiter"])
+            return entry
+        scan = scans.get(path, {})
+        if "cols" in scan:
+            cols, enc, delim = scan["cols"], scan["encoding"], scan["delimiter"]
+        else:
+            logging.warning("Escáner rápido falló para %s (%s); se usa lectura completa",
+                            fname, scan.get("error"))
+            cols, enc, delim = headers_only(path)
+        anio, tri = parse_year_trim_from_name(fname)
+        return {"path": path, **stat, "origen": source_origin(path),
+                "mod": mod, "anio": anio, "tri": tri,
+                "encoding": enc, "delimiter": delim, "cols": cols,
+                "types": sample_types(path, enc, delim)}
+
+    # 3) Entradas (muestreo de tipos en paralelo)
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as ex:
+        futures = [(item, ex.submit(build_entry, item)) for item in pending]
+        for (path, fname, mod, prev, status, stat), fut in futures:
+            try:
+                entry = fut.result()
+            except Exception as e:
+                logging.error("Headers fallaron para %s: %s", fname, e)
+                continue
+            info.append(dict(entry, status=status))
+            counts[status] += 1
+            module_to_union[mod] |= set(entry["cols"])
+            module_to_files[mod].append(path)
+    logging.info("Archivos: nuevos=%d, modificados=%d, sin cambios=%d",
+                 counts["new"], counts["changed"], counts["unchanged"])
     return info, module_to_union, module_to_files
 
-# ========= Escritura en UN solo archivo Parquet =========
-def write_single_parquet_from_ddf(ddf: dd.DataFrame, out_path: str):
+# ========= Escritura en UN solo archivo Parquet (ver parquet_io) =========
+def row_group_ranges(parquet_path: str, rows_per_part):
     """
-    Escribe un único archivo Parquet usando ParquetWriter, apilando particiones de Dask
-    sin reventar memoria.
+    Reparte los row groups del archivo entre las piezas escritas (cada write_table abre
+    row groups nuevos). Devuelve [(primer_row_group, n_row_groups), ...] por pieza.
     """
-    parts = ddf.to_delayed()
-    if not parts:
-        raise RuntimeError("No hay particiones que escribir.")
-
-    # 1) Obtener primera partición para definir el esquema Arrow
-    first_df = compute(parts[0])[0]
-    table = pa.Table.from_pandas(first_df, preserve_index=False)
-    writer = pq.ParquetWriter(out_path, table.schema, compression="snappy")
-
-    # 2) Escribir la primera
-    writer.write_table(table)
-
-    # 3) Escribir el resto secuencialmente
-    for p in parts[1:]:
-        pdf = compute(p)[0]
-        tbl = pa.Table.from_pandas(pdf, preserve_index=False)
-        # Validar columnas iguales
-        if tbl.schema != writer.schema:
-            # Alinear columnas que falten/sobren (por seguridad extra)
-            cols_writer = [f.name for f in writer.schema]
-            for c in cols_writer:
-                if c not in pdf.columns:
-                    pdf[c] = pd.NA
-            pdf = pdf[cols_writer]
-            tbl = pa.Table.from_pandas(pdf, preserve_index=False)
-        writer.write_table(tbl)
-
-    writer.close()
+    md = pq.ParquetFile(parquet_path).metadata
+    ranges, rg = [], 0
+    for n in rows_per_part:
+        start, acc = rg, 0
+        while rg < md.num_row_groups and acc < n:
+            acc += md.row_group(rg).num_rows
+            rg += 1
+        if n == 0 and rg < md.num_row_groups and md.row_group(rg).num_rows == 0:
+            rg += 1
+        if acc != n:
+            raise RuntimeError(f"Row groups desalineados en {parquet_path}")
+        ranges.append((start, rg - start))
+    return ranges
+
+def read_row_groups(parquet_path: str, start: int, count: int) -> pa.Table:
+    """Lee un rango contiguo de row groups del maestro anterior (sin pasar por pandas)."""
+    pf = pq.ParquetFile(parquet_path)
+    return pf.read_row_groups(list(range(start, start + count)))
 
 # ========= PASADA 2: construcción con Dask =========
-def build_with_dask(file_info, module_to_union):
+def make_load_one(fi, final_cols, string_dtype, types):
+    """
+    Pieza delayed que lee un CSV y lo deja con el esquema final del módulo (Table de Arrow
+    ya tipada). Lanza TypeConflict si algún valor no cabe en el tipo inferido.
+    """
+    path, enc, delim, anio, tri = fi["path"], fi["encoding"], fi["delimiter"], fi["anio"], fi["tri"]
+    cols = fi["cols"]
+
+    @delayed
+    def load_one(path=path, enc=enc, delim=delim, anio=anio, tri=tri, cols=cols,
+                 final_cols=final_cols, string_dtype=string_dtype, types=types):
+        def prepare(df):
+            # Metadatos
+            df = add_meta_cols(df, anio, tri)
+
+            # Añadir columnas faltantes y ordenar
+            for c in final_cols:
+                if c not in df.columns:
+                    df[c] = pd.NA
+            df = df.reindex(columns=final_cols)
+
+            # anio/trimestre/anio_trimestre ya traen su dtype canónico (add_meta_cols);
+            # todo lo demás se lee como string y se castea (validando) al tipo inferido
+            non_meta = [c for c in df.columns if c not in ("anio","trimestre","anio_trimestre")]
+            for c in non_meta:
+                df[c] = df[c].astype(string_dtype)
+
+            tbl = pa.Table.from_pandas(df, preserve_index=False)
+            for i, c in enumerate(tbl.column_names):
+                if c in types:
+                    tbl = tbl.set_column(i, c, cast_column(path, c, tbl[c], types[c]))
+            return tbl
+
+        def prepare_arrow(batch):
+            # Mismo resultado que prepare, sin pandas: meta + columnas en el orden final
+            tbl = pa.Table.from_batches([batch]) if isinstance(batch, pa.RecordBatch) else batch
+            anio_a, tri_a, at_a = arrow_meta_cols(tbl, anio, tri)
+            arrays = [anio_a, tri_a, at_a]
+            for c in final_cols[3:]:
+                if c in tbl.column_names:
+                    arrays.append(cast_column(path, c, tbl[c], types[c]))
+                else:
+                    arrays.append(pa.nulls(tbl.num_rows, ARROW_TYPES[types.get(c, "string")]))
+            return pa.Table.from_arrays(arrays, schema=module_schema(final_cols, types))
+
+        # Lote a lote: en memoria solo queda la versión Arrow (tipada) de cada lote;
+        # concat_tables no copia, el escritor recibe los lotes como chunks.
+        tables = None
+        if CSV_ENGINE == "arrow":
+            try:
+                tables = [prepare_arrow(b) for b in ArrowCsvBatchReader(path, enc, delim, cols)]
+            except pa.ArrowInvalid as e:
+                # Filas con más/menos campos: pandas las tolera (rellena con nulos)
+                logging.warning("pyarrow.csv falló en %s (%s); se usa pandas", path, e)
+        if tables is None:
+            tables = [prepare(df) for df in CsvBatchReader(path, enc, delim)]
+        if not tables:
+            tables = [prepare(pd.DataFrame())]
+        return pa.concat_tables(tables)
+
+    return load_one()
+
+def piece_basename(fi) -> str:
+    """
+    Nombre de los archivos que genera un CSV dentro del dataset particionado:
+    <stem>_<hash corto del contenido> (dos CSV con nombres parecidos no chocan).
+    """
+    stem = os.path.splitext(source_name(fi["path"]))[0]
+    stem = re.sub(r"[^A-Za-z0-9_\-]+", "_", stem)
+    return f"{stem}_{(fi.get('sha256') or '')[:10]}"
+
+def write_module_single(mod, files_mod, final_cols, types, schema, string_dtype, prev_mod, manifest,
+                        resume):
+    """
+    Maestro de archivo único. `resume` guarda entre reintentos por TypeConflict lo que ya
+    se escribió: resume["rows"] = filas de las primeras piezas, que quedaron en
+    <maestro>.partial y se leen de ahí (recasteadas) en vez de volver al CSV.
+    """
+    out_path = os.path.join(OUT_DIR, f"enoe_master_{mod.lower()}.parquet")
+    partial_path = out_path + ".partial"
+    done = resume.get("rows", [])
+
+    # ¿Qué se puede reutilizar del maestro anterior?
+    prev_rgs = prev_mod.get("row_groups", {}) if prev_mod and os.path.exists(out_path) else {}
+    reusable = {fi["path"] for fi in files_mod
+                if fi["status"] == "unchanged" and fi["path"] in prev_rgs}
+
+    if (prev_mod and not done and len(reusable) == len(files_mod)
+            and set(prev_rgs) == reusable and prev_mod.get("columns") == final_cols
+            and prev_mod.get("types") == types and prev_mod.get("meta") == meta_signature()):
+        logging.info("Parquet %s sin cambios (%d archivos); se conserva %s", mod, len(files_mod), out_path)
+        return None
+    n_decode = sum(1 for fi in files_mod[len(done):] if fi["path"] not in reusable)
+    logging.info("%s: %d archivos a decodificar, %d se copian del maestro anterior, %d del intento anterior",
+                 mod, n_decode, len(files_mod) - len(done) - n_decode, len(done))
+
+    done_rgs = row_group_ranges(partial_path, done) if done else []
+    pieces = []
+    for i, fi in enumerate(files_mod):
+        if i < len(done):
+            start, count = done_rgs[i]
+            pieces.append(delayed(read_row_groups)(partial_path, start, count))
+        elif fi["path"] in reusable:
+            start, count = prev_rgs[fi["path"]]
+            pieces.append(delayed(read_row_groups)(out_path, start, count))
+        else:
+            pieces.append(make_load_one(fi, final_cols, string_dtype, types))
+
+    # === Escribir UN solo archivo Parquet (tmp + replace: el anterior se lee mientras tanto) ===
+    tmp_path = out_path + ".tmp"
+    logging.info("Escribiendo único Parquet de %s → %s", mod, out_path)
+    rows_per_file = []
+    try:
+        write_single_parquet_from_parts(pieces, tmp_path, schema, progress=rows_per_file)
+    except TypeConflict:
+        # Las piezas completas se quedan para el reintento (ver docstring)
+        if rows_per_file and os.path.exists(tmp_path):
+            os.replace(tmp_path, partial_path)
+            resume["rows"] = rows_per_file
+        raise
+    ranges = row_group_ranges(tmp_path, rows_per_file)
+    os.replace(tmp_path, out_path)
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    for fi, n in zip(files_mod, rows_per_file):
+        fi["rows"] = n
+    manifest["modules"][mod] = {
+        "out_path": out_path,
+        "layout": "single",
+        "columns": final_cols,
+        "types": types,
+        "meta": meta_signature(),
+        "row_groups": {fi["path"]: list(rg) for fi, rg in zip(files_mod, ranges)},
+    }
+    return out_path
+
+def write_module_partitioned(mod, files_mod, final_cols, types, schema, string_dtype, prev_mod, manifest,
+                             resume):
+    """
+    Maestro como dataset hive. `resume["parts"]` = {csv: archivos} ya escritos en un
+    intento anterior (TypeConflict): no se vuelven a decodificar, solo se recastean.
+    """
+    out_dir = os.path.join(OUT_DIR, f"enoe_master_{mod.lower()}")
+    prev_parts = prev_mod.get("parts", {}) if prev_mod and os.path.isdir(out_dir) else {}
+    current = {fi["path"] for fi in files_mod}
+    done_parts = resume.setdefault("parts", {})
+    done_rels = {rel for rels in done_parts.values() for rel in rels}
+
+    # Archivos del dataset que hay que retirar: de CSV modificados o que ya no existen
+    dirty = set()
+    for path, rels in prev_parts.items():
+        if path not in current or any(fi["path"] == path and fi["status"] != "unchanged" for fi in files_mod):
+            dirty |= set(rels)
+    # Un CSV sin cambios que comparte archivo con uno "sucio" (tras compactar) se vuelve a leer
+    to_decode = [fi for fi in files_mod if fi["path"] not in done_parts and (
+                 fi["path"] not in prev_parts or fi["status"] != "unchanged"
+                 or dirty & set(prev_parts[fi["path"]]))]
+
+    same_types = (bool(prev_mod) and prev_mod.get("types") == types
+                  and prev_mod.get("meta") == meta_signature())
+    if not to_decode and not dirty and prev_mod.get("columns") == final_cols and same_types:
+        logging.info("Dataset %s sin cambios (%d archivos); se conserva %s", mod, len(files_mod), out_dir)
+        return None
+    logging.info("%s: %d archivos a decodificar, %d se conservan en el dataset",
+                 mod, len(to_decode), len(files_mod) - len(to_decode))
+
+    for fi in to_decode:
+        dirty |= set(prev_parts.get(fi["path"], []))
+    remove_dataset_files(out_dir, dirty - done_rels)
+
+    # Si cambió el tipo de alguna columna, los archivos que se conservan se recastean
+    # (sin volver al CSV: los tipos inferidos recuperan el texto original exacto);
+    # lo escrito en un intento anterior siempre trae los tipos de antes
+    keep = set(done_rels)
+    if prev_parts and not same_types:
+        keep |= {rel for fi in files_mod if fi not in to_decode and fi["path"] not in done_parts
+                 for rel in prev_parts.get(fi["path"], [])}
+    if keep:
+        n = recast_dataset_files(out_dir, sorted(keep), schema)
+        logging.info("%s: tipos cambiaron; %d archivos del dataset recasteados", mod, n)
+
+    pieces = [make_load_one(fi, final_cols, string_dtype, types) for fi in to_decode]
+    basenames = [piece_basename(fi) for fi in to_decode]
+    logging.info("Escribiendo dataset particionado de %s → %s", mod, out_dir)
+    rows, files = [], []
+    if pieces:
+        try:
+            write_partitioned_from_parts(pieces, out_dir, basenames, schema, progress=(rows, files))
+        except TypeConflict:
+            # Las piezas completas se quedan para el reintento (ver docstring)
+            for fi, n, rels in zip(to_decode, rows, files):
+                fi["rows"] = n
+                done_parts[fi["path"]] = rels
+            raise
+    else:
+        write_common_metadata(out_dir, schema)
+
+    parts = {p: rels for p, rels in prev_parts.items() if p in current}
+    parts.update(done_parts)
+    for fi, n, rels in zip(to_decode, rows, files):
+        fi["rows"] = n
+        parts[fi["path"]] = rels
+    manifest["modules"][mod] = {
+        "out_path": out_dir,
+        "layout": "partitioned",
+        "columns": final_cols,
+        "types": types,
+        "meta": meta_signature(),
+        "parts": parts,
+    }
+    return out_dir
+
+def remove_module_master(mod, manifest):
+    """
+    Un módulo que se quedó sin archivos de entrada no conserva su maestro anterior (tendría
+    filas de CSV que ya no existen): se borran el archivo o dataset, el esquema, el reporte
+    de cobertura y su entrada del manifest.
+    """
+    info = manifest["modules"].pop(mod, None)
+    paths = [os.path.join(OUT_DIR, f"enoe_master_{mod.lower()}.parquet"),
+             os.path.join(OUT_DIR, f"enoe_master_{mod.lower()}"),
+             schema_sidecar_path(OUT_DIR, mod),
+             os.path.join(REPORTS_DIR, f"coverage_{mod.lower()}.csv")]
+    removed = [p for p in paths if os.path.exists(p)]
+    for p in removed:
+        if os.path.isdir(p):
+            shutil.rmtree(p)
+        else:
+            os.remove(p)
+    if info is not None or removed:
+        logging.info("%s: ya no tiene archivos; se eliminan el maestro y sus reportes (%s)",
+                     mod, ", ".join(removed) or "sin archivos en disco")
+        save_manifest(manifest, MANIFEST_PATH)
+
+def build_with_dask(file_info, module_to_union, manifest):
     # dtypes canónicos para meta:
     try:
         string_dtype = pd.StringDtype()
     except Exception:
         string_dtype = "object"
 
+    prev_modules = {} if FULL_REBUILD else manifest["modules"]
+    write_module = write_module_partitioned if OUTPUT_LAYOUT == "partitioned" else write_module_single
+
     for mod in MODULES:
         files_mod = [fi for fi in file_info if fi["mod"] == mod]
         if not files_mod:
+            remove_module_master(mod, manifest)
             continue
 
         # Esquema final: meta + unión alfabética (sin renombrar)
         union_cols = sorted(module_to_union[mod], key=str.lower)
         final_cols = ["anio", "trimestre", "anio_trimestre"] + [c for c in union_cols if c not in {"anio","trimestre","anio_trimestre"}]
+        # Tipos: unión de lo inferido en cada archivo (si no coinciden, string)
+        types = module_types([fi.get("types", {}) for fi in files_mod], final_cols[3:])
+
+        prev_mod = prev_modules.get(mod)
+        if prev_mod and prev_mod.get("layout", "single") != OUTPUT_LAYOUT:
+            prev_mod = None  # cambió el layout: se construye desde cero
+
+        # Un archivo puede traer fuera de la muestra valores que no caben en el tipo:
+        # se ensancha/degrada esa columna y se reintenta. Lo que ya se escribió se conserva
+        # (resume) y solo se recastea; se decodifican los CSV que faltaban.
+        resume = {}
+        for intento in range(MAX_TYPE_RETRIES + 1):
+            schema = module_schema(final_cols, types)
+            save_schema_sidecar(OUT_DIR, mod, types)
+            try:
+                out = write_module(mod, files_mod, final_cols, types, schema, string_dtype, prev_mod,
+                                   manifest, resume)
+                break
+            except TypeConflict as e:
+                if intento == MAX_TYPE_RETRIES:
+                    raise RuntimeError(f"{mod}: demasiados choques de tipos ({MAX_TYPE_RETRIES}); "
+                                       f"el último: {e}") from e
+                logging.warning("%s: %s (era %s); se reintenta el módulo", mod, e, types[e.column])
+                types[e.column] = e.needed
+                for fi in files_mod:
+                    if fi["path"] == e.path:
+                        fi.setdefault("types", {})[e.column] = e.needed
+        if out is None:
+            continue
 
-        # META con dtypes explícitos
-        meta_dict = {}
-        for c in final_cols:
-            if c in ("anio", "trimestre"):
-                meta_dict[c] = pd.Series(dtype="Int64")
-            elif c == "anio_trimestre":
-                meta_dict[c] = pd.Series(dtype=string_dtype)
-            else:
-                meta_dict[c] = pd.Series(dtype=string_dtype)   # fuerza string en no-meta
-        meta = pd.DataFrame(meta_dict)[final_cols]
-
-        delayed_frames = []
+        # Actualizar manifest (archivos + layout del maestro)
         for fi in files_mod:
-            path, enc, delim, anio, tri = fi["path"], fi["encoding"], fi["delimiter"], fi["anio"], fi["tri"]
-
-            @delayed
-            def load_one(path=path, enc=enc, delim=delim, anio=anio, tri=tri, final_cols=final_cols, string_dtype=string_dtype):
-                df = read_full_csv_robust(path, enc, delim)
-
-                # Metadatos
-                df = add_meta_cols(df, anio, tri)
-
-                # Añadir columnas faltantes y ordenar
-                for c in final_cols:
-                    if c not in df.columns:
-                        df[c] = pd.NA
-                df = df.reindex(columns=final_cols)
-
-                # Casteos DEFINITIVOS para que todas las particiones coincidan:
-                df["anio"] = pd.to_numeric(df["anio"], errors="coerce").astype("Int64")
-                df["trimestre"] = pd.to_numeric(df["trimestre"], errors="coerce").astype("Int64")
-                df["anio_trimestre"] = (df["anio"].astype("string") + "T" + df["trimestre"].astype("string")).astype(string_dtype)
-
-                # Todo lo demás como string (evita conflictos de esquema entre particiones)
-                non_meta = [c for c in df.columns if c not in ("anio","trimestre","anio_trimestre")]
-                for c in non_meta:
-                    df[c] = df[c].astype(string_dtype)
-
-                return df
-
-            delayed_frames.append(load_one())
-
-        ddf = dd.from_delayed(delayed_frames, meta=meta)
-
-        # === Escribir UN solo archivo Parquet ===
-        out_path = os.path.join(OUT_DIR, f"enoe_master_{mod.lower()}.parquet")
-        logging.info("Escribiendo único Parquet de %s → %s", mod, out_path)
-        write_single_parquet_from_ddf(ddf, out_path)
+            manifest["files"][fi["path"]] = {k: v for k, v in fi.items() if k != "status"}
+        save_manifest(manifest, MANIFEST_PATH)
 
         # Resumen mínimo
-        nrows = ddf.shape[0].compute()
-        ncols = len(ddf.columns)
-        logging.info("Parquet %s listo | Filas=%s, Cols=%s -> %s", mod, f"{nrows:,}", ncols, out_path)
+        nrows = sum(fi.get("rows", 0) for fi in files_mod)
+        ncols = len(final_cols)
+        logging.info("Parquet %s listo | Filas=%s, Cols=%s -> %s", mod, f"{nrows:,}", ncols, out)
 
         # Cobertura de columnas (cuántos archivos la traen)
         coverage = []
@@ -321,13 +691,59 @@ def build_with_dask(file_info, module_to_union):
         cov_csv = os.path.join(REPORTS_DIR, f"coverage_{mod.lower()}.csv")
         cov_df.to_csv(cov_csv, index=False, encoding="utf-8")
 
+def compact_all(manifest):
+    """Compacta los datasets particionados y actualiza en el manifest qué archivo tiene cada CSV."""
+    for mod, info in manifest["modules"].items():
+        if info.get("layout") != "partitioned" or not os.path.isdir(info["out_path"]):
+            continue
+        merged = compact_dataset(info["out_path"])
+        if not merged:
+            logging.info("%s: nada que compactar", mod)
+            continue
+        old_to_new = {old: new for new, olds in merged.items() for old in olds}
+        for path, rels in info["parts"].items():
+            info["parts"][path] = sorted({old_to_new.get(r, r) for r in rels})
+        save_manifest(manifest, MANIFEST_PATH)
+
+def forget_missing_files(manifest, file_info):
+    """Quita del manifest los archivos que ya no están en la entrada (fuerza reescribir su módulo)."""
+    present = {fi["path"] for fi in file_info}
+    for path in [p for p in manifest["files"] if p not in present]:
+        logging.info("Archivo ya no existe, se retira del maestro: %s", path)
+        del manifest["files"][path]
+
 if __name__ == "__main__":
-    csv_files = sorted(glob.glob(os.path.join(FILES_DIR, "*.csv")))
+    ap = argparse.ArgumentParser(description="ENOE CSV → Parquet maestro por módulo")
+    ap.add_argument("comando", nargs="?", default="build", choices=["build", "compact", "index"],
+                    help="build (default): construye/actualiza; compact: fusiona archivos pequeños; "
+                         "index: solo el índice de llaves entre módulos")
+    args = ap.parse_args()
+
+    manifest = load_manifest(MANIFEST_PATH)
+    if args.comando == "compact":
+        compact_all(manifest)
+        raise SystemExit(0)
+    if args.comando == "index":
+        build_join_index(OUT_DIR, manifest, REPORTS_DIR, full_rebuild=FULL_REBUILD)
+        save_manifest(manifest, MANIFEST_PATH)
+        raise SystemExit(0)
+
+    if INPUT_MODE == "zip":
+        src_dir = ZIPS_DIR
+        csv_files = list_zip_csvs(ZIPS_DIR)
+    else:
+        src_dir = FILES_DIR
+        csv_files = sorted(glob.glob(os.path.join(FILES_DIR, "*.csv")))
     if not csv_files:
-        logging.error("NO se hallaron CSV en %s", FILES_DIR)
+        logging.error("NO se hallaron CSV en %s", src_dir)
         raise SystemExit(1)
 
     logging.info("CSVs detectados: %d", len(csv_files))
-    info, module_to_union, module_to_files = pass1(csv_files)
-    build_with_dask(info, module_to_union)
+    info, module_to_union, module_to_files = pass1(csv_files, manifest)
+    forget_missing_files(manifest, info)
+    build_with_dask(info, module_to_union, manifest)
+    save_manifest(manifest, MANIFEST_PATH)
+    if BUILD_JOIN_INDEX:
+        build_join_index(OUT_DIR, manifest, REPORTS_DIR, full_rebuild=FULL_REBUILD)
+        save_manifest(manifest, MANIFEST_PATH)
     logging.info("Listo. Revisa: %s", OUT_DIR)
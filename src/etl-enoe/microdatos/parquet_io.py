@@ -0,0 +1,293 @@
+# parquet_io.py
+# -*- coding: utf-8 -*-
+"""
+Escritura/lectura de datasets Parquet particionados (hive) para los maestros ENOE.
+
+- Layout: <dataset>/anio=2024/trimestre=3/<pieza>-0.parquet
+  Un filtro por periodo (p.ej. anio_trimestre == '2024T3') toca un solo directorio.
+- Row groups acotados (ROW_GROUP_MIN/MAX) y estadísticas por columna en cada archivo.
+- _common_metadata guarda la unión de columnas del módulo: los archivos viejos pueden
+  no traer columnas nuevas y los lectores las completan con nulos.
+- compact_dataset: fusiona los archivos pequeños de cada partición en uno solo.
+- iter_computed: calcula piezas delayed en paralelo con una ventana acotada y las entrega
+  en orden; lo usan el escritor de archivo único y el del dataset particionado.
+"""
+
+import os, re, glob, logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dask import compute
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+PARTITION_COLS = ["anio", "trimestre"]
+PARTITIONING = ds.partitioning(
+    pa.schema([("anio", pa.int64()), ("trimestre", pa.int64())]), flavor="hive"
+)
+COMMON_METADATA = "_common_metadata"
+
+# Row groups de ~100k-500k filas: suficientes para estadísticas útiles sin
+# forzar lecturas enormes cuando se filtra por pocas columnas.
+ROW_GROUP_MIN = 100_000
+ROW_GROUP_MAX = 500_000
+COMPRESSION = "snappy"
+
+# Piezas que se calculan a la vez. La memoria pico es ~ IN_FLIGHT piezas (+ la que se escribe).
+IN_FLIGHT = max(2, min(8, os.cpu_count() or 2))
+# "threads": pandas/pyarrow liberan el GIL en lectura y casteos (sin copiar resultados)
+# "processes": paralelismo real para pasos en Python puro (los resultados se serializan)
+SCHEDULER = "threads"
+
+re_periodo = re.compile(r"^\s*(\d{4})\s*T\s*(\d)\s*$", flags=re.IGNORECASE)
+
+def period_filter(anio_trimestre: str):
+    """'2024T3' -> [('anio','=',2024), ('trimestre','=',3)] (poda por directorio)."""
+    m = re_periodo.match(str(anio_trimestre))
+    if not m:
+        raise ValueError(f"Periodo inválido (se espera AAAATn): {anio_trimestre}")
+    return [("anio", "=", int(m.group(1))), ("trimestre", "=", int(m.group(2)))]
+
+def is_dataset_dir(path: str) -> bool:
+    return os.path.isdir(path)
+
+def dataset_schema(path: str):
+    """Esquema completo del dataset (unión de columnas) o None si no hay _common_metadata."""
+    cm = os.path.join(path, COMMON_METADATA)
+    return pq.read_schema(cm) if os.path.exists(cm) else None
+
+def open_dataset(path: str) -> ds.Dataset:
+    """Abre el dataset particionado con el esquema de _common_metadata (si existe)."""
+    return ds.dataset(path, format="parquet", partitioning=PARTITIONING,
+                      schema=dataset_schema(path), exclude_invalid_files=True)
+
+def align_table(tbl: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Reordena/castea columnas al esquema dado; las faltantes se llenan con nulos."""
+    arrays = []
+    for field in schema:
+        if field.name in tbl.column_names:
+            arrays.append(tbl[field.name].cast(field.type))
+        else:
+            arrays.append(pa.nulls(tbl.num_rows, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def _file_options():
+    return ds.ParquetFileFormat().make_write_options(
+        compression=COMPRESSION, write_statistics=True
+    )
+
+def _cast_partition_cols(tbl: pa.Table) -> pa.Table:
+    for c in PARTITION_COLS:
+        if c in tbl.column_names and tbl[c].type != pa.int64():
+            i = tbl.column_names.index(c)
+            col = tbl[c]
+            if pa.types.is_dictionary(col.type):
+                col = col.cast(col.type.value_type)
+            tbl = tbl.set_column(i, c, col.cast(pa.int64()))
+    return tbl
+
+def write_partitioned_table(tbl: pa.Table, out_dir: str, basename: str):
+    """Escribe una tabla en el dataset hive. Devuelve las rutas (relativas) escritas."""
+    written = []
+    ds.write_dataset(
+        _cast_partition_cols(tbl), out_dir,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=f"{basename}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=_file_options(),
+        min_rows_per_group=ROW_GROUP_MIN,
+        max_rows_per_group=ROW_GROUP_MAX,
+        file_visitor=lambda wf: written.append(os.path.relpath(wf.path, out_dir)),
+    )
+    return written
+
+def write_common_metadata(out_dir: str, schema: pa.Schema) -> None:
+    schema = _cast_partition_cols(schema.empty_table()).schema
+    pq.write_metadata(schema, os.path.join(out_dir, COMMON_METADATA))
+
+def _as_table(obj) -> pa.Table:
+    return obj if isinstance(obj, pa.Table) else pa.Table.from_pandas(obj, preserve_index=False)
+
+def iter_computed(parts, window: int = IN_FLIGHT, scheduler: str = SCHEDULER):
+    """
+    Calcula piezas delayed (DataFrame o Table) con hasta `window` en vuelo y las entrega
+    como Table EN EL ORDEN de `parts`. Mientras el consumidor escribe la pieza i, las
+    siguientes ya se están calculando; nunca hay más de `window` resultados en memoria.
+    """
+    window = max(1, window)
+    if scheduler == "processes":
+        pool = ProcessPoolExecutor(max_workers=window)
+        threads = ThreadPoolExecutor(max_workers=window)
+        submit = lambda p: threads.submit(lambda: _as_table(compute(p, scheduler="processes", pool=pool)[0]))
+    else:
+        pool = None
+        threads = ThreadPoolExecutor(max_workers=window)
+        submit = lambda p: threads.submit(lambda: _as_table(compute(p, scheduler="sync")[0]))
+
+    pending = deque()
+    it = iter(parts)
+    try:
+        for p in it:
+            pending.append(submit(p))
+            if len(pending) >= window:
+                break
+        while pending:
+            tbl = pending.popleft().result()
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append(submit(nxt))
+            yield tbl
+            del tbl
+    finally:
+        threads.shutdown(wait=True, cancel_futures=True)
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+def _is_null_type(t: pa.DataType) -> bool:
+    return pa.types.is_null(t) or (pa.types.is_dictionary(t) and pa.types.is_null(t.value_type))
+
+def complete_schema(schema: pa.Schema, tbl: pa.Table) -> pa.Schema:
+    """
+    Completa los tipos que el meta de pandas no sabe dar: un categórico sin categorías
+    conocidas sale como dictionary<values=null> y un object vacío como null. Se toma el
+    tipo de la misma columna en `tbl` (la primera pieza) y, si ahí tampoco lo hay,
+    dictionary<int32, string> / string.
+    """
+    fields = []
+    for f in schema:
+        if _is_null_type(f.type):
+            i = tbl.schema.get_field_index(f.name)
+            if i >= 0 and not _is_null_type(tbl.schema.field(i).type):
+                t = tbl.schema.field(i).type
+            elif pa.types.is_dictionary(f.type):
+                t = pa.dictionary(pa.int32(), pa.string())
+            else:
+                t = pa.string()
+            f = f.with_type(t)
+        fields.append(f)
+    return pa.schema(fields, metadata=schema.metadata)
+
+def write_single_parquet_from_parts(parts, out_path: str, schema: pa.Schema = None,
+                                    window: int = IN_FLIGHT, progress: list = None):
+    """
+    Escribe un único archivo Parquet con ParquetWriter, apilando piezas (delayed que
+    devuelven DataFrame de pandas o Table de Arrow) calculadas en paralelo (iter_computed).
+    Si no se da schema, lo fija la primera pieza (que también completa los tipos nulos
+    del schema dado, ver complete_schema). Devuelve las filas escritas por pieza
+    (el conteo sale de lo escrito: no hace falta otra pasada sobre los datos).
+    Si se da `progress`, las filas se van agregando ahí: si una pieza falla, el llamador
+    sabe cuántas quedaron completas en el archivo (que se cierra válido).
+    """
+    if not parts:
+        raise RuntimeError("No hay particiones que escribir.")
+
+    writer = None
+    rows_per_part = progress if progress is not None else []
+    try:
+        for tbl in iter_computed(parts, window):
+            if writer is None:
+                schema = complete_schema(schema, tbl) if schema is not None else tbl.schema
+                writer = pq.ParquetWriter(out_path, schema, compression=COMPRESSION)
+            # Alinear columnas que falten/sobren o difieran de tipo
+            if not tbl.schema.equals(writer.schema):
+                tbl = align_table(tbl, writer.schema)
+            writer.write_table(tbl)
+            rows_per_part.append(tbl.num_rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows_per_part
+
+def write_single_parquet_from_ddf(ddf, out_path: str, window: int = IN_FLIGHT):
+    """
+    Escribe las particiones de un Dask DataFrame en un único Parquet (ver arriba).
+    El esquema sale del meta de Dask, así una primera partición con columnas todo-nulas
+    no fija tipos equivocados; los que el meta deja en null (categóricos sin categorías
+    conocidas, object vacíos) los completa la primera pieza. Devuelve el total de filas.
+    """
+    schema = pa.Schema.from_pandas(ddf._meta, preserve_index=False)
+    return sum(write_single_parquet_from_parts(ddf.to_delayed(), out_path, schema, window))
+
+def write_partitioned_from_parts(parts, out_dir: str, basenames, schema: pa.Schema = None,
+                                 window: int = IN_FLIGHT, progress: tuple = None):
+    """
+    Escribe piezas (delayed que devuelven DataFrame o Table) en un dataset hive,
+    calculándolas en paralelo (iter_computed).
+    basenames[i] nombra los archivos de la pieza i. Devuelve (filas, archivos) por pieza.
+    `progress` = (filas, archivos): listas que se llenan pieza a pieza (ver arriba).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rows_per_part, files_per_part = progress if progress is not None else ([], [])
+    for tbl, base in zip(iter_computed(parts, window), basenames):
+        if schema is None:
+            schema = tbl.schema
+        if not tbl.schema.equals(schema):
+            tbl = align_table(tbl, schema)
+        files_per_part.append(write_partitioned_table(tbl, out_dir, base))
+        rows_per_part.append(tbl.num_rows)
+    write_common_metadata(out_dir, schema)
+    return rows_per_part, files_per_part
+
+def remove_dataset_files(out_dir: str, rel_paths) -> None:
+    for rel in rel_paths:
+        p = os.path.join(out_dir, rel)
+        if os.path.exists(p):
+            os.remove(p)
+
+def recast_dataset_files(out_dir: str, rel_paths, schema: pa.Schema) -> int:
+    """
+    Reescribe (tmp + replace) los archivos cuyas columnas ya no tienen el tipo del módulo,
+    p.ej. cuando una columna pasó de int8 a int16 o a string. Las columnas que el archivo
+    no trae no se agregan (las completa el lector con _common_metadata).
+    Devuelve cuántos archivos reescribió.
+    """
+    n = 0
+    for rel in rel_paths:
+        p = os.path.join(out_dir, rel)
+        if not os.path.exists(p):
+            continue
+        pf = pq.ParquetFile(p)
+        names = set(pf.schema_arrow.names)
+        target = pa.schema([f for f in schema if f.name in names and f.name not in PARTITION_COLS])
+        if pf.schema_arrow.equals(target):
+            continue
+        tbl = align_table(pf.read(), target)
+        tmp = p + ".tmp"
+        pq.write_table(tbl, tmp, compression=COMPRESSION, write_statistics=True,
+                       row_group_size=ROW_GROUP_MAX)
+        os.replace(tmp, p)
+        n += 1
+    return n
+
+def compact_dataset(out_dir: str, small_rows: int = ROW_GROUP_MAX):
+    """
+    Fusiona, dentro de cada partición, los archivos con menos de small_rows filas en
+    un solo archivo. Devuelve {archivo_nuevo: [archivos_fusionados]} (rutas relativas).
+    """
+    schema = dataset_schema(out_dir)
+    merged = {}
+    part_dirs = sorted({os.path.dirname(p) for p in
+                        glob.glob(os.path.join(out_dir, "**", "*.parquet"), recursive=True)})
+    for d in part_dirs:
+        small = [p for p in sorted(glob.glob(os.path.join(d, "*.parquet")))
+                 if pq.ParquetFile(p).metadata.num_rows < small_rows]
+        if len(small) < 2:
+            continue
+        tables = [pq.read_table(p) for p in small]
+        target = schema if schema is not None else pa.unify_schemas([t.schema for t in tables])
+        target = pa.schema([f for f in target if f.name not in PARTITION_COLS])
+        tbl = pa.concat_tables([align_table(t, target) for t in tables])
+
+        out_file = os.path.join(d, "compacted-0.parquet")
+        tmp = out_file + ".tmp"
+        pq.write_table(tbl, tmp, compression=COMPRESSION, write_statistics=True,
+                       row_group_size=ROW_GROUP_MAX)
+        for p in small:
+            os.remove(p)
+        os.replace(tmp, out_file)
+        merged[os.path.relpath(out_file, out_dir)] = [os.path.relpath(p, out_dir) for p in small]
+        logging.info("Compactado %s: %d archivos → 1 (%s filas)", os.path.relpath(d, out_dir),
+                     len(small), f"{tbl.num_rows:,}")
+    return merged
@@ -0,0 +1,149 @@
+# schema_infer.py
+# -*- coding: utf-8 -*-
+"""
+Inferencia de tipos para columnas ENOE (en lugar de guardar todo como string).
+
+- Por archivo: se toma una muestra y se elige el tipo más angosto SEGURO:
+  int8 / int16 / int32 / int64 / float32 / dictionary (string categórico) / string.
+  "Seguro" = el texto original se recupera exacto al volver a string
+  (p.ej. '01' NO es int: se perdería el cero; '2.0' NO es float32: volvería como '2').
+- Por módulo: se combinan los tipos de todos los archivos; los enteros se ensanchan,
+  cualquier otro desacuerdo cae a string para esa columna.
+- El esquema elegido se guarda en un JSON lateral (schema_<mod>.json).
+- Al cargar cada CSV se castea validando; si un valor no cabe en el tipo
+  (la muestra no lo vio) se lanza TypeConflict con el tipo que sí necesita.
+"""
+
+import os, json
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Filas muestreadas por archivo y cardinalidad máxima para usar diccionario
+SAMPLE_ROWS = 50_000
+DICT_MAX_DISTINCT = 1_000
+
+INT_TYPES = ["int8", "int16", "int32", "int64"]
+ARROW_TYPES = {
+    "int8": pa.int8(),
+    "int16": pa.int16(),
+    "int32": pa.int32(),
+    "int64": pa.int64(),
+    "float32": pa.float32(),
+    "dictionary": pa.dictionary(pa.int32(), pa.string()),
+    "string": pa.string(),
+}
+META_TYPES = {"anio": pa.int64(), "trimestre": pa.int64(),
+              "anio_trimestre": pa.dictionary(pa.int32(), pa.string())}
+
+
+class TypeConflict(Exception):
+    """Un archivo trae valores que no caben en el tipo elegido para la columna."""
+    def __init__(self, path: str, column: str, needed: str):
+        super().__init__(f"{os.path.basename(path)}: columna '{column}' requiere {needed}")
+        self.path, self.column, self.needed = path, column, needed
+
+
+def _round_trips(arr: pa.Array, typ: pa.DataType) -> bool:
+    """True si todos los valores no nulos sobreviven string -> typ -> string sin cambios."""
+    try:
+        back = pc.cast(pc.cast(arr, typ), pa.string())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return False
+    return pc.all(pc.equal(back, arr)).as_py() is not False
+
+
+def infer_array_type(arr: pa.Array):
+    """Tipo más angosto seguro para un arreglo de strings. None si no hay valores."""
+    arr = pc.cast(arr, pa.string()).drop_null()
+    if len(arr) == 0:
+        return None
+    if _round_trips(arr, pa.int64()):
+        ints = pc.cast(arr, pa.int64())
+        mm = pc.min_max(ints)
+        lo, hi = mm["min"].as_py(), mm["max"].as_py()
+        for name, bits in (("int8", 8), ("int16", 16), ("int32", 32)):
+            if -(2 ** (bits - 1)) <= lo and hi < 2 ** (bits - 1):
+                return name
+        return "int64"
+    if _round_trips(arr, pa.float32()):
+        return "float32"
+    if pc.count_distinct(arr).as_py() <= DICT_MAX_DISTINCT:
+        return "dictionary"
+    return "string"
+
+
+def infer_table_types(tbl: pa.Table) -> dict:
+    """{columna: tipo} para una muestra (las columnas sin valores quedan fuera)."""
+    out = {}
+    for name in tbl.column_names:
+        t = infer_array_type(tbl[name])
+        if t is not None:
+            out[name] = t
+    return out
+
+
+def merge_types(types) -> str:
+    """Combina los tipos de varios archivos para una columna."""
+    types = {t for t in types if t is not None}
+    if not types:
+        return "string"
+    if len(types) == 1:
+        return types.pop()
+    if types <= set(INT_TYPES):
+        return max(types, key=INT_TYPES.index)
+    return "string"
+
+
+def module_types(file_types, columns) -> dict:
+    """file_types: lista de {col: tipo} (uno por archivo) -> {col: tipo} del módulo."""
+    return {c: merge_types(ft.get(c) for ft in file_types) for c in columns}
+
+
+def meta_signature() -> dict:
+    """Tipos de los metadatos como texto (en el manifest: si cambian, se recastea el maestro)."""
+    return {c: str(t) for c, t in META_TYPES.items()}
+
+
+def module_schema(final_cols, types: dict) -> pa.Schema:
+    return pa.schema([
+        pa.field(c, META_TYPES.get(c) or ARROW_TYPES[types.get(c, "string")])
+        for c in final_cols
+    ])
+
+
+def cast_column(path: str, name: str, arr, target: str) -> pa.Array:
+    """
+    Castea una columna de strings al tipo del esquema, validando que no se pierda nada.
+    Lanza TypeConflict con el tipo que este archivo realmente necesita.
+    """
+    arr = pc.cast(arr, pa.string())
+    if target == "string":
+        return arr
+    if target == "dictionary":
+        return arr.dictionary_encode().cast(ARROW_TYPES["dictionary"])
+    if not _round_trips(arr, ARROW_TYPES[target]):
+        needed = infer_array_type(arr)
+        raise TypeConflict(path, name, merge_types([target, needed]))
+    return pc.cast(arr, ARROW_TYPES[target])
+
+
+def schema_sidecar_path(out_dir: str, mod: str) -> str:
+    return os.path.join(out_dir, f"schema_{mod.lower()}.json")
+
+
+def save_schema_sidecar(out_dir: str, mod: str, types: dict) -> None:
+    path = schema_sidecar_path(out_dir, mod)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"module": mod, "sample_rows": SAMPLE_ROWS, "columns": types},
+                  f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def load_schema_sidecar(out_dir: str, mod: str) -> dict:
+    path = schema_sidecar_path(out_dir, mod)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("columns", {})
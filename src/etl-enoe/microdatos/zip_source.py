@@ -0,0 +1,123 @@
+# zip_source.py
+# -*- coding: utf-8 -*-
+"""
+Lectura directa de los CSV dentro de los ZIP originales (carpeta 'comprimidos').
+
+En lugar de extraer a 'descompressed' (descompresor.py) y copiar a 'files' (files.py),
+cada CSV se identifica con una ruta virtual "<ruta_zip>::<miembro>" y se lee en
+streaming desde el ZIP. Se conservan las mismas reglas de esos scripts:
+- Protección zip slip: miembros absolutos o que escapan con '..' se omiten.
+- Procedencia: la subcarpeta de origen (nombre del ZIP, como en descompressed/<zip>/)
+  se guarda como metadato "origen" y en el nombre lógico <stem>__<origen>.csv.
+"""
+
+import os, re, zipfile, logging
+from pathlib import Path, PurePosixPath
+
+import pandas as pd
+
+from manifest import stream_hash
+
+ZIP_SEP = "::"
+
+def sanitize(name: str) -> str:
+    """Igual que files.sanitize: deja el nombre seguro para usar en archivo."""
+    name = name.strip().replace(" ", "_")
+    return re.sub(r'[^A-Za-z0-9_\-\.]+', "_", name)
+
+def is_zip_member(path: str) -> bool:
+    return ZIP_SEP in path
+
+def member_path(zip_path, member: str) -> str:
+    return f"{zip_path}{ZIP_SEP}{member}"
+
+def split_member(path: str):
+    zip_path, member = path.split(ZIP_SEP, 1)
+    return zip_path, member
+
+def is_safe_member(name: str) -> bool:
+    """Zip slip: el miembro debe quedar dentro de la carpeta destino al extraerse."""
+    name = name.replace("\\", "/")
+    if name.startswith("/") or re.match(r"^[A-Za-z]:", name):
+        return False
+    depth = 0
+    for part in PurePosixPath(name).parts:
+        if part == "..":
+            depth -= 1
+            if depth < 0:
+                return False
+        elif part not in ("", "."):
+            depth += 1
+    return True
+
+def list_zip_csvs(zips_dir) -> list:
+    """Rutas virtuales de todos los .csv dentro de los ZIP de zips_dir (ordenadas)."""
+    out = []
+    zips = sorted(p for p in Path(zips_dir).iterdir() if p.is_file() and zipfile.is_zipfile(p))
+    for zp in zips:
+        try:
+            with zipfile.ZipFile(zp) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(".csv"):
+                        continue
+                    if not is_safe_member(info.filename):
+                        logging.warning("Omitido por path traversal: %s dentro de %s", info.filename, zp.name)
+                        continue
+                    out.append(member_path(zp, info.filename))
+        except Exception as e:
+            logging.error("Error al leer %s: %s", zp.name, e)
+    return out
+
+def source_origin(path: str):
+    """Subcarpeta de procedencia (sanitizada) de un miembro ZIP; None para archivos normales."""
+    if not is_zip_member(path):
+        return None
+    return sanitize(Path(split_member(path)[0]).stem)
+
+def source_name(path: str) -> str:
+    """Nombre lógico del CSV: el mismo que files.py le daría en 'files' (sin contador)."""
+    if not is_zip_member(path):
+        return os.path.basename(path)
+    member = PurePosixPath(split_member(path)[1].replace("\\", "/"))
+    return f"{sanitize(member.stem)}__{source_origin(path)}{member.suffix}"
+
+def open_source(path: str):
+    """Abre el CSV en binario: archivo normal o miembro de un ZIP (sin extraerlo)."""
+    if not is_zip_member(path):
+        return open(path, "rb")
+    zip_path, member = split_member(path)
+    zf = zipfile.ZipFile(zip_path)
+    try:
+        return zf.open(member, "r")
+    finally:
+        zf.close()  # el miembro abierto mantiene vivo el archivo hasta cerrarse
+
+def read_csv_source(path: str, **kwargs) -> pd.DataFrame:
+    """pd.read_csv sobre archivo normal (ruta directa) o miembro ZIP (stream)."""
+    if not is_zip_member(path):
+        return pd.read_csv(path, **kwargs)
+    with open_source(path) as f:
+        return pd.read_csv(f, **kwargs)
+
+def member_status(path: str, prev: dict | None):
+    """
+    Equivalente a manifest.file_status para un miembro ZIP. Tamaño, CRC y fecha salen
+    del directorio central (sin descomprimir); el hash solo se calcula si alguno cambió.
+    """
+    zip_path, member = split_member(path)
+    with zipfile.ZipFile(zip_path) as zf:
+        info = zf.getinfo(member)
+        y, mo, d, h, mi, s = info.date_time
+        stat = {"size": info.file_size, "mtime": int(f"{y:04d}{mo:02d}{d:02d}{h:02d}{mi:02d}{s:02d}"),
+                "crc": info.CRC}
+        same = prev is not None and all(prev.get(k) == stat[k] for k in ("size", "mtime", "crc"))
+        if same:
+            stat["sha256"] = prev.get("sha256")
+            return "unchanged", stat
+        with zf.open(info) as f:
+            stat["sha256"] = stream_hash(f)
+    if prev is None:
+        return "new", stat
+    if prev.get("size") == stat["size"] and prev.get("sha256") == stat["sha256"]:
+        return "unchanged", stat
+    return "changed", stat
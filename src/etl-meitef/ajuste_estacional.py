@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+Ajuste estacional por lotes de todas las series trimestrales (MEITEF, SAT, IMSS).
+
+Método (estilo X-11, sin dependencias externas):
+- Multiplicativo si la serie es toda positiva; aditivo si tiene ceros o negativos
+  (variaciones, contribuciones). Los ceros de relleno al inicio/final se descartan.
+    1. Tendencia inicial: media móvil centrada 2x4.
+    2. Razones (o diferencias) serie/tendencia -> factores por trimestre con una
+       media móvil 3x3 sobre los años (pesos de extremo de X-11: 5/11/11 y 3/7/10/7
+       entre 27) y normalizados con otra 2x4 para que sumen 4 (o 0) en el año.
+    3. Tendencia sobre la serie ajustada con un Henderson de 5 términos (pesos
+       truncados y renormalizados en los extremos) y segunda ronda del paso 2.
+    4. valor_sa = valor / factor (o valor - factor).
+- Las 2x4 repiten en los extremos el último valor centrado, como X-11.
+- Un dato sólo influye en el ajuste de los RADIO = 24 trimestres a su alrededor
+  (2 + 8 + 2 por ronda de factores, dos rondas). Por eso:
+    * Caché (TIDY_DIR/_cache/ajuste_estacional_v<AJUSTE_VERSION>.parquet): cada serie
+      guarda sus valores y su descomposición. Si no cambió, se reutiliza tal cual.
+    * Si se agregan trimestres o se revisan los últimos, sólo se recalcula una ventana
+      que empieza 2*RADIO antes del primer cambio y se reemplazan los trimestres desde
+      RADIO antes de ese cambio; el resultado es idéntico al de recalcular todo.
+- Las series con la misma longitud y modo se apilan en un arreglo y se descomponen
+  de una vez; los bloques de LOTE series se reparten en un pool de procesos (WORKERS).
+
+Salidas:
+- meitef_comercio_informal_tidy_ALL.parquet se vuelve a publicar con valor_sa y
+  factor_estacional (NaN en 6/9 Meses, Anual y en series que no se pueden ajustar:
+  con huecos o con menos de MIN_TRIMESTRES). Sin pyarrow se escribe el CSV.
+- <serie>_desestacionalizada.csv junto a los CSV trimestrales de ISR/IVA e IMSS.
+
+Hay que correrlo después de clean_meitef.py (que vuelve a publicar el tidy sin estas
+columnas); con la caché, esa segunda corrida no recalcula nada.
+
+Requisitos:
+    pip install pandas numpy
+    (opcional) pip install pyarrow     (Parquet y caché)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import importlib.util
+import os
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # src/: meitef_store.py
+from meitef_store import COLUMNAS_AJUSTE, CSV_NAME, PARQUET_NAME, CuboMeitef, cargar_meitef, escribir_tidy
+
+# ==== RUTAS BÁSICAS (AJUSTA SI CAMBIAS CARPETAS) ============================
+PROJECT_DIR = Path(
+    r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\UNAM-INEGI"
+)
+TIDY_DIR = PROJECT_DIR / "data" / "meitef_tidy"
+OUTPUT_DIR = PROJECT_DIR / "output"
+PATHS_FISCALES = [
+    OUTPUT_DIR / "impuestos_data_clean_trimestral.csv",       # impuestos_etl.py (ISR, IVA)
+    OUTPUT_DIR / "ingreso_obrero_patronal_trimestral.csv",    # imss_etl.py
+]
+CACHE_DIR = TIDY_DIR / "_cache"  # ignorado en git (.gitignore): solo caché local
+USE_CACHE = True
+
+# ==== PARÁMETROS ============================================================
+AJUSTE_VERSION = 1                 # súbelo si cambia el método (invalida la caché)
+WORKERS = max(1, min(8, os.cpu_count() or 1))   # 1 = secuencial en este proceso
+LOTE = 64                          # series por tarea del pool
+MIN_TRIMESTRES = 20                # 5 años: lo mínimo para la 3x3 con pesos de extremo
+RADIO = 24                         # trimestres a los que llega la influencia de un dato
+
+PESOS_2X4 = np.array([1, 2, 2, 2, 1]) / 8
+PESOS_3X3 = np.array([1, 2, 3, 2, 1]) / 9
+PESOS_3X3_EXTREMO = np.array([5, 11, 11]) / 27          # último año (y al revés, el primero)
+PESOS_3X3_PENULTIMO = np.array([3, 7, 10, 7]) / 27      # penúltimo año (y al revés, el segundo)
+PESOS_HENDERSON_5 = np.array([-21, 84, 160, 84, -21]) / 286
+
+MULTIPLICATIVO = "multiplicativo"
+ADITIVO = "aditivo"
+
+
+# ==== FILTROS (todos sobre el último eje: lote × tiempo) =====================
+
+def _convolucion(a: np.ndarray, pesos: np.ndarray) -> np.ndarray:
+    """Filtro simétrico en las posiciones donde cabe completo (len - len(pesos) + 1)."""
+    m = len(pesos)
+    n = a.shape[-1] - m + 1
+    return sum(pesos[k] * a[..., k:k + n] for k in range(m))
+
+
+def _media_2x4(a: np.ndarray) -> np.ndarray:
+    """2x4 centrada; los dos trimestres de cada extremo repiten el último valor centrado."""
+    out = np.empty_like(a)
+    out[..., 2:-2] = _convolucion(a, PESOS_2X4)
+    out[..., :2] = out[..., 2:3]
+    out[..., -2:] = out[..., -3:-2]
+    return out
+
+
+def _henderson_5(a: np.ndarray) -> np.ndarray:
+    """Henderson de 5 términos; en los extremos, pesos truncados y renormalizados."""
+    m = len(PESOS_HENDERSON_5) // 2
+    relleno = np.pad(a, [(0, 0)] * (a.ndim - 1) + [(m, m)])
+    cuenta = np.pad(np.ones(a.shape[-1]), m)
+    return _convolucion(relleno, PESOS_HENDERSON_5) / _convolucion(cuenta, PESOS_HENDERSON_5)
+
+
+def _media_3x3(sub: np.ndarray) -> np.ndarray:
+    """3x3 sobre los años de un mismo trimestre, con los pesos de extremo de X-11."""
+    out = np.empty_like(sub)
+    out[..., 2:-2] = _convolucion(sub, PESOS_3X3)
+    out[..., 0] = sub[..., 2::-1] @ PESOS_3X3_EXTREMO
+    out[..., 1] = sub[..., 3::-1] @ PESOS_3X3_PENULTIMO
+    out[..., -1] = sub[..., -3:] @ PESOS_3X3_EXTREMO
+    out[..., -2] = sub[..., -4:] @ PESOS_3X3_PENULTIMO
+    return out
+
+
+def _factores(si: np.ndarray, quitar) -> np.ndarray:
+    """Factores estacionales a partir de las razones (o diferencias) serie/tendencia."""
+    crudos = np.empty_like(si)
+    for q in range(4):
+        crudos[..., q::4] = _media_3x3(si[..., q::4])
+    return quitar(crudos, _media_2x4(crudos))
+
+
+def descomponer(y: np.ndarray, modo: str) -> np.ndarray:
+    """
+    y[lote, t] (trimestres consecutivos, sin NaN, t >= MIN_TRIMESTRES) ->
+    arreglo [3, lote, t] con (valor_sa, factor, tendencia).
+    """
+    quitar = np.divide if modo == MULTIPLICATIVO else np.subtract
+    y = np.asarray(y, dtype=float)
+    factor = _factores(quitar(y, _media_2x4(y)), quitar)
+    tendencia = _henderson_5(quitar(y, factor))
+    factor = _factores(quitar(y, tendencia), quitar)
+    return np.stack([quitar(y, factor), factor, tendencia])
+
+
+def _descomponer_bloque(args) -> np.ndarray:
+    return descomponer(*args)
+
+
+# ==== SERIES ================================================================
+# serie     = (fechas datetime64[ns], valores float64), trimestres consecutivos sin NaN
+# resultado = (fechas, arreglo [4, t] con CAMPOS, modo)
+
+CAMPOS = ["valor", "valor_sa", "factor", "tendencia"]
+
+
+def modo_serie(y: np.ndarray) -> str:
+    return MULTIPLICATIVO if (y > 0).all() else ADITIVO
+
+
+def trimestres_consecutivos(fechas) -> bool:
+    fechas = pd.DatetimeIndex(fechas)
+    q = fechas.year * 4 + fechas.quarter
+    return bool((np.diff(q) == 1).all())
+
+
+def _agregar(series: dict, serie_id: str, fechas, y) -> bool:
+    """
+    Guarda la serie si es ajustable (trimestres consecutivos, al menos MIN_TRIMESTRES).
+    Los ceros al inicio o al final son trimestres sin publicar (clean_meitef.py rellena
+    los NaN con 0) y se quitan.
+    """
+    y = np.asarray(y, dtype=float)
+    con_dato = np.flatnonzero(y != 0)
+    if len(con_dato) == 0:
+        return False
+    fechas, y = fechas[con_dato[0]:con_dato[-1] + 1], y[con_dato[0]:con_dato[-1] + 1]
+    if len(y) < MIN_TRIMESTRES or not trimestres_consecutivos(fechas):
+        return False
+    series[serie_id] = (np.asarray(fechas, dtype="datetime64[ns]"), y)
+    return True
+
+
+def series_tidy(df: pd.DataFrame) -> tuple[dict, int]:
+    """
+    Series trimestrales (T1..T4) de cada indicador × metric × estado del tidy, con id
+    "indicador | metric | estado". Devuelve también cuántas se omiten.
+    """
+    cubo = CuboMeitef.desde_tidy(df)
+    trimestres = cubo.periodos_trimestrales()
+    series, omitidas = {}, 0
+    for indicador, metric in cubo.pares:
+        panel = cubo.panel(indicador, metric, periodo=trimestres)
+        fechas = panel.columns.to_numpy()
+        for estado, fila in zip(panel.index, panel.to_numpy()):
+            ok = ~np.isnan(fila)
+            if not _agregar(series, f"{indicador} | {metric} | {estado}", fechas[ok], fila[ok]):
+                omitidas += 1
+    return series, omitidas
+
+
+def series_fiscales(paths) -> dict:
+    """Cada columna de los CSV trimestrales (Fecha como índice), con id "<archivo> | <columna>"."""
+    series = {}
+    for path in paths:
+        if not path.exists():
+            print(f"ADVERTENCIA: no encontré {path}; corre primero su ETL.")
+            continue
+        df = pd.read_csv(path, parse_dates=["Fecha"], index_col="Fecha").sort_index()
+        for col in df.columns:
+            serie = df[col].dropna()
+            if not _agregar(series, f"{path.stem} | {col}", serie.index, serie.to_numpy()):
+                print(f"ADVERTENCIA: {path.name} / {col} no es trimestral continua; no se ajusta.")
+    return series
+
+
+# ==== CACHÉ =================================================================
+
+def path_cache() -> Path:
+    return CACHE_DIR / f"ajuste_estacional_v{AJUSTE_VERSION}.parquet"
+
+
+def cargar_cache() -> dict:
+    """{id: resultado} de la corrida anterior (vacío si no hay caché)."""
+    path = path_cache()
+    if not USE_CACHE or importlib.util.find_spec("pyarrow") is None or not path.exists():
+        return {}
+    largo = pd.read_parquet(path)
+    ids = largo["serie"].to_numpy()
+    cortes = np.flatnonzero(ids[1:] != ids[:-1]) + 1        # se guardó serie por serie
+    fechas = largo["fecha"].to_numpy(dtype="datetime64[ns]")
+    valores = largo[CAMPOS].to_numpy(dtype=float).T
+    modos = largo["modo"].to_numpy()
+    cache = {}
+    for i, j in zip(np.r_[0, cortes], np.r_[cortes, len(largo)]):
+        cache[ids[i]] = (fechas[i:j], valores[:, i:j], modos[i])
+    return cache
+
+
+def guardar_cache(resultados: dict):
+    if not USE_CACHE or importlib.util.find_spec("pyarrow") is None or not resultados:
+        return
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    largos = [len(f) for f, _, _ in resultados.values()]
+    largo = pd.DataFrame({
+        "serie": np.repeat(list(resultados), largos),
+        "modo": np.repeat([m for _, _, m in resultados.values()], largos),
+        "fecha": np.concatenate([f for f, _, _ in resultados.values()]),
+    })
+    largo[CAMPOS] = np.concatenate([v for _, v, _ in resultados.values()], axis=1).T
+    tmp = path_cache().with_suffix(".tmp")
+    largo.to_parquet(tmp, index=False)
+    tmp.replace(path_cache())
+
+
+def primer_cambio(anterior: tuple, fechas: np.ndarray, y: np.ndarray) -> int:
+    """Posición del primer trimestre distinto al guardado (la longitud común si no hay)."""
+    fechas_ant, valores_ant, _ = anterior
+    n = min(len(fechas_ant), len(fechas))
+    if n == 0 or fechas_ant[0] != fechas[0]:
+        return 0
+    distinto = np.flatnonzero(valores_ant[0, :n] != y[:n])
+    return int(distinto[0]) if len(distinto) else n
+
+
+# ==== AJUSTE POR LOTES ======================================================
+
+def ajustar(series: dict, cache: dict, workers: int = WORKERS) -> tuple[dict, dict]:
+    """Descomposición de todas las `series` reutilizando `cache`: ({id: resultado}, conteo por tipo)."""
+    resultados, tareas = {}, []
+    conteo = {"sin cambios": 0, "incrementales": 0, "completas": 0}
+    for serie_id, (fechas, y) in series.items():
+        modo = modo_serie(y)
+        anterior = cache.get(serie_id)
+        inicio = 0
+        if anterior is not None and anterior[2] == modo:
+            cambio = primer_cambio(anterior, fechas, y)
+            if cambio == len(anterior[0]) == len(fechas):
+                resultados[serie_id] = anterior
+                conteo["sin cambios"] += 1
+                continue
+            inicio = max(0, cambio - 2 * RADIO)
+        conteo["incrementales" if inicio > 0 else "completas"] += 1
+        tareas.append((serie_id, inicio, modo))
+
+    # bloques: misma longitud de ventana y modo, de a LOTE series
+    grupos = {}
+    for serie_id, inicio, modo in tareas:
+        grupos.setdefault((len(series[serie_id][1]) - inicio, modo), []).append((serie_id, inicio))
+    bloques, miembros = [], []
+    for (_, modo), lista in grupos.items():
+        for k in range(0, len(lista), LOTE):
+            parte = lista[k:k + LOTE]
+            bloques.append((np.stack([series[s][1][i:] for s, i in parte]), modo))
+            miembros.append((parte, modo))
+
+    if workers > 1 and len(bloques) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(bloques))) as ex:
+            salidas = list(ex.map(_descomponer_bloque, bloques))
+    else:
+        salidas = [_descomponer_bloque(b) for b in bloques]
+
+    for (parte, modo), salida in zip(miembros, salidas):
+        for fila, (serie_id, inicio) in enumerate(parte):
+            fechas, y = series[serie_id]
+            valores = np.empty((len(CAMPOS), len(y)))
+            valores[0] = y
+            if inicio > 0:
+                # se conserva lo guardado antes del alcance del primer cambio
+                conservar = inicio + RADIO
+                valores[1:, :conservar] = cache[serie_id][1][1:, :conservar]
+                valores[1:, conservar:] = salida[:, fila, RADIO:]
+            else:
+                valores[1:] = salida[:, fila]
+            resultados[serie_id] = (fechas, valores, modo)
+    return resultados, conteo
+
+
+# ==== SALIDAS ===============================================================
+
+def tidy_con_ajuste(df: pd.DataFrame, resultados: dict) -> pd.DataFrame:
+    """Tidy con valor_sa y factor_estacional en las filas T1..T4 de las series ajustadas."""
+    df = df.drop(columns=COLUMNAS_AJUSTE, errors="ignore")
+    del_tidy = {s: r for s, r in resultados.items() if s.count(" | ") == 2}
+    if not del_tidy:
+        df[COLUMNAS_AJUSTE] = np.nan
+        return df
+    largos = [len(f) for f, _, _ in del_tidy.values()]
+    llaves = pd.MultiIndex.from_arrays([
+        np.repeat(list(del_tidy), largos),
+        np.concatenate([f for f, _, _ in del_tidy.values()]),
+    ])
+    ajuste = np.concatenate([v[1:3] for _, v, _ in del_tidy.values()], axis=1).T   # valor_sa, factor
+
+    serie = df["indicador"].astype(str) + " | " + df["metric"].astype(str) + " | " + df["estado"].astype(str)
+    pos = llaves.get_indexer(pd.MultiIndex.from_arrays([serie, pd.to_datetime(df["fecha"])]))
+    trimestral = df["periodo"].astype(str).str.fullmatch(r"T[1-4][PR]?").to_numpy()
+    ok = (pos >= 0) & trimestral
+    valores = np.full((len(df), len(COLUMNAS_AJUSTE)), np.nan)
+    valores[ok] = ajuste[pos[ok]]
+    df[COLUMNAS_AJUSTE] = valores
+    return df
+
+
+def escribir_fiscales(paths, resultados: dict):
+    for path in paths:
+        cols = {}
+        for serie_id, (fechas, valores, _) in resultados.items():
+            archivo, _, col = serie_id.partition(" | ")
+            if archivo == path.stem:
+                cols[col] = pd.Series(valores[1], index=pd.DatetimeIndex(fechas))
+        if not cols:
+            continue
+        out_file = path.with_name(f"{path.stem}_desestacionalizada.csv")
+        pd.DataFrame(cols).rename_axis("Fecha").to_csv(out_file)
+        print(f"  -> Guardado: {out_file}")
+
+
+# ==== EJECUCIÓN ==============================================================
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    print(f"Leyendo tidy de {TIDY_DIR} ...")
+    df_all = cargar_meitef(TIDY_DIR)
+    series, omitidas = series_tidy(df_all)
+    series.update(series_fiscales(PATHS_FISCALES))
+    print(f"  {len(series):,} series trimestrales ({omitidas} del tidy se omiten: huecos o < {MIN_TRIMESTRES} trimestres)")
+
+    cache = cargar_cache()
+    resultados, conteo = ajustar(series, cache, WORKERS)
+    print("  " + ", ".join(f"{n} {k}" for k, n in conteo.items()) + f" (workers={WORKERS})")
+    guardar_cache(resultados)
+
+    df_ajustado = tidy_con_ajuste(df_all, resultados)
+    if importlib.util.find_spec("pyarrow") is not None:
+        out_file = escribir_tidy(df_ajustado, TIDY_DIR / PARQUET_NAME)
+    else:
+        out_file = TIDY_DIR / CSV_NAME
+        df_ajustado.to_csv(out_file, index=False, encoding="utf-8-sig")
+    print(f"  -> Guardado: {out_file} (con {', '.join(COLUMNAS_AJUSTE)})")
+
+    escribir_fiscales(PATHS_FISCALES, resultados)
+    print(f"Listo en {time.perf_counter() - t0:.1f} s")
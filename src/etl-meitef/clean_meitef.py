@@ -5,17 +5,48 @@ Formatea los excels en tablas tidy listas para usar con pandas.
 
 Además:
 - Para remuneraciones (MEITEF_79.xlsx) se generan valores a precios de 2018
-  usando el "Índice de precios implícitos base 2018=100" que viene en MEITEF_14.
+  usando el "Índice de precios implícitos base 2018=100" que viene en MEITEF_14
+  (deflactor.py: matriz estado × periodo y gather, sin merges).
+
+Estructura:
+- No hay filas fijas: en una sola pasada sobre la hoja se detectan la fila de periodos
+  (T1..T4, 6/9 Meses, Anual), la de años (arriba de ella) y cada bloque (un título sin
+  valores seguido de sus renglones de estados). Todos los bloques se pasan a formato
+  largo con un solo reshape de NumPy.
+- Cualquier otro MEITEF_*.xlsx que aparezca en RAW_DIR se procesa igual (indicador =
+  nombre del archivo), sin tocar el código.
+- Además de los CSV se publica meitef_comercio_informal_tidy_ALL.parquet (tipado,
+  ordenado; ver src/meitef_store.py), que es lo que leen los scripts de análisis.
+
+Rendimiento:
+- Los excels se leen con un lector XLSX de solo lectura (streaming sobre el XML de la
+  hoja); si está instalado python-calamine se usa ése. openpyxl queda como respaldo.
+- El tidy de cada excel se guarda en CACHE_DIR (Parquet) con una llave que combina el
+  hash del archivo, el indicador y PARSER_VERSION. Mientras el excel no cambie, la
+  siguiente corrida lo lee de la caché.
 
 Requisitos:
     pip install pandas openpyxl
+    (opcionales) pip install pyarrow python-calamine
 """
 
 from pathlib import Path
 import re
+import sys
+import json
+import zipfile
+import hashlib
+import importlib.util
+import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
 from pandas.tseries.offsets import MonthEnd
 
+from deflactor import IndicePrecios, deflactar_tidy, filtrar_ipi
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # src/: meitef_store.py
+from meitef_store import PARQUET_NAME, escribir_tidy
+
 # ==== RUTAS BÁSICAS (AJUSTA SI CAMBIAS CARPETAS) ============================
 BASE_DIR = Path(
     r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\UNAM-INEGI\data"
@@ -25,14 +56,21 @@ OUT_DIR = BASE_DIR / "meitef_tidy"   # nueva carpeta de salida dentro de data
 OUT_DIR.mkdir(exist_ok=True)
 
 # ==== PARÁMETROS DE ESTRUCTURA DEL EXCEL ====================================
-# Fila 5 en Excel (años) -> índice 4 en pandas
-ROW_YEAR = 4
-# Fila 6 en Excel (T1, T2, T3, T4, 6 meses, 9 meses, Anual) -> índice 5
-ROW_PERIOD = 5
-
-# Número de renglones de estados (México + 32 entidades)
+# Renglones esperados por bloque (México + 32 entidades); sólo se usa para avisar
 N_ESTADOS = 33
 
+# ==== CACHÉ Y LECTURA DEL EXCEL =============================================
+CACHE_DIR = OUT_DIR / "_cache"   # ignorado en git (.gitignore): solo caché local
+USE_CACHE = True
+# "auto" = calamine si está instalado, si no "stream"; también "stream", "calamine", "openpyxl"
+XLSX_ENGINE = "auto"
+# Súbelo si cambia la lógica de procesar_meitef (invalida la caché)
+PARSER_VERSION = 2
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
 
 def periodo_to_month(periodo: str) -> int | None:
     """
@@ -80,110 +118,262 @@ def clean_anio_value(anio):
     return pd.NA
 
 
-def procesar_meitef(path_xlsx: Path, indicador: str, title_rows_excel: list[int]) -> pd.DataFrame:
+# ==== LECTURA RÁPIDA DEL EXCEL ==============================================
+
+def columna_a_indice(ref: str) -> int:
+    """'A1' -> 0, 'AB12' -> 27 (sólo importan las letras)."""
+    n = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        n = n * 26 + (ord(ch.upper()) - 64)
+    return n - 1
+
+
+def _texto(elem) -> str:
+    """Texto de un <si>/<is> (incluye los fragmentos con formato <r><t>)."""
+    return "".join(t.text or "" for t in elem.iter(f"{NS_MAIN}t"))
+
+
+def _primera_hoja(zf: zipfile.ZipFile) -> str:
+    """Ruta dentro del zip de la primera hoja del libro (la que lee pd.read_excel por defecto)."""
+    wb = ET.fromstring(zf.read("xl/workbook.xml"))
+    rid = wb.find(f"{NS_MAIN}sheets/{NS_MAIN}sheet").get(f"{NS_REL}id")
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(f"{NS_PKG_REL}Relationship"):
+        if rel.get("Id") == rid:
+            target = rel.get("Target")
+            return target.lstrip("/") if target.startswith("/") else "xl/" + target
+    raise ValueError("No encontré la primera hoja en xl/workbook.xml")
+
+
+def _valor_celda(c, shared: list[str]):
+    """Valor de una celda <c> con las mismas conversiones que pandas+openpyxl."""
+    t = c.get("t", "n")
+    if t == "inlineStr":
+        is_ = c.find(f"{NS_MAIN}is")
+        return _texto(is_) if is_ is not None else np.nan
+    v = c.find(f"{NS_MAIN}v")
+    if v is None or v.text is None:
+        return np.nan
+    if t == "s":
+        return shared[int(v.text)]
+    if t == "str":
+        return v.text
+    if t == "b":
+        return v.text == "1"
+    if t == "e":
+        return np.nan
+    x = float(v.text)
+    return int(x) if x.is_integer() else x
+
+
+def leer_xlsx_stream(path_xlsx: Path, filas: set[int] | None = None) -> pd.DataFrame:
     """
-    Lee un archivo MEITEF_xxx.xlsx y devuelve un DataFrame tidy con:
-
-    columnas: [estado, anio, periodo, fecha, metric, indicador, fuente, valor]
-    donde:
-        - 'metric' es el nombre de la tabla (p.ej. 'Millones de pesos a precios de 2018')
-        - 'indicador' es VAB / remuneraciones / puestos (lo pasas como argumento)
-        - 'fecha' es el último día del mes correspondiente al periodo.
+    Lector XLSX de solo lectura: recorre el XML de la primera hoja en streaming, guarda
+    sólo las celdas de `filas` (todas si es None) y se detiene después de la última.
+    Devuelve un DataFrame posicional como pd.read_excel(header=None) (las filas no
+    pedidas quedan en NaN).
     """
+    ultima = max(filas) if filas else None
+    celdas = {}
+    with zipfile.ZipFile(path_xlsx) as zf:
+        shared = []
+        if "xl/sharedStrings.xml" in zf.namelist():
+            with zf.open("xl/sharedStrings.xml") as fh:
+                for _, elem in ET.iterparse(fh):
+                    if elem.tag == f"{NS_MAIN}si":
+                        shared.append(_texto(elem))
+                        elem.clear()
+        with zf.open(_primera_hoja(zf)) as fh:
+            for _, elem in ET.iterparse(fh):
+                if elem.tag != f"{NS_MAIN}row":
+                    continue
+                r = int(elem.get("r")) - 1
+                if filas is None or r in filas:
+                    for j, c in enumerate(elem.iter(f"{NS_MAIN}c")):
+                        ref = c.get("r")
+                        col = columna_a_indice(ref) if ref else j
+                        val = _valor_celda(c, shared)
+                        if not (isinstance(val, float) and np.isnan(val)):
+                            celdas[(r, col)] = val
+                elem.clear()
+                if ultima is not None and r >= ultima:
+                    break
+
+    n_filas = (ultima if ultima is not None else max((r for r, _ in celdas), default=-1)) + 1
+    n_cols = max((col for _, col in celdas), default=-1) + 1
+    datos = np.full((n_filas, n_cols), np.nan, dtype=object)
+    for (r, col), val in celdas.items():
+        datos[r, col] = val
+    return pd.DataFrame(datos)
+
+
+def leer_tabulado(path_xlsx: Path, filas: set[int] | None = None, engine: str = XLSX_ENGINE) -> pd.DataFrame:
+    """Primera hoja del excel sin encabezados (hasta la última de `filas` si se indica)."""
+    if engine == "auto":
+        engine = "calamine" if importlib.util.find_spec("python_calamine") else "stream"
+    if engine == "stream":
+        return leer_xlsx_stream(path_xlsx, filas)
+    if engine in ("calamine", "openpyxl"):
+        nrows = max(filas) + 1 if filas else None
+        return pd.read_excel(path_xlsx, header=None, engine=engine, nrows=nrows)
+    raise ValueError(f"XLSX_ENGINE desconocido: {engine}")
+
+
+# ==== CACHÉ DE TIDY POR EXCEL ===============================================
+
+def hash_archivo(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for bloque in iter(lambda: fh.read(chunk), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def llave_cache(path_xlsx: Path, indicador: str) -> str:
+    """Hash del excel + parámetros de lectura: si cualquiera cambia, la caché no aplica."""
+    params = {
+        "sha256": hash_archivo(path_xlsx),
+        "fuente": path_xlsx.name,
+        "indicador": indicador,
+        "version": PARSER_VERSION,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def procesar_meitef_cache(path_xlsx: Path, indicador: str) -> pd.DataFrame:
+    """
+    procesar_meitef con caché en disco: CACHE_DIR/<excel>_<llave>.parquet. Si no hay
+    pyarrow (o USE_CACHE=False) se procesa el excel directamente.
+    """
+    if not USE_CACHE or importlib.util.find_spec("pyarrow") is None:
+        return procesar_meitef(path_xlsx, indicador)
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    llave = llave_cache(path_xlsx, indicador)
+    path_cache = CACHE_DIR / f"{path_xlsx.stem}_{llave}.parquet"
+    if path_cache.exists():
+        print(f"  -> Caché: {path_cache.name}")
+        return pd.read_parquet(path_cache)
+
+    df = procesar_meitef(path_xlsx, indicador)
+    for viejo in CACHE_DIR.glob(f"{path_xlsx.stem}_*.parquet"):   # versiones anteriores del excel
+        viejo.unlink()
+    tmp = path_cache.with_suffix(".tmp")
+    df.to_parquet(tmp, index=False)
+    tmp.replace(path_cache)
+    return df
 
-    # Leemos TODO el archivo sin encabezados (para controlar los títulos a mano)
-    df_raw = pd.read_excel(path_xlsx, header=None, engine="openpyxl")
-
-    # Columnas útiles (desde B en adelante, donde están T1, T2, ... Anual)
-    valid_cols = [
-        c for c in df_raw.columns[1:]
-        if pd.notna(df_raw.iloc[ROW_PERIOD, c])
-    ]
-
-    # Fila de años (con merges) y fila de trimestres / acumulados
-    year_row = df_raw.iloc[ROW_YEAR, valid_cols].ffill()  # rellenamos merges hacia la derecha
-    period_row = df_raw.iloc[ROW_PERIOD, valid_cols]
-
-    # MultiIndex columnas (anio, periodo) para poder hacer un stack elegante
-    cols_multi = pd.MultiIndex.from_arrays(
-        [year_row.to_numpy(), period_row.to_numpy()],
-        names=["anio", "periodo"],
-    )
-
-    registros = []
-
-    for title_row_excel in title_rows_excel:
-        # title_row_excel: fila de Excel donde está el título de la tabla (1-based)
-        title_idx = title_row_excel - 1      # a índice 0-based
-        start_idx = title_row_excel          # primera fila de estados (1 fila abajo del título)
-
-        metric_name = str(df_raw.iloc[title_idx, 0]).strip()
-
-        # Bloque de estados para esa tabla (México + 32 entidades)
-        sub = df_raw.iloc[start_idx:start_idx + N_ESTADOS, :]
 
-        # Si por alguna razón está vacío, lo brincamos
-        if sub.iloc[:, 0].isna().all():
-            continue
+# ==== DETECCIÓN DE BLOQUES ==================================================
 
-        # Nombre de los estados (columna A)
-        estados = (
-            sub.iloc[:, 0]
-               .astype(str)
-               .str.strip()
-               .replace({"": pd.NA})
-        )
+def _no_vacio(valores: np.ndarray) -> np.ndarray:
+    """Celdas con algo: ni NaN ni texto en blanco."""
+    lleno = ~pd.isna(valores)
+    texto = np.array([isinstance(v, str) for v in valores.ravel()]).reshape(valores.shape)
+    blanco = np.zeros(valores.shape, dtype=bool)
+    blanco[texto] = [not v.strip() for v in valores[texto]]
+    return lleno & ~blanco
 
-        # Valores numéricos (columnas B en adelante)
-        sub_vals = sub.loc[:, valid_cols].copy()
-        sub_vals.columns = cols_multi
 
-        # Pasamos de wide (muchas columnas de años/trimestres) a long/tidy
-        long = (
-            sub_vals
-              .stack(level=[0, 1], future_stack=True)  # nueva implementación de stack
-              .reset_index()
-        )
+def detectar_encabezado(raw: np.ndarray) -> tuple[int, int]:
+    """
+    (fila de años, fila de periodos), 0-based. La de periodos es la primera donde la
+    mayoría de las celdas (columna B en adelante) son T1..T4 / 6 Meses / 9 Meses / Anual;
+    la de años es la más cercana arriba de ella que traiga un año de 4 dígitos.
+    """
+    for r in range(raw.shape[0]):
+        celdas = [v for v in raw[r, 1:] if pd.notna(v)]
+        n_per = sum(periodo_to_month(v) is not None for v in celdas)
+        if n_per >= 2 and n_per * 2 >= len(celdas):
+            for ry in range(r - 1, -1, -1):
+                if any(re.search(r"\d{4}", str(v)) for v in raw[ry, 1:] if pd.notna(v)):
+                    return ry, r
+            raise ValueError(f"No encontré la fila de años arriba de la fila {r + 1}")
+    raise ValueError("No encontré la fila de periodos (T1, T2, ..., Anual)")
+
+
+def detectar_bloques(raw: np.ndarray, valid_cols: np.ndarray, row_period: int):
+    """
+    Barrido único de la hoja debajo del encabezado: un título es un renglón con texto en
+    la columna A y sin valores; los renglones siguientes con texto y valores son sus
+    estados. Títulos sin renglones (notas al pie) se descartan.
 
-        long = long.rename(columns={"level_0": "row_id", 0: "valor"})
+    Devuelve (filas de estados, bloque de cada fila, fila del título de cada bloque).
+    """
+    filas = np.arange(row_period + 1, raw.shape[0])
+    con_nombre = _no_vacio(raw[filas, 0])
+    con_valores = _no_vacio(raw[np.ix_(filas, valid_cols)]).any(axis=1)
 
-        # row_id es el índice de fila original; lo pasamos a 0..32 para mapear estados
-        long["row_id"] = long["row_id"] - start_idx
-        long["estado"] = estados.iloc[long["row_id"]].values
-        long.drop(columns=["row_id"], inplace=True)
+    es_titulo = con_nombre & ~con_valores
+    bloque = np.cumsum(es_titulo) - 1                   # título vigente de cada renglón
+    es_estado = con_nombre & con_valores & (bloque >= 0)
 
-        # Metadatos
-        long["metric"] = metric_name                       # nombre de la tabla
-        long["indicador"] = indicador                      # VAB / remuneraciones / puestos
-        long["fuente"] = path_xlsx.name                    # nombre del archivo
+    titulos = filas[es_titulo]
+    usados, bloque_estado = np.unique(bloque[es_estado], return_inverse=True)
+    return filas[es_estado], bloque_estado, titulos[usados]
 
-        registros.append(long)
 
-    # Unimos todas las tablas de ese archivo
-    df = pd.concat(registros, ignore_index=True)
+def procesar_meitef(path_xlsx: Path, indicador: str) -> pd.DataFrame:
+    """
+    Lee un archivo MEITEF_xxx.xlsx y devuelve un DataFrame tidy con:
 
-    # Limpieza y tipos
-    df["anio"] = df["anio"].apply(clean_anio_value).astype("Int64")
-    df["valor"] = pd.to_numeric(df["valor"], errors="coerce")
+    columnas: [estado, anio, periodo, fecha, metric, indicador, fuente, valor]
+    donde:
+        - 'metric' es el nombre de la tabla (p.ej. 'Millones de pesos a precios de 2018')
+        - 'indicador' es VAB / remuneraciones / puestos (lo pasas como argumento)
+        - 'fecha' es el último día del mes correspondiente al periodo.
 
-    # Quitamos filas sin estado o sin año (ya limpio)
-    df = df.dropna(subset=["estado", "anio"])
+    Los bloques (título + estados) y el encabezado de años/periodos se detectan solos.
+    """
 
-    # ====== CÁLCULO DE LA FECHA (FIN DE MES) ================================
-    df["periodo_str"] = df["periodo"].astype(str)
-    df["mes"] = df["periodo_str"].apply(periodo_to_month)
+    # Leemos TODA la hoja sin encabezados; la estructura se detecta sobre el arreglo crudo
+    raw = leer_tabulado(path_xlsx).to_numpy(dtype=object)
+    row_year, row_period = detectar_encabezado(raw)
 
-    df["fecha"] = pd.to_datetime(
-        {
-            "year": df["anio"].astype("int64"),
-            "month": df["mes"].astype("int64"),
-            "day": 1,
-        },
+    # Columnas útiles (desde B en adelante, donde están T1, T2, ... Anual)
+    valid_cols = 1 + np.flatnonzero(pd.notna(raw[row_period, 1:]))
+
+    # Fila de años (con merges, se rellenan hacia la derecha) y de trimestres / acumulados
+    year_row = pd.Series(raw[row_year, valid_cols]).ffill()
+    anio_col = pd.array(year_row.map(clean_anio_value), dtype="Int64")
+    period_col = raw[row_period, valid_cols]
+
+    filas, bloque, titulos = detectar_bloques(raw, valid_cols, row_period)
+    if len(filas) == 0:
+        raise ValueError(f"{path_xlsx.name}: no encontré bloques de estados")
+
+    por_bloque = np.bincount(bloque, minlength=len(titulos))
+    for t, n in zip(titulos, por_bloque):
+        if n != N_ESTADOS:
+            print(f"ADVERTENCIA: {path_xlsx.name}, tabla de la fila {t + 1}: {n} renglones (se esperaban {N_ESTADOS}).")
+
+    # Fecha (fin de mes) por columna: se calcula una vez y se repite para cada renglón
+    mes_col = pd.array([periodo_to_month(str(p)) for p in period_col], dtype="Int64")
+    fecha_col = pd.to_datetime(
+        {"year": anio_col, "month": mes_col, "day": np.ones(len(valid_cols), dtype=int)},
         errors="coerce",
     ) + MonthEnd(0)
 
-    # Orden de columnas base
-    df = df[["estado", "anio", "periodo", "fecha", "metric", "indicador", "fuente", "valor"]]
+    # Un solo reshape para todos los bloques: renglón × columna -> formato largo
+    n_filas, n_cols = len(filas), len(valid_cols)
+    metric_bloque = np.array([str(raw[t, 0]).strip() for t in titulos], dtype=object)
+    estados = np.array([str(v).strip() for v in raw[filas, 0]], dtype=object)
+
+    df = pd.DataFrame({
+        "estado": np.repeat(estados, n_cols),
+        "anio": pd.array(np.tile(anio_col, n_filas), dtype="Int64"),
+        "periodo": np.tile(period_col, n_filas),
+        "fecha": np.tile(fecha_col.to_numpy(), n_filas),
+        "metric": np.repeat(metric_bloque[bloque], n_cols),
+        "indicador": indicador,                         # VAB / remuneraciones / puestos
+        "fuente": path_xlsx.name,                       # nombre del archivo
+        "valor": pd.to_numeric(raw[np.ix_(filas, valid_cols)].ravel(), errors="coerce"),
+    })
+
+    # Quitamos columnas sin año (ya limpio)
+    df = df.dropna(subset=["anio"]).reset_index(drop=True)
 
     return df
 
@@ -211,97 +401,48 @@ def deflactar_remuneraciones_con_ipi(
         na=False,
     )
 
-    df_nom = df_rem.loc[mask_nom].copy()
-
-    if df_nom.empty:
+    if not mask_nom.any():
         print("ADVERTENCIA: no encontré 'Millones de pesos a precios corrientes' en remuneraciones.")
         return df_rem
 
-    df_nom = df_nom[
-        ["estado", "anio", "periodo", "fecha", "indicador", "fuente", "valor"]
-    ].rename(columns={"valor": "remu_corriente"})
-
-    # 2. Preparar el índice de precios implícitos
-    df_ipi = df_ipi_raw.copy()
-    df_ipi = df_ipi[
-        ["estado", "anio", "periodo", "valor"]
-    ].rename(columns={"valor": "indice_precios"})
-
-    # IMPORTANTE: quitar duplicados en el deflactor para evitar MergeError
-    df_ipi = (
-        df_ipi
-        .dropna(subset=["estado", "anio", "periodo"])
-        .sort_values(["estado", "anio", "periodo"])
-        .drop_duplicates(subset=["estado", "anio", "periodo"], keep="first")
-    )
-
-    # 3. Merge por estado-anio-periodo
-    merge_cols = ["estado", "anio", "periodo"]
-
-    df_merged = df_nom.merge(
-        df_ipi,
-        on=merge_cols,
-        how="inner",          # sólo combinaciones donde hay deflactor
-        validate="many_to_one"  # varias remuneraciones podrían mapear a un solo deflactor
+    # 2. Matriz densa estado × periodo del índice (una sola vez) y gather por posición,
+    #    sin merge; las filas sin deflactor (o con índice 0) se descartan
+    indice = IndicePrecios.desde_tidy(df_ipi_raw)
+    df_def = deflactar_tidy(
+        df_rem,
+        indice,
+        mask_nom,
+        metric=(
+            "Remuneraciones a precios de 2018 "
+            "(deflactadas con Índice de precios implícitos del VAB)"
+        ),
     )
 
-    # 4. Limpiar NAs y ceros
-    df_merged = df_merged.dropna(subset=["remu_corriente", "indice_precios"])
-    df_merged = df_merged[df_merged["indice_precios"] != 0]
-
-    # 5. Cálculo a precios constantes de 2018
-    df_merged["valor"] = df_merged["remu_corriente"] * 100.0 / df_merged["indice_precios"]
-
-    df_merged["metric"] = (
-        "Remuneraciones a precios de 2018 "
-        "(deflactadas con Índice de precios implícitos del VAB)"
-    )
-
-    df_def = df_merged[
+    df_def = df_def[
         ["estado", "anio", "periodo", "fecha", "metric", "indicador", "fuente", "valor"]
     ]
 
-    # 6. Unimos con el df original de remuneraciones
+    # 3. Unimos con el df original de remuneraciones
     df_out = pd.concat([df_rem, df_def], ignore_index=True)
 
     return df_out
 
 
-# ==== CONFIGURACIÓN DE LOS 3 ARCHIVOS =======================================
+# ==== CONFIGURACIÓN DE LOS ARCHIVOS ========================================
+# Las tablas de cada excel se detectan solas; aquí sólo va el nombre del indicador.
+# MEITEF_14 (VAB) va primero porque de ahí sale el deflactor de las remuneraciones.
+# Cualquier otro MEITEF_*.xlsx en RAW_DIR se agrega al final con indicador = nombre.
 
 files_info = [
-    {
-        "filename": "MEITEF_14.xlsx",
-        "indicador": "vab_comercio_informal",
-        # Títulos de cada tabla (filas de Excel: 1-based)
-        # 7  = Millones de pesos a precios de 2018
-        # 41 = Participación porcentual (constantes)
-        # 75 = Índice volumen físico base 2018=100
-        # 109 = Variación porcentual anual del índice de volumen
-        # 143 = Contribución a la variación nacional (volumen)
-        # 177 = Millones de pesos a precios corrientes
-        # 211 = Participación porcentual en valores corrientes
-        # 245 = Índice de precios implícitos base 2018=100
-        # 279 = Variación porcentual del índice de precios implícitos
-        "title_rows_excel": [7, 41, 75, 109, 143, 177, 211, 245, 279],
-    },
-    {
-        "filename": "MEITEF_79.xlsx",
-        "indicador": "remuneraciones_comercio_informal",
-        # En este archivo sólo existen las primeras 5 tablas:
-        # 7   = Millones de pesos a precios corrientes
-        # 41  = Participación porcentual
-        # 75  = Índice de valor 2018=100
-        # 109 = Variación porcentual anual del índice de valor
-        # 143 = Contribución a la variación nacional del valor
-        "title_rows_excel": [7, 41, 75, 109, 143],
-    },
-    {
-        "filename": "MEITEF_144.xlsx",
-        "indicador": "puestos_trabajo_comercio_informal",
-        # Igual: primeras 5 tablas
-        "title_rows_excel": [7, 41, 75, 109, 143],
-    },
+    {"filename": "MEITEF_14.xlsx", "indicador": "vab_comercio_informal"},
+    {"filename": "MEITEF_79.xlsx", "indicador": "remuneraciones_comercio_informal"},
+    {"filename": "MEITEF_144.xlsx", "indicador": "puestos_trabajo_comercio_informal"},
+]
+conocidos = {info["filename"] for info in files_info}
+files_info += [
+    {"filename": p.name, "indicador": p.stem.lower()}
+    for p in sorted(RAW_DIR.glob("MEITEF_*.xlsx"))
+    if p.name not in conocidos
 ]
 
 # ==== EJECUCIÓN: GENERAR CSVs LIMPIOS =======================================
@@ -313,24 +454,15 @@ for info in files_info:
     path_xlsx = RAW_DIR / info["filename"]
     print(f"Procesando {path_xlsx} ...")
 
-    df_tidy = procesar_meitef(
+    df_tidy = procesar_meitef_cache(
         path_xlsx=path_xlsx,
         indicador=info["indicador"],
-        title_rows_excel=info["title_rows_excel"],
     )
 
     # Si es el VAB, extraemos el Índice de precios implícitos como deflactor
     if info["filename"] == "MEITEF_14.xlsx":
-        mask_ipi = df_tidy["metric"].str.contains(
-            "índice de precios implícitos",
-            case=False,
-            na=False,
-        ) | df_tidy["metric"].str.contains(
-            "indice de precios implicitos",
-            case=False,
-            na=False,
-        )
-        ipi_deflator_df = df_tidy.loc[mask_ipi].copy()
+        # el índice, no su "Variación porcentual del índice de precios implícitos"
+        ipi_deflator_df = filtrar_ipi(df_tidy).copy()
         if ipi_deflator_df.empty:
             print("ADVERTENCIA: no encontré 'Índice de precios implícitos base 2018=100' en MEITEF_14.")
 
@@ -356,3 +488,10 @@ df_total = pd.concat(all_df, ignore_index=True)
 out_master = OUT_DIR / "meitef_comercio_informal_tidy_ALL.csv"
 df_total.to_csv(out_master, index=False, encoding="utf-8-sig")
 print(f"\nArchivo maestro guardado en: {out_master}")
+
+# Versión columnar tipada (la que leen los scripts de análisis)
+if importlib.util.find_spec("pyarrow") is not None:
+    out_parquet = escribir_tidy(df_total, OUT_DIR / PARQUET_NAME)
+    print(f"Dataset columnar guardado en: {out_parquet}")
+else:
+    print("ADVERTENCIA: sin pyarrow no se genera el Parquet; los análisis leerán el CSV.")
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Deflactor / cambio de base para series nominales (MEITEF, SAT, IMSS).
+
+- IndicePrecios arma UNA vez una matriz densa [estado × periodo] con el índice de
+  precios (por defecto el "Índice de precios implícitos base 2018=100" del VAB que
+  viene en MEITEF_14). El eje de periodos es anio × casilla, con 7 casillas por año:
+  T1..T4, 6 Meses, 9 Meses y Anual (las marcas P/R de cifras preliminares/revisadas
+  se ignoran, 'T1P' cae en T1).
+- Deflactar cualquier serie es un gather O(n): estado y periodo se vuelven códigos
+  enteros y el índice se toma de la matriz por posición, sin merges.
+- rebase(anio): mismo índice con promedio trimestral del año base = 100.
+- encadenar(otro, anio_enlace): empalma dos índices (p.ej. de bases distintas) con el
+  traslape de un año; donde falta el índice propio se usa el otro reescalado.
+
+Uso como script: deflacta a precios de BASE_ANIO el VAB y las remuneraciones en
+precios corrientes del tidy ALL, y las series trimestrales de ISR/IVA (impuestos_etl.py)
+e IMSS (imss_etl.py) con el índice nacional.
+
+Requisitos:
+    pip install pandas numpy
+"""
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# ==== RUTAS BÁSICAS (AJUSTA SI CAMBIAS CARPETAS) ============================
+PROJECT_DIR = Path(
+    r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\UNAM-INEGI"
+)
+TIDY_DIR = PROJECT_DIR / "data" / "meitef_tidy"
+PATH_ALL = TIDY_DIR / "meitef_comercio_informal_tidy_ALL.csv"
+OUTPUT_DIR = PROJECT_DIR / "output"
+PATH_IMPUESTOS = OUTPUT_DIR / "impuestos_data_clean_trimestral.csv"
+PATH_IMSS = OUTPUT_DIR / "ingreso_obrero_patronal_trimestral.csv"
+
+# ==== PARÁMETROS ============================================================
+BASE_ANIO = 2018
+NACIONAL = "Estados Unidos Mexicanos"
+INDICADOR_IPI = "vab_comercio_informal"
+# Se buscan con y sin acentos
+METRIC_IPI = ["índice de precios implícitos", "indice de precios implicitos"]
+METRIC_CORRIENTES = "millones de pesos a precios corrientes"
+
+CASILLAS = ["T1", "T2", "T3", "T4", "6 Meses", "9 Meses", "Anual"]
+N_CASILLAS = len(CASILLAS)
+TRIMESTRES = np.arange(4)          # casillas T1..T4
+
+
+def codigo_periodo(periodo) -> np.ndarray:
+    """Texto del periodo -> casilla 0..6 (-1 si no se reconoce). Se evalúa una vez por valor distinto."""
+    codigos, uniques = pd.factorize(pd.Series(periodo, dtype=object), use_na_sentinel=True)
+    limpio = (
+        pd.Series(uniques, dtype=object).astype(str).str.strip().str.lower()
+          .str.replace(r"(?<=\d)\s*[pr]$", "", regex=True)   # 'T1P', 'T4R' -> 't1', 't4'
+    )
+    casilla = pd.Index([c.lower() for c in CASILLAS]).get_indexer(limpio)
+    return np.where(codigos >= 0, casilla[codigos], -1)
+
+
+class IndicePrecios:
+    """
+    Índice de precios denso [estado × (anio, casilla)]; NaN donde no hay dato (o es 0).
+    """
+
+    def __init__(self, estados, anio0: int, matriz: np.ndarray):
+        self.estados = pd.Index(estados)
+        self.anio0 = int(anio0)
+        self.matriz = matriz
+        self.n_anios = matriz.shape[1] // N_CASILLAS
+
+    # ---- construcción ------------------------------------------------------
+    @classmethod
+    def desde_tidy(cls, df: pd.DataFrame) -> "IndicePrecios":
+        """
+        Matriz a partir de filas tidy (estado, anio, periodo, valor) de un índice de precios.
+        Si hay duplicados de estado-anio-periodo se queda el primero.
+        """
+        df = df.dropna(subset=["estado", "anio", "periodo", "valor"])
+        fila, estados = pd.factorize(df["estado"])
+        anio = df["anio"].to_numpy(dtype=np.int64)
+        casilla = codigo_periodo(df["periodo"])
+        ok = casilla >= 0
+        anio0 = int(anio.min())
+        n_anios = int(anio.max()) - anio0 + 1
+
+        col = (anio - anio0) * N_CASILLAS + casilla
+        flat = fila * (n_anios * N_CASILLAS) + col
+        _, primero = np.unique(np.where(ok, flat, -1), return_index=True)
+        primero = primero[ok[primero]]
+
+        matriz = np.full((len(estados), n_anios * N_CASILLAS), np.nan)
+        valor = df["valor"].to_numpy(dtype=float)
+        matriz[fila[primero], col[primero]] = valor[primero]
+        matriz[matriz == 0] = np.nan
+        return cls(estados, anio0, matriz)
+
+    # ---- consulta ----------------------------------------------------------
+    def columnas(self, anio, casilla) -> np.ndarray:
+        """Columna de la matriz para (anio, casilla); -1 fuera de rango."""
+        anio = np.asarray(anio, dtype=np.int64)
+        casilla = np.asarray(casilla, dtype=np.int64)
+        rel = anio - self.anio0
+        ok = (rel >= 0) & (rel < self.n_anios) & (casilla >= 0)
+        return np.where(ok, rel * N_CASILLAS + casilla, -1)
+
+    def valores(self, estado, anio, periodo) -> np.ndarray:
+        """Índice para cada observación (gather sobre la matriz); NaN si no existe."""
+        fila = self.estados.get_indexer(pd.Index(estado))
+        col = self.columnas(anio, codigo_periodo(periodo))
+        ok = (fila >= 0) & (col >= 0)
+        out = np.full(len(fila), np.nan)
+        out[ok] = self.matriz[fila[ok], col[ok]]
+        return out
+
+    def promedio_anual(self, anio: int) -> np.ndarray:
+        """Promedio de T1..T4 del año por estado (NaN si el año no está)."""
+        col = self.columnas(np.full(4, anio), TRIMESTRES)
+        if (col < 0).any():
+            return np.full(len(self.estados), np.nan)
+        return _promedio_filas(self.matriz[:, col])
+
+    # ---- transformaciones --------------------------------------------------
+    def rebase(self, anio: int) -> "IndicePrecios":
+        """Cambia la base: promedio trimestral de `anio` = 100 en cada estado."""
+        prom = self.promedio_anual(anio)
+        if np.isnan(prom).all():
+            raise ValueError(f"El índice no tiene trimestres en {anio} para cambiar la base")
+        return IndicePrecios(self.estados, self.anio0, self.matriz * 100.0 / prom[:, None])
+
+    def encadenar(self, otro: "IndicePrecios", anio_enlace: int) -> "IndicePrecios":
+        """
+        Empalme por traslape: `otro` se reescala para que su promedio de `anio_enlace`
+        coincida con el de este índice y sólo se usa donde este índice no tiene dato.
+        """
+        estados = self.estados.union(otro.estados, sort=False)
+        anio0 = min(self.anio0, otro.anio0)
+        n_anios = max(self.anio0 + self.n_anios, otro.anio0 + otro.n_anios) - anio0
+        a = _alinear(self, estados, anio0, n_anios)
+        b = _alinear(otro, estados, anio0, n_anios)
+
+        col = (anio_enlace - anio0) * N_CASILLAS + TRIMESTRES
+        if col.min() < 0 or col.max() >= n_anios * N_CASILLAS:
+            raise ValueError(f"El año de enlace {anio_enlace} está fuera de ambos índices")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            factor = _promedio_filas(a[:, col]) / _promedio_filas(b[:, col])
+        factor = np.where(np.isfinite(factor), factor, np.nan)
+        return IndicePrecios(estados, anio0, np.where(np.isnan(a), b * factor[:, None], a))
+
+    # ---- deflactar ---------------------------------------------------------
+    def deflactar(self, valor, estado, anio, periodo, base: int | None = None) -> np.ndarray:
+        """valor_real = valor * 100 / índice (en la base pedida, o la del índice si base=None)."""
+        indice = self if base is None else self.rebase(base)
+        return np.asarray(valor, dtype=float) * 100.0 / indice.valores(estado, anio, periodo)
+
+
+def _promedio_filas(m: np.ndarray) -> np.ndarray:
+    """Promedio por renglón ignorando NaN (NaN si el renglón no tiene datos)."""
+    n = (~np.isnan(m)).sum(axis=1)
+    return np.where(n > 0, np.nansum(m, axis=1) / np.maximum(n, 1), np.nan)
+
+
+def _alinear(ind: IndicePrecios, estados: pd.Index, anio0: int, n_anios: int) -> np.ndarray:
+    """Matriz de `ind` sobre otro eje de estados/años (NaN donde no hay)."""
+    out = np.full((len(estados), n_anios * N_CASILLAS), np.nan)
+    fila = estados.get_indexer(ind.estados)
+    c0 = (ind.anio0 - anio0) * N_CASILLAS
+    out[fila, c0:c0 + ind.matriz.shape[1]] = ind.matriz
+    return out
+
+
+# ==== HELPERS PARA TIDY Y SERIES ============================================
+
+def filtrar_ipi(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Filas del índice de precios implícitos del VAB en un tidy MEITEF (el índice, no su
+    "Variación porcentual del índice de precios implícitos").
+    """
+    metric = df["metric"].str.strip().str.lower()
+    mask = metric.str.startswith(METRIC_IPI[0], na=False)
+    for texto in METRIC_IPI[1:]:
+        mask |= metric.str.startswith(texto, na=False)
+    if "indicador" in df.columns and (df["indicador"] == INDICADOR_IPI).any():
+        mask &= df["indicador"] == INDICADOR_IPI
+    return df.loc[mask]
+
+
+def deflactar_tidy(df: pd.DataFrame, indice: IndicePrecios, mask, metric: str,
+                   base: int | None = None) -> pd.DataFrame:
+    """
+    Filas `mask` del tidy deflactadas (mismas columnas, `metric` nuevo). Las que no
+    tienen índice se descartan, como en un inner join.
+    """
+    sub = df.loc[mask]
+    valor = indice.deflactar(sub["valor"], sub["estado"], sub["anio"], sub["periodo"], base)
+    ok = ~np.isnan(valor)
+    out = sub.loc[ok].copy()
+    out["valor"] = valor[ok]
+    out["metric"] = metric
+    return out
+
+
+def deflactar_serie(df: pd.DataFrame, indice: IndicePrecios, estado: str = NACIONAL,
+                    base: int | None = None) -> pd.DataFrame:
+    """
+    Columnas de un DataFrame trimestral con índice de fechas (fin de trimestre), p.ej.
+    ISR/IVA o IMSS, deflactadas con el índice del `estado` (nacional por defecto).
+    """
+    fechas = pd.DatetimeIndex(df.index)
+    casilla = fechas.quarter.to_numpy() - 1
+    base_ind = indice if base is None else indice.rebase(base)
+    fila = base_ind.estados.get_loc(estado)
+    col = base_ind.columnas(fechas.year.to_numpy(), casilla)
+    ipi = np.where(col >= 0, base_ind.matriz[fila, np.maximum(col, 0)], np.nan)
+    return df.mul(100.0 / ipi, axis=0)
+
+
+# ==== EJECUCIÓN ==============================================================
+
+if __name__ == "__main__":
+    print(f"Leyendo {PATH_ALL} ...")
+    df_all = pd.read_csv(PATH_ALL, encoding="utf-8-sig")
+    indice = IndicePrecios.desde_tidy(filtrar_ipi(df_all)).rebase(BASE_ANIO)
+    print(f"  Índice: {len(indice.estados)} estados × {indice.n_anios} años (base {BASE_ANIO}=100)")
+
+    # VAB y remuneraciones en precios corrientes -> precios de BASE_ANIO
+    corrientes = df_all["metric"].str.lower().str.strip() == METRIC_CORRIENTES
+    df_real = deflactar_tidy(
+        df_all, indice, corrientes,
+        metric=f"Millones de pesos a precios de {BASE_ANIO} (deflactados con Índice de precios implícitos del VAB)",
+    )
+    out_tidy = TIDY_DIR / f"meitef_deflactado_base{BASE_ANIO}_tidy.csv"
+    df_real.to_csv(out_tidy, index=False, encoding="utf-8-sig")
+    print(f"  -> Guardado: {out_tidy} ({len(df_real):,} filas)")
+
+    # SAT (ISR/IVA) e IMSS con el índice nacional
+    for path in [PATH_IMPUESTOS, PATH_IMSS]:
+        if not path.exists():
+            print(f"ADVERTENCIA: no encontré {path}; corre primero su ETL.")
+            continue
+        serie = pd.read_csv(path, parse_dates=["Fecha"], index_col="Fecha").sort_index()
+        real = deflactar_serie(serie, indice)
+        out_file = path.with_name(f"{path.stem}_real_base{BASE_ANIO}.csv")
+        real.to_csv(out_file)
+        print(f"  -> Guardado: {out_file}")
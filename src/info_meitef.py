@@ -8,7 +8,7 @@ Resumen estadístico del dataset MEITEF comercio informal (versión ligera, sin
 - Opcionalmente guarda tablas detalladas a CSV.
 
 Estructura:
-1) Carga del CSV.
+1) Carga del tidy (Parquet vía meitef_store; sin leer 'fecha').
 2) Info general.
 3) Conteo de valores únicos por columna (excepto valor).
 4) Estadísticos descriptivos de columnas numéricas (sin 'fecha').
@@ -17,11 +17,12 @@ Estructura:
 """
 
 import os
-import pandas as pd
+
+from meitef_store import COLUMNAS, cargar_meitef
 
 # ================== CONFIGURACIÓN ==================
 
-FILE_PATH = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\UNAM-INEGI\data\meitef_tidy\meitef_comercio_informal_tidy_ALL.csv"
+TIDY_DIR = r"C:\Users\betoh\OneDrive\Escritorio\Yo\Economía\7mo Semestre\hackaton inegi\UNAM-INEGI\data\meitef_tidy"
 
 # Máximo de filas / categorías a mostrar en la terminal
 MAX_HEAD_ROWS = 5          # para df.head()
@@ -37,12 +38,9 @@ OUTPUT_DIR = "output_stats"
 
 def main():
     print("Cargando dataset...")
-    df = pd.read_csv(FILE_PATH, encoding="latin-1")
-
-    # ==== IMPORTANTE: ignorar por completo la columna 'fecha' ====
-    if "fecha" in df.columns:
-        df = df.drop(columns=["fecha"])
-        print("\nColumna 'fecha' eliminada del análisis (no se mostrarán estadísticas de fechas).")
+    # ==== IMPORTANTE: ignorar por completo la columna 'fecha' (ni siquiera se lee) ====
+    df = cargar_meitef(TIDY_DIR, columns=[c for c in COLUMNAS if c != "fecha"])
+    print("\nColumna 'fecha' excluida del análisis (no se mostrarán estadísticas de fechas).")
 
     print("\n===== Información general =====")
     print(f"Filas: {df.shape[0]:,}")
@@ -109,7 +107,7 @@ def main():
 
         # Tabla de pares metric-indicador con número de observaciones
         tabla_pares = (
-            df.groupby(["metric", "indicador"])
+            df.groupby(["metric", "indicador"], observed=True)
             .size()
             .reset_index(name="n_observaciones")
         )
@@ -125,7 +123,7 @@ def main():
         # Métricas que solo aparecen con un indicador
         metric_to_indicador_counts = (
             tabla_pares.assign(indicador_str=tabla_pares["indicador"].astype(str))
-            .groupby("metric")["indicador_str"]
+            .groupby("metric", observed=True)["indicador_str"]
             .nunique()
             .reset_index(name="n_indicadores_distintos")
         )
@@ -143,7 +141,7 @@ def main():
         # Indicadores que solo aparecen con una métrica
         indicador_to_metric_counts = (
             tabla_pares.assign(metric_str=tabla_pares["metric"].astype(str))
-            .groupby("indicador")["metric_str"]
+            .groupby("indicador", observed=True)["metric_str"]
             .nunique()
             .reset_index(name="n_metricas_distintas")
         )
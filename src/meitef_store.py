@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Almacén columnar del tidy MEITEF (Parquet) y cargador para los scripts de análisis.
+
+- clean_meitef.py publica meitef_comercio_informal_tidy_ALL.parquet junto al CSV:
+    estado, periodo, metric, indicador, fuente -> texto (categóricas al cargar)
+    anio -> int16, fecha -> date32 (fecha real, fin del periodo), valor -> float64
+  ordenado por (indicador, metric, estado, fecha), con un row group por cada par
+  (indicador, metric). Las estadísticas min/max de cada row group permiten que un
+  filtro por indicador/metric lea sólo los grupos que le tocan.
+  etl-meitef/ajuste_estacional.py lo vuelve a publicar con dos columnas más,
+  valor_sa y factor_estacional (float64, NaN fuera de las series trimestrales).
+- cargar_meitef() lee sólo las columnas pedidas y empuja los filtros (indicador,
+  metric, estado, rango de fechas) al lector de Parquet. Devuelve estado/metric/
+  indicador/periodo/fuente como category y fecha como datetime64.
+- Si todavía no existe el Parquet, cae al CSV (utf-8-sig) y aplica lo mismo en pandas.
+- CuboMeitef: el tidy como arreglo denso indicador × metric × estado × periodo con
+  diccionarios de etiquetas; serie(), panel() y conteo_periodos() cortan el arreglo
+  por códigos enteros en vez de volver a filtrar el DataFrame en cada gráfica
+  (periodo acepta una etiqueta o una lista, p. ej. periodos_trimestrales()).
+
+Nota: en el archivo las categóricas se guardan como texto (Parquet ya las codifica
+con diccionario); si se guardaran como dictionary de Arrow, el lector no poda row
+groups con sus estadísticas.
+
+Requisitos:
+    pip install pandas pyarrow
+"""
+
+from pathlib import Path
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # sin pyarrow sólo queda el CSV
+    pa = None
+
+PARQUET_NAME = "meitef_comercio_informal_tidy_ALL.parquet"
+CSV_NAME = "meitef_comercio_informal_tidy_ALL.csv"
+
+COLUMNAS = ["estado", "anio", "periodo", "fecha", "metric", "indicador", "fuente", "valor"]
+COLUMNAS_AJUSTE = ["valor_sa", "factor_estacional"]   # opcionales: etl-meitef/ajuste_estacional.py
+CATEGORICAS = ["estado", "periodo", "metric", "indicador", "fuente"]
+ORDEN = ["indicador", "metric", "estado", "fecha"]
+NACIONAL = "Estados Unidos Mexicanos"
+
+
+def esquema(ajuste: bool = False):
+    campos = [
+        ("estado", pa.string()),
+        ("anio", pa.int16()),
+        ("periodo", pa.string()),
+        ("fecha", pa.date32()),
+        ("metric", pa.string()),
+        ("indicador", pa.string()),
+        ("fuente", pa.string()),
+        ("valor", pa.float64()),
+    ]
+    if ajuste:
+        campos += [(c, pa.float64()) for c in COLUMNAS_AJUSTE]
+    return pa.schema(campos)
+
+
+# ==== ESCRITURA ==============================================================
+
+def escribir_tidy(df: pd.DataFrame, path: Path) -> Path:
+    """
+    Publica el tidy como Parquet tipado, ordenado y con un row group por (indicador, metric).
+    Si trae las columnas del ajuste estacional (COLUMNAS_AJUSTE) también se guardan.
+    """
+    ajuste = all(c in df.columns for c in COLUMNAS_AJUSTE)
+    df = df[COLUMNAS + (COLUMNAS_AJUSTE if ajuste else [])].copy()
+    # texto plano: si llegaran como category, el orden sería el de sus categorías
+    df[CATEGORICAS] = df[CATEGORICAS].astype(object)
+    df["fecha"] = pd.to_datetime(df["fecha"])
+    df = df.sort_values(ORDEN, kind="stable").reset_index(drop=True)
+
+    tabla = pa.Table.from_pandas(df, schema=esquema(ajuste), preserve_index=False)
+    grupos = df.groupby(["indicador", "metric"], sort=False, observed=True, dropna=False).indices
+
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    with pq.ParquetWriter(str(tmp), tabla.schema, compression="zstd") as writer:
+        # tras el orden cada grupo es contiguo; .indices no garantiza el orden de aparición
+        for filas in sorted(grupos.values(), key=lambda f: f[0]):
+            writer.write_table(tabla.slice(int(filas[0]), len(filas)))
+    tmp.replace(path)
+    return path
+
+
+# ==== LECTURA ================================================================
+
+def _filtro(indicador=None, metric=None, estado=None, fecha_min=None, fecha_max=None):
+    """Expresión de pyarrow con los filtros pedidos (None = sin filtro)."""
+    expr = None
+
+    def y(e):
+        return e if expr is None else expr & e
+
+    for col, val in [("indicador", indicador), ("metric", metric), ("estado", estado)]:
+        if val is None:
+            continue
+        vals = [val] if isinstance(val, str) else list(val)
+        expr = y(pc.field(col).isin(vals))
+    if fecha_min is not None:
+        expr = y(pc.field("fecha") >= pa.scalar(pd.Timestamp(fecha_min).date(), pa.date32()))
+    if fecha_max is not None:
+        expr = y(pc.field("fecha") <= pa.scalar(pd.Timestamp(fecha_max).date(), pa.date32()))
+    return expr
+
+
+def _a_pandas(df: pd.DataFrame) -> pd.DataFrame:
+    for c in CATEGORICAS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    if "anio" in df.columns:
+        df["anio"] = df["anio"].astype("Int64")
+    if "fecha" in df.columns:
+        df["fecha"] = pd.to_datetime(df["fecha"]).astype("datetime64[ns]")
+    return df
+
+
+def _cargar_csv(path: Path, indicador, metric, estado, fecha_min, fecha_max) -> pd.DataFrame:
+    """Respaldo sin Parquet: mismo orden, tipos y filtros, pero leyendo el CSV completo."""
+    df = _a_pandas(pd.read_csv(path, encoding="utf-8-sig"))
+    df = df.sort_values(ORDEN, kind="stable")
+    mask = pd.Series(True, index=df.index)
+    for col, val in [("indicador", indicador), ("metric", metric), ("estado", estado)]:
+        if val is not None:
+            mask &= df[col].isin([val] if isinstance(val, str) else list(val))
+    if fecha_min is not None:
+        mask &= df["fecha"] >= pd.Timestamp(fecha_min)
+    if fecha_max is not None:
+        mask &= df["fecha"] <= pd.Timestamp(fecha_max)
+    return df.loc[mask].reset_index(drop=True)
+
+
+def cargar_meitef(
+    tidy_dir: Path,
+    columns: list[str] | None = None,
+    indicador=None,
+    metric=None,
+    estado=None,
+    fecha_min=None,
+    fecha_max=None,
+) -> pd.DataFrame:
+    """
+    Tidy MEITEF de `tidy_dir` con sólo `columns` y las filas que cumplen los filtros
+    (cada filtro acepta un valor o una lista). Las columnas usadas en filtros se leen
+    aunque no estén en `columns` y se quitan al final.
+    """
+    tidy_dir = Path(tidy_dir)
+    filtros = {"indicador": indicador, "metric": metric, "estado": estado}
+    usadas = [c for c, v in filtros.items() if v is not None]
+    if fecha_min is not None or fecha_max is not None:
+        usadas.append("fecha")
+    leer = None if columns is None else list(dict.fromkeys(list(columns) + usadas))
+
+    path_parquet = tidy_dir / PARQUET_NAME
+    if pa is None or not path_parquet.exists():
+        df = _cargar_csv(tidy_dir / CSV_NAME, indicador, metric, estado, fecha_min, fecha_max)
+    else:
+        dataset = ds.dataset(path_parquet, format="parquet")
+        tabla = dataset.to_table(
+            columns=leer,
+            filter=_filtro(indicador, metric, estado, fecha_min, fecha_max),
+        )
+        df = _a_pandas(tabla.to_pandas(date_as_object=False))
+
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+# ==== CUBO ===================================================================
+
+class CuboMeitef:
+    """
+    Tidy MEITEF como arreglo denso `valores[indicador, metric, estado, columna]`.
+
+    Cada eje es un pd.Index de etiquetas (el código entero es la posición); las
+    columnas son los pares (anio, periodo) ordenados por fecha y descritos en
+    `periodos` (anio, periodo, fecha). NaN = no hay dato. `pares` es el índice
+    de grupos: (indicador, metric) -> (código indicador, código metric), sólo para
+    los pares con datos.
+    """
+
+    def __init__(self, indicadores: pd.Index, metrics: pd.Index, estados: pd.Index,
+                 periodos: pd.DataFrame, valores: np.ndarray):
+        self.indicadores = indicadores
+        self.metrics = metrics
+        self.estados = estados
+        self.periodos = periodos.reset_index(drop=True)
+        self.fechas = pd.DatetimeIndex(self.periodos["fecha"], name="fecha")
+        self.valores = valores
+        con_datos = ~np.isnan(valores).all(axis=(2, 3))
+        self.pares = {
+            (indicadores[i], metrics[m]): (i, m) for i, m in zip(*np.nonzero(con_datos))
+        }
+
+    @classmethod
+    def desde_tidy(cls, df: pd.DataFrame) -> "CuboMeitef":
+        """Cubo a partir del tidy (cargar_meitef); si una llave se repite gana la última fila."""
+        df = df.dropna(subset=["indicador", "metric", "estado", "fecha", "valor"])
+        i, indicadores = pd.factorize(df["indicador"].astype(str), sort=True)
+        m, metrics = pd.factorize(df["metric"].astype(str), sort=True)
+        e, estados = pd.factorize(df["estado"].astype(str), sort=True)
+
+        # columna = par (anio, periodo), ordenadas por fecha (empates: orden de aparición)
+        anio = df["anio"].to_numpy(dtype=np.int64)
+        p, etiquetas_periodo = pd.factorize(df["periodo"].astype(str))
+        llave = (anio - anio.min()) * len(etiquetas_periodo) + p
+        _, primero, c = np.unique(llave, return_index=True, return_inverse=True)
+        fecha = pd.to_datetime(df["fecha"]).to_numpy()
+        orden = np.lexsort((primero, fecha[primero]))
+        c = np.argsort(orden)[c.ravel()]
+        periodos = pd.DataFrame({
+            "anio": anio[primero[orden]],
+            "periodo": np.asarray(etiquetas_periodo)[p[primero[orden]]],
+            "fecha": fecha[primero[orden]],
+        })
+
+        valores = np.full((len(indicadores), len(metrics), len(estados), len(periodos)), np.nan)
+        valores[i, m, e, c] = df["valor"].to_numpy(dtype=float)
+        return cls(pd.Index(indicadores), pd.Index(metrics), pd.Index(estados), periodos, valores)
+
+    # ---- consulta ----------------------------------------------------------
+    def _columnas(self, periodo=None) -> np.ndarray:
+        """Posiciones de las columnas del `periodo` pedido (una etiqueta o lista; todas si es None)."""
+        if periodo is None:
+            return np.arange(len(self.periodos))
+        etiquetas = [periodo] if isinstance(periodo, str) else list(periodo)
+        return np.flatnonzero(np.isin(self.periodos["periodo"].to_numpy(), etiquetas))
+
+    def periodos_trimestrales(self) -> list[str]:
+        """Etiquetas T1..T4 (con sufijo P/R de cifras preliminares/revisadas) presentes en el cubo."""
+        etiquetas = pd.unique(self.periodos["periodo"])
+        return [p for p in etiquetas if re.fullmatch(r"T[1-4][PR]?", p)]
+
+    def serie(self, indicador: str, metric: str, estado: str = NACIONAL, periodo=None) -> pd.Series:
+        """Serie de un estado indexada por fecha (vacía si alguna etiqueta no existe)."""
+        par = self.pares.get((indicador, metric))
+        fila = self.estados.get_indexer([estado])[0]
+        if par is None or fila < 0:
+            return pd.Series(dtype=float, index=pd.DatetimeIndex([], name="fecha"), name=estado)
+        cols = self._columnas(periodo)
+        serie = pd.Series(self.valores[par[0], par[1], fila, cols], index=self.fechas[cols], name=estado)
+        return serie.dropna()
+
+    def panel(self, indicador: str, metric: str, periodo=None) -> pd.DataFrame:
+        """Estados × fechas del par (sin renglones ni columnas vacíos)."""
+        par = self.pares.get((indicador, metric))
+        if par is None:
+            return pd.DataFrame(index=pd.Index([], name="estado"), columns=pd.DatetimeIndex([], name="fecha"))
+        cols = self._columnas(periodo)
+        panel = pd.DataFrame(
+            self.valores[par[0], par[1]][:, cols],
+            index=self.estados.rename("estado"),
+            columns=self.fechas[cols],
+        )
+        return panel.dropna(how="all").dropna(axis=1, how="all")
+
+    def conteo_periodos(self, indicador: str, metric: str) -> pd.Series:
+        """Observaciones (estado × año) del par por etiqueta de periodo, sólo las que tienen datos."""
+        par = self.pares.get((indicador, metric))
+        if par is None:
+            return pd.Series(dtype=np.int64, index=pd.Index([], name="periodo"))
+        n = (~np.isnan(self.valores[par[0], par[1]])).sum(axis=0)
+        conteo = pd.Series(n, index=pd.Index(self.periodos["periodo"], name="periodo")).groupby(level=0).sum()
+        return conteo[conteo > 0]
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Transformaciones de series trimestrales sobre arreglos anchos (series × tiempo).
+
+- Cada función recibe un arreglo `a[serie, t]` (o 1-D, una sola serie) con el tiempo
+  en el último eje y devuelve uno del mismo tamaño, con NaN donde no alcanza el dato.
+  Así se transforman todos los estados / indicadores de una vez en lugar de aplicar
+  pandas columna por columna.
+- Las posiciones son trimestres consecutivos: el rezago k compara t con t-k.
+    variacion(a, k)          (a_t / a_{t-k} - 1) * 100      k=4 anual, k=1 trimestral
+    diferencia(a, k)         a_t - a_{t-k}                   k=4 = diferencia estacional
+    rebase(a, base)          a / promedio(a[..., base]) * 100
+    media_movil(a, v)        promedio de [t-v+1, t]
+    media_expansiva(a)       promedio de [0, t]
+    correlacion_movil(x, y, v)  Pearson de [t-v+1, t]
+  Las ventanas salen de sumas acumuladas: O(T) por serie sin importar el tamaño de
+  la ventana. NaN no cuenta como observación; una ventana necesita `min_obs` datos
+  (por omisión la ventana completa, como pandas .rolling()).
+- en_tabla(df, funcion, ...) aplica lo mismo a un DataFrame fechas × series.
+- CacheTransformaciones guarda los resultados por (id de serie, transformación,
+  parámetros) para no recalcular la misma transformación en varias gráficas.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# ==== AUXILIARES =============================================================
+
+def _arreglo(a) -> np.ndarray:
+    return np.asarray(a, dtype=float)
+
+
+def _rezagado(a: np.ndarray, k: int) -> np.ndarray:
+    """a desplazado k posiciones hacia adelante en el tiempo (NaN al inicio)."""
+    r = np.full(a.shape, np.nan)
+    if 0 < k < a.shape[-1]:
+        r[..., k:] = a[..., :-k]
+    elif k == 0:
+        r[...] = a
+    return r
+
+
+def _sumas_ventana(a: np.ndarray, ventana: int) -> np.ndarray:
+    """Suma de [t-ventana+1, t] con una suma acumulada (al inicio, ventanas incompletas)."""
+    s = np.cumsum(a, axis=-1)
+    if ventana < a.shape[-1]:
+        s[..., ventana:] -= s[..., :-ventana].copy()
+    return s
+
+
+def _centrar(a: np.ndarray, validos: np.ndarray) -> np.ndarray:
+    """Resta a cada serie su promedio (evita cancelación en las sumas de cuadrados); NaN -> 0."""
+    n = validos.sum(axis=-1, keepdims=True)
+    suma = np.where(validos, a, 0.0).sum(axis=-1, keepdims=True)
+    media = np.divide(suma, n, out=np.zeros(suma.shape), where=n > 0)
+    return np.where(validos, a - media, 0.0)
+
+
+# ==== TRANSFORMACIONES PUNTUALES =============================================
+
+def variacion(a, k: int = 4) -> np.ndarray:
+    """Variación porcentual contra k trimestres antes (k=4: anual; k=1: trimestral)."""
+    a = _arreglo(a)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (a / _rezagado(a, k) - 1) * 100
+
+
+def diferencia(a, k: int = 4) -> np.ndarray:
+    """a_t - a_{t-k} (k=4: diferencia estacional de una serie trimestral)."""
+    a = _arreglo(a)
+    return a - _rezagado(a, k)
+
+
+def rebase(a, base=0) -> np.ndarray:
+    """
+    Índice = 100 en `base`: una posición (0 = inicio del periodo) o una lista de
+    posiciones cuyo promedio vale 100 (p. ej. los cuatro trimestres de un año).
+    """
+    a = _arreglo(a)
+    cols = a[..., np.atleast_1d(base)]
+    validos = ~np.isnan(cols)
+    n = validos.sum(axis=-1, keepdims=True)
+    suma = np.where(validos, cols, 0.0).sum(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        base_valor = np.where(n > 0, suma / n, np.nan)
+        return (a / base_valor) * 100
+
+
+# ==== VENTANAS ===============================================================
+
+def media_movil(a, ventana: int, min_obs: int | None = None) -> np.ndarray:
+    """Promedio de los últimos `ventana` trimestres (con al menos `min_obs` datos)."""
+    a = _arreglo(a)
+    validos = ~np.isnan(a)
+    s = _sumas_ventana(np.where(validos, a, 0.0), ventana)
+    n = _sumas_ventana(validos.astype(float), ventana)
+    min_obs = ventana if min_obs is None else min_obs
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(n >= max(min_obs, 1), s / n, np.nan)
+
+
+def media_expansiva(a, min_obs: int = 1) -> np.ndarray:
+    """Promedio desde el inicio de la serie hasta t."""
+    a = _arreglo(a)
+    validos = ~np.isnan(a)
+    s = np.cumsum(np.where(validos, a, 0.0), axis=-1)
+    n = np.cumsum(validos, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(n >= max(min_obs, 1), s / n, np.nan)
+
+
+def correlacion_movil(x, y, ventana: int, min_obs: int | None = None) -> np.ndarray:
+    """
+    Correlación de Pearson de x contra y en los últimos `ventana` trimestres, serie
+    por serie (y puede ser una sola serie que se compara contra todas las de x).
+    Sólo cuentan los trimestres con dato en ambas.
+    """
+    x, y = np.broadcast_arrays(_arreglo(x), _arreglo(y))
+    validos = ~np.isnan(x) & ~np.isnan(y)
+    xc, yc = _centrar(x, validos), _centrar(y, validos)
+
+    n = _sumas_ventana(validos.astype(float), ventana)
+    sx, sy = _sumas_ventana(xc, ventana), _sumas_ventana(yc, ventana)
+    sxx, syy = _sumas_ventana(xc * xc, ventana), _sumas_ventana(yc * yc, ventana)
+    sxy = _sumas_ventana(xc * yc, ventana)
+
+    min_obs = ventana if min_obs is None else min_obs
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / n
+        vx = sxx - sx * sx / n
+        vy = syy - sy * sy / n
+        r = cov / np.sqrt(vx * vy)
+    ok = (n >= max(min_obs, 2)) & (vx > 0) & (vy > 0)
+    return np.where(ok, np.clip(r, -1.0, 1.0), np.nan)
+
+
+# ==== TABLAS Y CACHÉ =========================================================
+
+def en_tabla(df: pd.DataFrame, funcion, *args, **kwargs) -> pd.DataFrame:
+    """Aplica `funcion` a un DataFrame fechas × series (todas las columnas de una vez)."""
+    valores = funcion(df.to_numpy(dtype=float).T, *args, **kwargs).T
+    return pd.DataFrame(valores, index=df.index, columns=df.columns)
+
+
+class CacheTransformaciones:
+    """
+    Resultados por (id de serie, transformación, parámetros). El id identifica los
+    datos (p. ej. (indicador, metric) de un panel del cubo); si los datos de un id
+    cambian hay que llamar invalidar(id). Los arreglos guardados son de sólo lectura
+    (los DataFrame se devuelven tal cual: no modificarlos).
+    """
+
+    def __init__(self):
+        self._resultados = {}
+        self.aciertos = 0
+
+    def obtener(self, id_serie, funcion, datos, *args, **kwargs):
+        """funcion(datos, *args, **kwargs) la primera vez; después, el resultado guardado."""
+        llave = (id_serie, funcion.__name__, args, tuple(sorted(kwargs.items())))
+        if llave in self._resultados:
+            self.aciertos += 1
+            return self._resultados[llave]
+
+        if isinstance(datos, pd.DataFrame):
+            resultado = en_tabla(datos, funcion, *args, **kwargs)
+        else:
+            resultado = funcion(datos, *args, **kwargs)
+            resultado.flags.writeable = False
+        self._resultados[llave] = resultado
+        return resultado
+
+    def invalidar(self, id_serie=None):
+        """Olvida los resultados de `id_serie` (o todos si es None)."""
+        if id_serie is None:
+            self._resultados.clear()
+        else:
+            self._resultados = {k: v for k, v in self._resultados.items() if k[0] != id_serie}
+
+    def __len__(self):
+        return len(self._resultados)